@@ -0,0 +1,74 @@
+"""Measure reading many same-shaped TIFFs with and without the buffer arena.
+
+Writes a batch of small zlib-compressed uint16 stacks and reads each of them
+with ImageReader, converting it like compress_image does, once allocating
+fresh arrays and once borrowing them from a BufferArena. Prints the time per
+file and the arena statistics. Does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_arena.py [--files 200] [--frames 8] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+from jetraw_tools.arena import BufferArena, describe_stats, merge_stats
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.utils import as_compressible
+
+FRAME_SHAPE = (1024, 1024)
+
+
+def write_inputs(folder: str, n_files: int, n_frames: int) -> list:
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 255, size=(n_frames,) + FRAME_SHAPE, dtype=np.uint8)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(folder, f"{i:05d}.tif")
+        tifffile.imwrite(path, stack, compression="zlib", compressionargs={"level": 1})
+        paths.append(path)
+    return paths
+
+
+def run(paths: list, pool) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        image, _ = ImageReader(
+            path, ".tif", read_metadata=False, arena=pool
+        ).read_image()
+        converted = as_compressible(image, arena=pool)
+        if pool is not None:
+            pool.give_back(converted)
+            pool.give_back(image)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_arena_")
+    try:
+        paths = write_inputs(os.path.join(workdir, "input"), args.files, args.frames)
+        print(f"no arena  {run(paths, None) * 1000:8.2f} ms/file")
+        pool = BufferArena()
+        print(f"arena     {run(paths, pool) * 1000:8.2f} ms/file")
+        print(describe_stats(merge_stats([pool.stats()])))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare a fixed worker count with the auto-tuned one on simulated storage.
+
+Each task stands for reading and compressing a file from a share that
+serves ``--capacity`` concurrent readers at full speed and slows down
+super-linearly beyond that, as a saturated NAS does. Tasks sleep instead of
+computing, so the result does not depend on the cores of the host. Prints
+the throughput of every fixed worker count given and of the auto-tuned run,
+with the worker count the tuner chose over time.
+
+Usage::
+
+    python benchmarks/bench_autotune.py [--files 400] [--capacity 3] [--max-workers 12]
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from jetraw_tools.autotune import ConcurrencyTuner
+from jetraw_tools.worker_pool import WorkerPool
+
+# Input size attributed to every simulated file
+FILE_BYTES = 64 * 1024**2
+
+# Seconds a file takes when the share is not saturated
+BASE_SECONDS = 0.02
+
+_shared: dict = {}
+
+
+def _init(readers, capacity: int) -> None:
+    _shared["readers"] = readers
+    _shared["capacity"] = capacity
+
+
+def _read_file(task: int) -> int:
+    readers = _shared["readers"]
+    with readers.get_lock():
+        readers.value += 1
+        active = readers.value
+    # Beyond its capacity the share thrashes: seeks, retransmits, timeouts
+    overload = max(1.0, active / _shared["capacity"])
+    time.sleep(BASE_SECONDS * overload**2)
+    with readers.get_lock():
+        readers.value -= 1
+    return task
+
+
+def run(n_files: int, capacity: int, n_workers: int, tuner=None) -> float:
+    context = multiprocessing.get_context()
+    readers = context.Value("i", 0)
+    pool = WorkerPool(
+        context,
+        n_workers,
+        _read_file,
+        initializer=_init,
+        initargs=(readers, capacity),
+        tuner=tuner,
+    )
+    pool.start(n_files)
+    start = time.perf_counter()
+    for _ in pool.imap_unordered(list(range(n_files)), [FILE_BYTES] * n_files):
+        pass
+    return n_files * FILE_BYTES / 1024**2 / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--capacity", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=12)
+    args = parser.parse_args()
+
+    for n_workers in sorted({1, args.capacity, args.max_workers - 1}):
+        rate = run(args.files, args.capacity, n_workers)
+        print(f"fixed {n_workers:3d} workers  {rate:9.1f} MB/s")
+    tuner = ConcurrencyTuner(args.max_workers, interval=1.0)
+    rate = run(args.files, args.capacity, args.max_workers, tuner)
+    print(f"auto-tune          {rate:9.1f} MB/s")
+    print(tuner.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the 'processes' and 'threads' execution backends of process_folder.
+
+Writes synthetic uint16 TIFF stacks of the requested sizes, compresses each
+set with both backends and prints the wall-clock time and throughput. Needs a
+working JetRaw/DPCore installation, a calibration file and an identifier.
+
+Usage::
+
+    python benchmarks/bench_backends.py CALIBRATION IDENTIFIER \\
+        [--sizes-mb 1,50,2048] [--data-mb 4096] [--ncores 4] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.libs import is_dpcore_available, is_jetraw_available
+
+FRAME_SHAPE = (2048, 2048)
+
+
+def write_inputs(folder: str, size_mb: float, n_files: int) -> None:
+    """Write n_files TIFF stacks of about size_mb each into folder."""
+    frame_bytes = FRAME_SHAPE[0] * FRAME_SHAPE[1] * 2
+    n_frames = max(1, int(size_mb * 1024**2 // frame_bytes))
+    shape = (n_frames,) + FRAME_SHAPE
+    if size_mb < frame_bytes / 1024**2:
+        side = int((size_mb * 1024**2 / 2) ** 0.5)
+        shape = (side, side)
+    rng = np.random.default_rng(0)
+    # Camera-like data: offset plus Poisson noise
+    stack = (100 + rng.poisson(50, size=shape)).astype(np.uint16)
+    os.makedirs(folder, exist_ok=True)
+    for index in range(n_files):
+        tifffile.imwrite(os.path.join(folder, f"image_{index:05d}.tiff"), stack)
+
+
+def run(tool: CompressionTool, folder: str) -> float:
+    output = folder + "_out"
+    shutil.rmtree(output, ignore_errors=True)
+    start = time.perf_counter()
+    tool.process_folder(folder, "compress", ".tiff", target_folder=output)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("calibration")
+    parser.add_argument("identifier")
+    parser.add_argument("--sizes-mb", default="1,50,2048")
+    parser.add_argument(
+        "--data-mb",
+        type=float,
+        default=4096,
+        help="Approximate amount of input data per file size",
+    )
+    parser.add_argument("--ncores", type=int, default=4)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    if not (is_dpcore_available() and is_jetraw_available()):
+        raise SystemExit("JetRaw/DPCore libraries are required for this benchmark.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_backends_")
+    try:
+        for size_mb in (float(size) for size in args.sizes_mb.split(",")):
+            n_files = max(2, int(args.data_mb // size_mb))
+            folder = os.path.join(workdir, f"{size_mb:g}MB")
+            write_inputs(folder, size_mb, n_files)
+            for backend in ("processes", "threads"):
+                tool = CompressionTool(
+                    args.calibration,
+                    args.identifier,
+                    ncores=args.ncores,
+                    omit_processed=False,
+                    backend=backend,
+                )
+                elapsed = run(tool, folder)
+                throughput = size_mb * n_files / elapsed
+                print(
+                    f"{size_mb:>7g} MB x {n_files:<5d} {backend:<10} "
+                    f"{elapsed:8.2f} s {throughput:8.1f} MB/s"
+                )
+            shutil.rmtree(folder, ignore_errors=True)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
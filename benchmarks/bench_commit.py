@@ -0,0 +1,68 @@
+"""Time the atomic commit of many small outputs under each --sync-every.
+
+Writes ``--files`` outputs of ``--kb`` KB under their partial name and
+commits them like process_folder does: flushed and renamed one at a time
+(--sync-every 1), in batches, or all at the end of the run (0). Run it on
+the filesystem the outputs go to with ``--workdir``; on tmpfs flushing is
+free. Does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_commit.py [--files 500] [--kb 256] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from jetraw_tools.commit import (
+    OutputCommitter,
+    PendingOutput,
+    commit_files,
+    partial_path,
+    written_files,
+)
+
+
+def run(folder: str, n_files: int, size: int, sync_every: int) -> float:
+    os.makedirs(folder)
+    data = os.urandom(size)
+    committer = OutputCommitter(sync_every, lambda *args: None, cache_hints=False)
+    start = time.perf_counter()
+    for i in range(n_files):
+        final = os.path.join(folder, f"{i:06d}.p.tiff")
+        with open(partial_path(final), "wb") as f:
+            f.write(data)
+        if sync_every == 1:
+            commit_files(written_files(final))
+        else:
+            committer.add([PendingOutput(written_files(final))])
+    committer.flush()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--kb", type=int, default=256)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jetraw_commit_", dir=args.workdir)
+    try:
+        print(f"batch: {args.files} files of {args.kb} KB in {workdir}")
+        for sync_every in (1, 16, 128, 0):
+            folder = os.path.join(workdir, str(sync_every))
+            elapsed = run(folder, args.files, args.kb * 1024, sync_every)
+            print(
+                f"--sync-every {sync_every:<4} {elapsed:7.2f} s  "
+                f"{elapsed / args.files * 1000:7.2f} ms/file"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
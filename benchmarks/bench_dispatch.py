@@ -0,0 +1,151 @@
+"""Benchmark the per-task dispatch overhead of CompressionTool.process_folder.
+
+Compares the former dispatch (``pool.starmap`` of the bound
+``CompressionTool.process_image`` with a 10-tuple of arguments per task), the
+``multiprocessing.Pool`` with an initializer, ``(index, name)`` task records
+and adaptive chunk sizes, and the current :class:`WorkerPool` that replaced it
+to support worker recycling. ``process_image`` is replaced by a no-op, so the
+timings only contain pickling, IPC and scheduling costs.
+
+Usage::
+
+    python benchmarks/bench_dispatch.py [--files 10000] [--ncores 4] [--file-size-mb 1]
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+
+from jetraw_tools import workers
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.worker_pool import WorkerPool
+from jetraw_tools.workers import compute_chunksize, run_task
+
+
+class NoopTool(CompressionTool):
+    """CompressionTool whose per-file work is a no-op."""
+
+    def process_image(self, *args, **kwargs) -> int:
+        return 0
+
+
+def _init_noop_worker(tool_config: dict, job: dict) -> None:
+    """Set up the worker state like init_worker, without loading libraries."""
+    workers._worker_state["tool"] = NoopTool(**tool_config)
+    workers._worker_state["job"] = job
+
+
+def bench_starmap(tool: NoopTool, n_files: int, ncores: int, file_size: float) -> tuple:
+    args = [
+        (
+            "/data/acquisition/run_2024_05_20",
+            "/data/acquisition/run_2024_05_20_compressed",
+            f"image_{index:06d}.nd2",
+            "compress",
+            ".nd2",
+            True,
+            True,
+            False,
+            False,
+            (index + 1, n_files),
+        )
+        for index in range(n_files)
+    ]
+    payload = len(pickle.dumps((tool.process_image, args[0])))
+    with multiprocessing.Pool(ncores) as pool:
+        start = time.perf_counter()
+        pool.starmap(tool.process_image, args)
+        elapsed = time.perf_counter() - start
+    return elapsed, payload
+
+
+def _job(n_files: int) -> dict:
+    return {
+        "folder_path": "/data/acquisition/run_2024_05_20",
+        "output_folder": "/data/acquisition/run_2024_05_20_compressed",
+        "mode": "compress",
+        "image_extension": ".nd2",
+        "process_metadata": True,
+        "ome_bool": True,
+        "metadata_json": False,
+        "remove_source": False,
+        "total_files": n_files,
+    }
+
+
+def bench_initializer(
+    tool: NoopTool, n_files: int, ncores: int, file_size: float
+) -> tuple:
+    job = _job(n_files)
+    tasks = [(index, f"image_{index:06d}.nd2") for index in range(n_files)]
+    payload = len(pickle.dumps((run_task, tasks[0])))
+    chunksize = compute_chunksize(n_files, ncores, avg_file_size=file_size)
+    with multiprocessing.Pool(
+        ncores, initializer=_init_noop_worker, initargs=(tool._worker_config(), job)
+    ) as pool:
+        start = time.perf_counter()
+        for _ in pool.imap_unordered(run_task, tasks, chunksize=chunksize):
+            pass
+        elapsed = time.perf_counter() - start
+    return elapsed, payload
+
+
+def bench_worker_pool(
+    tool: NoopTool, n_files: int, ncores: int, file_size: float
+) -> tuple:
+    job = _job(n_files)
+    tasks = [(index, f"image_{index:06d}.nd2") for index in range(n_files)]
+    chunk = [(0, tasks[0], int(file_size))]
+    payload = len(pickle.dumps(chunk))
+    pool = WorkerPool(
+        multiprocessing.get_context(),
+        ncores,
+        run_task,
+        initializer=_init_noop_worker,
+        initargs=(tool._worker_config(), job),
+        chunksize=compute_chunksize(n_files, ncores, avg_file_size=file_size),
+    )
+    pool.start(n_files)
+    start = time.perf_counter()
+    for _ in pool.imap_unordered(tasks, [int(file_size)] * n_files):
+        pass
+    return time.perf_counter() - start, payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--ncores", type=int, default=4)
+    parser.add_argument(
+        "--file-size-mb",
+        type=float,
+        default=1.0,
+        help="Average file size used to pick the chunk size",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        calibration = os.path.join(tmp, "calibration.dat")
+        open(calibration, "w").close()
+        tool = NoopTool(calibration, "identifier", ncores=args.ncores)
+
+        per_10k = 10000 / args.files
+        for name, bench in (
+            ("starmap (before)", bench_starmap),
+            ("Pool initializer", bench_initializer),
+            ("WorkerPool (now)", bench_worker_pool),
+        ):
+            elapsed, payload = bench(
+                tool, args.files, args.ncores, args.file_size_mb * 1024**2
+            )
+            print(
+                f"{name:<18} {elapsed * per_10k * 1e3:8.1f} ms per 10k files, "
+                f"{payload:4d} bytes pickled per task"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Time the serialisation of ND2 metadata to JSON, former chain vs single pass.
+
+Serialises the unstructured metadata of an ND2 file the way metadata_writer
+does for the OME comment, the ImageJ comment and the JSON sidecar: with the
+former ``convert_to_ascii``/``flatten_dict``/``serialise`` chain followed by
+``json.dumps``, and with :func:`~jetraw_tools.utils.metadata_to_json`.
+Without ``--nd2``, a synthetic tree shaped like the metadata of Nikon
+Elements is used. Does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_metadata.py [--nd2 FILE] [--events 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import timeit
+
+from jetraw_tools.utils import (
+    convert_to_ascii,
+    flatten_dict,
+    metadata_to_json,
+    serialise,
+)
+
+
+def synthetic_metadata(n_planes: int, n_events: int) -> dict:
+    """Nesting, key names and value types of ND2 unstructured metadata."""
+    planes = {
+        f"a{i}": {
+            "uiCompCount": 1,
+            "dObjCalibration1to1": 0.1083,
+            "sDescription": f"Channel {i} — 488 nm",
+            "pFilterPath": {"m_pFilter": {"a0": {"m_sName": "Quad µ-filter"}}},
+            "pCameraSetting": {
+                "CameraUserName": "Prime BSI",
+                "FormatQuality": {"Desc": "16-bit (µs exposure)", "Binning": (1, 1)},
+                "Exposure": 100.0,
+            },
+            "wavelengths": [488.0, 561.5],
+        }
+        for i in range(n_planes)
+    }
+    events = [
+        {
+            "Time": t * 0.5,
+            "Meaning": "Stimulation °C",
+            "Stage": [{"X": 12.5 * t, "Y": -3.25, "Z": None, "unit": "µm"}],
+        }
+        for t in range(n_events)
+    ]
+    return {
+        "ImageTextInfoLV": {"SLxImageTextInfo": {"TextInfoItem_5": "T(200) x λ(4)"}},
+        "ImageMetadataSeqLV|0": {
+            "SLxPictureMetadata": {
+                "wsObjectiveName": "Plan Apo λ 60x Oil",
+                "sPicturePlanes": {"uiCount": n_planes, "sPlaneNew": planes},
+            }
+        },
+        "ImageEventsLV": {"RLxExperimentRecord": {"pEvents": events}},
+    }
+
+
+def nd2_metadata(path: str) -> dict:
+    import nd2
+
+    with nd2.ND2File(path) as f:
+        return f.unstructured_metadata()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nd2", default=None)
+    parser.add_argument("--planes", type=int, default=64)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.nd2:
+        metadata = nd2_metadata(args.nd2)
+    else:
+        metadata = synthetic_metadata(args.planes, args.events)
+    size = len(metadata_to_json(metadata))
+    print(f"metadata: {size / 1024:.0f} KB of JSON")
+    cases = [
+        (
+            "OME comment",
+            lambda: json.dumps(serialise(convert_to_ascii(metadata))),
+            lambda: metadata_to_json(metadata),
+        ),
+        (
+            "ImageJ comment",
+            lambda: json.dumps(serialise(flatten_dict(convert_to_ascii(metadata)))),
+            lambda: metadata_to_json(metadata, flatten=True),
+        ),
+        (
+            "JSON sidecar",
+            lambda: json.dumps(
+                convert_to_ascii(metadata),
+                indent=3,
+                ensure_ascii=False,
+                default=serialise,
+            ),
+            lambda: metadata_to_json(metadata, ensure_ascii=False, indent=3),
+        ),
+    ]
+    for name, old, new in cases:
+        assert old() == new()
+        old_time = min(timeit.repeat(old, number=1, repeat=args.repeat))
+        new_time = min(timeit.repeat(new, number=1, repeat=args.repeat))
+        print(
+            f"{name:<15} former chain {old_time * 1e3:8.2f} ms  "
+            f"single pass {new_time * 1e3:8.2f} ms  ({old_time / new_time:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Measure the per-page Python overhead of reading small-frame .p.tiff files.
+
+Writes a JetRaw compressed stack of small frames (256x256 by default) and
+reads it page by page with the former code path (library lookup, property
+queries and a ctypes pointer cast per page) and with the current one (bound
+foreign functions, cached dimensions and raw addresses). The difference per
+page is the Python overhead that was removed; the codec time is the same for
+both. Needs a working JetRaw/DPCore installation, a calibration file and an
+identifier.
+
+Usage::
+
+    python benchmarks/bench_page_overhead.py CALIBRATION IDENTIFIER \\
+        [--pages 10000] [--frame 256] [--repeat 3] [--workdir DIR]
+"""
+
+import argparse
+import ctypes
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from jetraw_tools.dpcore import ensure_parameters, prepare_image
+from jetraw_tools.libs import get_jetraw_libs, is_dpcore_available, is_jetraw_available
+from jetraw_tools.tiff_reader import TiffReader
+from jetraw_tools.tiff_writer import imwrite
+
+
+def write_input(path: str, n_pages: int, side: int, identifier: str) -> None:
+    rng = np.random.default_rng(0)
+    # Camera-like data: offset plus Poisson noise
+    stack = (100 + rng.poisson(50, size=(n_pages, side, side))).astype(np.uint16)
+    for frame in stack:
+        prepare_image(frame, identifier)
+    imwrite(path, stack)
+
+
+def read_legacy(reader: TiffReader, n_pages: int) -> None:
+    """Per-page reads as done before handles cached functions and dimensions."""
+    jrtif = reader._jrtif
+    for page in range(n_pages):
+        _, lib = get_jetraw_libs()
+        height = lib.jetraw_tiff_get_height(jrtif._handle)
+        _, lib = get_jetraw_libs()
+        width = lib.jetraw_tiff_get_width(jrtif._handle)
+        out = np.empty((1, height, width), dtype=np.uint16)
+        buf = out[0].ctypes.data_as(ctypes.POINTER(ctypes.c_uint16))
+        _, lib = get_jetraw_libs()
+        status = lib.jetraw_tiff_read_page(jrtif._handle, buf, page)
+        if status != 0:
+            raise RuntimeError(status)
+        np.squeeze(out)
+
+
+def read_current(reader: TiffReader, n_pages: int) -> None:
+    for page in range(n_pages):
+        reader.read(page)
+
+
+def read_stack(reader: TiffReader, n_pages: int) -> None:
+    reader.read(range(n_pages))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("calibration")
+    parser.add_argument("identifier")
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--frame", type=int, default=256, help="Frame side in px")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    if not (is_dpcore_available() and is_jetraw_available()):
+        raise SystemExit("JetRaw/DPCore libraries are required for this benchmark.")
+
+    ensure_parameters(args.calibration)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_pages_")
+    path = os.path.join(workdir, f"frames_{args.frame}.p.tiff")
+    if not os.path.exists(path):
+        write_input(path, args.pages, args.frame, args.identifier)
+
+    print(f"{args.pages} pages of {args.frame}x{args.frame} px")
+    for name, read in (
+        ("legacy read(i)", read_legacy),
+        ("read(i)", read_current),
+        ("read(range)", read_stack),
+    ):
+        best = float("inf")
+        for _ in range(args.repeat):
+            with TiffReader(path) as reader:
+                start = time.perf_counter()
+                read(reader, args.pages)
+                best = min(best, time.perf_counter() - start)
+        print(f"{name:>16}: {best:8.3f} s, {best / args.pages * 1e6:8.1f} us/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure the page cache a batch leaves behind, with and without hints.
+
+Writes a batch of uncompressed uint16 stacks, drops them from the cache,
+then reads every file with ImageReader and writes a copy of it, like
+process_image does, once plainly and once with the cache hints of
+jetraw_tools.pagecache. Prints the growth of "Cached" in /proc/meminfo and
+the time per file. Linux only; does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_pagecache.py [--files 40] [--frames 16] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.pagecache import drop_file
+
+FRAME_SHAPE = (1024, 1024)
+
+
+def cached_bytes() -> int:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("Cached:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("No 'Cached' line in /proc/meminfo")
+
+
+def run(paths: list, output: str, hints: bool) -> tuple:
+    for path in paths:
+        drop_file(path, flush=True)
+    before = cached_bytes()
+    start = time.perf_counter()
+    for path in paths:
+        image, _ = ImageReader(
+            path, ".tif", read_metadata=False, cache_hints=hints
+        ).read_image()
+        target = os.path.join(output, os.path.basename(path))
+        tifffile.imwrite(target, image)
+        del image
+        if hints:
+            drop_file(path)
+            drop_file(target, flush=True)
+    elapsed = (time.perf_counter() - start) / len(paths)
+    return cached_bytes() - before, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--frames", type=int, default=16)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_cache_")
+    try:
+        stack = np.ones((args.frames,) + FRAME_SHAPE, np.uint16)
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(workdir, f"{i:05d}.tif"))
+            tifffile.imwrite(paths[-1], stack)
+        total = sum(os.path.getsize(path) for path in paths)
+        print(f"batch: {args.files} files, {2 * total / 1024**2:.0f} MB read + written")
+        for hints in (False, True):
+            output = os.path.join(workdir, f"out_{hints}")
+            os.makedirs(output)
+            growth, elapsed = run(paths, output, hints)
+            print(
+                f"hints={hints!s:5}  page cache +{growth / 1024**2:8.0f} MB  "
+                f"{elapsed * 1000:7.1f} ms/file"
+            )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare reading sources in place on slow storage with prefetching them.
+
+Models a network share where every read call pays a round trip: a reader
+walks each source in 64 KB reads at random offsets, like ``nd2.ND2File``
+does, and sleeps ``--latency-ms`` per read from the share, then spends
+``--compute-ms`` compressing. In place, the workers pay that latency for
+every read. Prefetched, a Prefetcher copies the next files to a local cache
+with 8 MB reads, paying the latency once per read, while the workers
+process the current ones from local disk. Prints the batch time of both.
+Does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_prefetch.py [--files 40] [--workers 4] [--latency-ms 1]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jetraw_tools.prefetch import COPY_BUFFER, PrefetchCache, Prefetcher
+
+FILE_BYTES = 16 * 1024**2
+READ_BYTES = 64 * 1024
+
+
+def read_source(path: str, latency: float, compute: float) -> int:
+    offsets = list(range(0, FILE_BYTES, READ_BYTES))
+    random.shuffle(offsets)
+    with open(path, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            f.read(READ_BYTES)
+            time.sleep(latency)
+    time.sleep(compute)
+    return 0
+
+
+class SlowSharePrefetcher(Prefetcher):
+    """Pays the round trip of the share once per copy block."""
+
+    latency = 0.0
+
+    def _copy(self, source: str, target: str) -> int:
+        time.sleep(-(-os.path.getsize(source) // COPY_BUFFER) * self.latency)
+        return super()._copy(source, target)
+
+
+def run(paths: list, workdir: str, args, prefetch: bool) -> float:
+    latency = args.latency_ms / 1000
+    compute = args.compute_ms / 1000
+    start = time.perf_counter()
+    if not prefetch:
+        with ThreadPoolExecutor(args.workers) as executor:
+            list(executor.map(lambda p: read_source(p, latency, compute), paths))
+        return time.perf_counter() - start
+
+    cache = PrefetchCache(os.path.join(workdir, "nvme"), len(paths), args.depth)
+    SlowSharePrefetcher.latency = latency
+    prefetcher = SlowSharePrefetcher(cache, list(enumerate(paths)), cache_hints=False)
+    prefetcher.start()
+
+    def task(index: int) -> int:
+        local = cache.take(index, paths[index])
+        try:
+            if local is None:
+                return read_source(paths[index], latency, compute)
+            return read_source(local, 0.0, compute)
+        finally:
+            cache.evict(index, paths[index])
+
+    try:
+        with ThreadPoolExecutor(args.workers) as executor:
+            list(executor.map(task, range(len(paths))))
+    finally:
+        prefetcher.close()
+    print(f"  {prefetcher.copied} of {len(paths)} sources copied in time")
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--compute-ms", type=float, default=100.0)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_prefetch_")
+    try:
+        share = os.path.join(workdir, "share")
+        os.makedirs(share)
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(share, f"{i:05d}.nd2"))
+            with open(paths[-1], "wb") as f:
+                f.write(os.urandom(FILE_BYTES))
+        size = args.files * FILE_BYTES / 1024**2
+        print(f"batch: {args.files} files, {size:.0f} MB")
+        for prefetch in (False, True):
+            elapsed = run(paths, workdir, args, prefetch)
+            label = "prefetched" if prefetch else "in place  "
+            print(f"{label}  {elapsed:6.2f} s  {size / elapsed:8.1f} MB/s")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare writing outputs in place on slow storage with staging them locally.
+
+Models a network target where every write call pays a round trip: a writer
+appends an output page by page, like the JetRaw TIFF writer, and sleeps
+``--latency-ms`` per page written to the target. In place, the workers pay
+that latency for every page. Staged, they write to a local scratch directory
+and a ScratchMover copies each finished file to the target, paying the
+latency once per 8 MB copy block, while the workers go on. Prints the batch
+time of both. Does not need the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_scratch.py [--files 40] [--workers 4] [--latency-ms 2]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jetraw_tools import scratch
+from jetraw_tools.scratch import ScratchArea, ScratchMover, run_staged
+
+PAGE_BYTES = 256 * 1024
+PAGES = 64
+COPY_BLOCK = 8 * 1024**2
+
+
+def write_output(folder: str, name: str, latency: float) -> int:
+    page = b"\1" * PAGE_BYTES
+    with open(os.path.join(folder, name), "wb") as f:
+        for _ in range(PAGES):
+            f.write(page)
+            f.flush()
+            time.sleep(latency)
+    return 0
+
+
+def run(
+    workdir: str, n_files: int, n_workers: int, latency: float, staged: bool
+) -> float:
+    target = tempfile.mkdtemp(dir=workdir)
+    start = time.perf_counter()
+    if not staged:
+        with ThreadPoolExecutor(n_workers) as executor:
+            list(
+                executor.map(
+                    lambda i: write_output(target, f"{i}.p.tiff", latency),
+                    range(n_files),
+                )
+            )
+        return time.perf_counter() - start
+
+    copyfile = shutil.copyfile
+
+    def slow_copy(src, dst):
+        blocks = -(-os.path.getsize(src) // COPY_BLOCK)
+        time.sleep(blocks * latency)
+        return copyfile(src, dst)
+
+    # Every move to the target is a copy from another filesystem
+    scratch.shutil.copyfile = slow_copy
+    rename = os.rename
+
+    def cross_device(src, dst):
+        if not dst.startswith(os.path.join(workdir, "scratch")):
+            raise OSError(18, "Invalid cross-device link")
+        rename(src, dst)
+
+    scratch.os.rename = cross_device
+    try:
+        area = ScratchArea(os.path.join(workdir, "scratch"), quota=0)
+        mover = ScratchMover(area, cache_hints=False)
+        mover.start()
+        with ThreadPoolExecutor(n_workers) as executor:
+            list(
+                executor.map(
+                    lambda i: run_staged(
+                        area,
+                        i,
+                        target,
+                        lambda staging: write_output(staging, f"{i}.p.tiff", 0.0),
+                    ),
+                    range(n_files),
+                )
+            )
+        mover.finish()
+    finally:
+        scratch.shutil.copyfile = copyfile
+        scratch.os.rename = rename
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_scratch_")
+    try:
+        size = args.files * PAGES * PAGE_BYTES / 1024**2
+        print(f"batch: {args.files} files, {size:.0f} MB")
+        for staged in (False, True):
+            elapsed = run(
+                workdir, args.files, args.workers, args.latency_ms / 1000, staged
+            )
+            label = "staged  " if staged else "in place"
+            print(f"{label}  {elapsed:6.2f} s  {size / elapsed:8.1f} MB/s")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time writing many outputs, and the skip check, flat vs sharded.
+
+Creates ``--files`` empty outputs in a flat folder and under each --shard
+layout, recording them in the index like process_folder does, then times
+the check done by --op on the next run: listing the flat folder, or loading
+the index. Run it on the filesystem the outputs go to with ``--workdir``;
+directory operations on local tmpfs stay fast at any size. Does not need the
+JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_sharding.py [--files 100000] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from jetraw_tools.sharding import OutputIndex, parse_layout
+
+
+def write(folder: str, n_files: int, spec: str) -> float:
+    layout = parse_layout(spec)
+    index = OutputIndex(folder) if layout is not None else None
+    start = time.perf_counter()
+    for i in range(n_files):
+        image_file = f"{i:07d}.nd2"
+        output_folder = folder
+        if layout is not None:
+            output_folder = os.path.join(folder, layout.shard(i, image_file))
+            os.makedirs(output_folder, exist_ok=True)
+        output = os.path.join(output_folder, f"{i:07d}.ome.p.tiff")
+        open(output, "wb").close()
+        if index is not None:
+            index.append(image_file, output)
+    if index is not None:
+        index.merge()
+    return time.perf_counter() - start
+
+
+def check(folder: str, spec: str) -> float:
+    start = time.perf_counter()
+    if parse_layout(spec) is None:
+        {os.path.splitext(name)[0] for name in os.listdir(folder)}
+    else:
+        OutputIndex(folder).load()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jetraw_sharding_", dir=args.workdir)
+    try:
+        print(f"batch: {args.files} outputs in {workdir}")
+        for spec in ("", "hash", "files:1000"):
+            folder = os.path.join(workdir, spec.replace(":", "-") or "flat")
+            os.makedirs(folder)
+            elapsed = write(folder, args.files, spec)
+            checked = check(folder, spec)
+            print(
+                f"{spec or 'flat':<11} write {elapsed / args.files * 1e6:7.1f} "
+                f"us/file  skip check {checked:6.3f} s"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare frame throughput of FrameRing against pickled multiprocessing queues.
+
+A producer process generates uint16 frames and sends them to a consumer
+process, which touches every frame (sum of one row) before taking the next
+one. The frames go either through a ``multiprocessing.Queue`` (pickled and
+copied through a pipe) or through a shared-memory ``FrameRing`` (copied once
+into a slot, only the descriptor is pickled). Needs no JetRaw installation.
+
+Usage::
+
+    python benchmarks/bench_shm_transport.py [--frames 500] [--frame 2048] \\
+        [--slots 8] [--start-method spawn]
+"""
+
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from jetraw_tools.shm_transport import FrameRing
+
+
+def _make_frame(side: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (100 + rng.poisson(50, size=(side, side))).astype(np.uint16)
+
+
+def produce_queue(frames_queue, n_frames: int, side: int) -> None:
+    frame = _make_frame(side)
+    for index in range(n_frames):
+        frames_queue.put((index, frame))
+    frames_queue.put(None)
+
+
+def consume_queue(frames_queue, done) -> None:
+    total = 0
+    while True:
+        item = frames_queue.get()
+        if item is None:
+            break
+        total += int(item[1][0].sum())
+    done.put(total)
+
+
+def produce_ring(ring: FrameRing, n_frames: int, side: int) -> None:
+    frame = _make_frame(side)
+    for index in range(n_frames):
+        ring.put(frame, meta=index)
+    ring.finish()
+    ring.close()
+
+
+def consume_ring(ring: FrameRing, done) -> None:
+    total = 0
+    while True:
+        frame = ring.get()
+        if frame is None:
+            break
+        total += int(frame.array[0].sum())
+        ring.release(frame.slot)
+    ring.close()
+    done.put(total)
+
+
+def run(ctx, producer_args: tuple, consumer_args: tuple, producer, consumer) -> float:
+    done = ctx.Queue()
+    processes = [
+        ctx.Process(target=producer, args=producer_args),
+        ctx.Process(target=consumer, args=consumer_args + (done,)),
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    done.get()
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--frame", type=int, default=2048, help="Frame side in px")
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--start-method", default=None)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context(args.start_method)
+    gigabytes = args.frames * args.frame**2 * 2 / 1024**3
+    print(
+        f"{args.frames} frames of {args.frame}x{args.frame} uint16 "
+        f"({gigabytes:.2f} GB), start method {ctx.get_start_method()}"
+    )
+
+    frames_queue = ctx.Queue(maxsize=args.slots)
+    elapsed = run(
+        ctx,
+        (frames_queue, args.frames, args.frame),
+        (frames_queue,),
+        produce_queue,
+        consume_queue,
+    )
+    print(f"{'pickled queue':>14}: {elapsed:7.2f} s, {gigabytes / elapsed:6.2f} GB/s")
+
+    with FrameRing(args.slots, (args.frame, args.frame), ctx=ctx) as ring:
+        elapsed = run(
+            ctx,
+            (ring, args.frames, args.frame),
+            (ring,),
+            produce_ring,
+            consume_ring,
+        )
+    print(f"{'FrameRing':>14}: {elapsed:7.2f} s, {gigabytes / elapsed:6.2f} GB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measure how compressing a single large file scales with the number of cores.
+
+Writes one synthetic uint16 TIFF stack and compresses it with increasing core
+counts, with and without intra-file splitting, printing the wall-clock time
+and the speed-up over one core. Needs a working JetRaw/DPCore installation, a
+calibration file and an identifier.
+
+Usage::
+
+    python benchmarks/bench_split.py CALIBRATION IDENTIFIER \\
+        [--size-mb 2048] [--cores 1,2,4,8] [--workdir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.libs import is_dpcore_available, is_jetraw_available
+
+FRAME_SHAPE = (2048, 2048)
+
+
+def write_input(folder: str, size_mb: float) -> None:
+    frame_bytes = FRAME_SHAPE[0] * FRAME_SHAPE[1] * 2
+    n_frames = max(1, int(size_mb * 1024**2 // frame_bytes))
+    rng = np.random.default_rng(0)
+    # Camera-like data: offset plus Poisson noise
+    frame = (100 + rng.poisson(50, size=FRAME_SHAPE)).astype(np.uint16)
+    os.makedirs(folder, exist_ok=True)
+    with tifffile.TiffWriter(os.path.join(folder, "acquisition.tiff")) as tif:
+        for _ in range(n_frames):
+            tif.write(frame, contiguous=True)
+
+
+def run(tool: CompressionTool, folder: str) -> float:
+    output = folder + "_out"
+    shutil.rmtree(output, ignore_errors=True)
+    start = time.perf_counter()
+    tool.process_folder(folder, "compress", ".tiff", target_folder=output)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("calibration")
+    parser.add_argument("identifier")
+    parser.add_argument("--size-mb", type=float, default=2048)
+    parser.add_argument("--cores", default="1,2,4,8")
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    if not (is_dpcore_available() and is_jetraw_available()):
+        raise SystemExit("JetRaw/DPCore libraries are required for this benchmark.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_split_")
+    folder = os.path.join(workdir, "input")
+    try:
+        write_input(folder, args.size_mb)
+        baseline = None
+        for ncores in (int(n) for n in args.cores.split(",")):
+            for split in (False, True):
+                tool = CompressionTool(
+                    args.calibration,
+                    args.identifier,
+                    ncores=ncores,
+                    omit_processed=False,
+                    split_large_files=split,
+                )
+                elapsed = run(tool, folder)
+                baseline = baseline or elapsed
+                print(
+                    f"{ncores:>3d} cores split={split!s:<5} "
+                    f"{elapsed:8.2f} s  x{baseline / elapsed:5.2f}"
+                )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
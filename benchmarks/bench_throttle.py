@@ -0,0 +1,74 @@
+"""Check the aggregate read rate of several workers under --max-read-mbps.
+
+Writes a batch of uncompressed uint16 stacks, then reads them with
+ImageReader from a pool of worker processes sharing one IOThrottle, and
+prints the achieved MB/s against the limit. Does not need the JetRaw
+libraries.
+
+Usage::
+
+    python benchmarks/bench_throttle.py [--files 60] [--workers 4] [--limit-mbps 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.throttle import IOThrottle, install_throttle
+from jetraw_tools.worker_pool import WorkerPool
+
+STACK_SHAPE = (16, 1024, 1024)
+
+
+def _read(path: str) -> int:
+    image, _ = ImageReader(path, ".tif", read_metadata=False).read_image()
+    return image.nbytes
+
+
+def run(paths: list, n_workers: int, throttle) -> float:
+    pool = WorkerPool(
+        multiprocessing.get_context(),
+        n_workers,
+        _read,
+        initializer=install_throttle,
+        initargs=(throttle,),
+    )
+    pool.start(len(paths))
+    start = time.perf_counter()
+    n_bytes = sum(pool.imap_unordered(paths))
+    return n_bytes / 1024**2 / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit-mbps", type=float, default=200)
+    parser.add_argument("--workdir", default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_throttle_")
+    try:
+        stack = np.zeros(STACK_SHAPE, np.uint16)
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(workdir, f"{i:05d}.tif"))
+            tifffile.imwrite(paths[-1], stack)
+        print(f"unlimited        {run(paths, args.workers, None):9.1f} MB/s")
+        throttle = IOThrottle(read_rate=args.limit_mbps * 1024**2)
+        rate = run(paths, args.workers, throttle)
+        print(f"limit {args.limit_mbps:6.0f} MB/s {rate:9.1f} MB/s")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
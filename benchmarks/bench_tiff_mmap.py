@@ -0,0 +1,97 @@
+"""Compare reading plain TIFFs into memory with mapping them copy-on-write.
+
+Writes one synthetic uncompressed uint16 TIFF stack, then, for each read mode,
+runs in a fresh process: ImageReader.read_image() followed by an in-place pass
+over a fraction of the frames (standing in for dpcore.prepare_image). Prints
+the read time, the total time and the peak RSS of each mode. Does not need
+the JetRaw libraries.
+
+Usage::
+
+    python benchmarks/bench_tiff_mmap.py [--size-mb 1024] [--touch 1.0] [--workdir DIR]
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tifffile
+
+FRAME_SHAPE = (2048, 2048)
+
+
+def write_input(path: str, size_mb: float) -> None:
+    frame_bytes = FRAME_SHAPE[0] * FRAME_SHAPE[1] * 2
+    n_frames = max(2, int(size_mb * 1024**2 // frame_bytes))
+    rng = np.random.default_rng(0)
+    frame = (100 + rng.poisson(50, size=FRAME_SHAPE)).astype(np.uint16)
+    with tifffile.TiffWriter(path) as tif:
+        for _ in range(n_frames):
+            tif.write(frame, contiguous=True)
+
+
+def measure(path: str, memory_map: bool, touch: float) -> None:
+    """Run one mode in this process and print its timings and peak RSS."""
+    from jetraw_tools.image_reader import ImageReader
+
+    start = time.perf_counter()
+    reader = ImageReader(path, ".tif", read_metadata=False, memory_map=memory_map)
+    image, _ = reader.read_image()
+    read_done = time.perf_counter()
+    for frame in image[: int(round(len(image) * touch))]:
+        frame += 1
+    done = time.perf_counter()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"memory_map={memory_map!s:<5} read {read_done - start:7.3f} s  "
+        f"total {done - start:7.3f} s  peak RSS {peak_mb:8.1f} MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=1024)
+    parser.add_argument(
+        "--touch", type=float, default=1.0, help="Fraction of frames modified"
+    )
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--measure", choices=("mmap", "read"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.path, args.measure == "mmap", args.touch)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jetraw_mmap_")
+    path = os.path.join(workdir, "stack.tif")
+    try:
+        write_input(path, args.size_mb)
+        print(f"{os.path.getsize(path) / 1024**2:.0f} MB, touching {args.touch:.0%}")
+        for mode in ("read", "mmap"):
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--measure",
+                    mode,
+                    "--path",
+                    path,
+                    "--touch",
+                    str(args.touch),
+                ],
+                check=True,
+            )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
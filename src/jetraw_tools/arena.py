@@ -0,0 +1,204 @@
+"""Per-process pool of image buffers reused across files of the same shape.
+
+Batches usually hold thousands of acquisitions of identical shape. Reading,
+converting and decoding each of them into freshly allocated arrays churns the
+allocator and fragments the heap of long-running workers, so buffers are
+borrowed from a :class:`BufferArena` and given back once the file is done.
+"""
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Upper bound of the bytes kept in the free buffers of one arena
+DEFAULT_ARENA_BYTES = 512 * 1024**2
+
+# The arena of this process, see get_arena
+_arena: dict = {}
+
+
+class BufferArena:
+    """Free lists of uninitialised arrays keyed by (shape, dtype).
+
+    Buffers that are given back are kept for the next borrower of the same
+    shape and dtype. When the free buffers exceed ``max_bytes``, the least
+    recently returned ones are released. Buffers larger than ``max_bytes``
+    are never kept. Borrowed buffers are only tracked by weak reference, so
+    a buffer that is never given back is freed as usual once dropped. The
+    arena is thread-safe.
+
+    :param max_bytes: Upper bound of the bytes held in free buffers
+    :type max_bytes: int
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_ARENA_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._free: "OrderedDict[Tuple[tuple, str], List[np.ndarray]]" = OrderedDict()
+        # Weak references to the borrowed buffers, by id
+        self._borrowed: Dict[int, weakref.ref] = {}
+        self._free_bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "allocated_bytes": 0,
+            "reused_bytes": 0,
+            "peak_free_bytes": 0,
+        }
+
+    def borrow(self, shape: tuple, dtype=np.uint16) -> np.ndarray:
+        """Borrow an uninitialised C-contiguous array.
+
+        :param shape: Shape of the array
+        :type shape: tuple
+        :param dtype: Data type of the array
+        :returns: An array the caller must fully overwrite
+        :rtype: np.ndarray
+        """
+        key = (tuple(int(n) for n in shape), np.dtype(dtype).str)
+        with self._lock:
+            buffers = self._free.get(key)
+            if buffers:
+                buffer = buffers.pop()
+                if not buffers:
+                    del self._free[key]
+                self._free_bytes -= buffer.nbytes
+                self._stats["hits"] += 1
+                self._stats["reused_bytes"] += buffer.nbytes
+            else:
+                buffer = np.empty(key[0], dtype=key[1])
+                self._stats["misses"] += 1
+                self._stats["allocated_bytes"] += buffer.nbytes
+            self._borrowed[id(buffer)] = weakref.ref(buffer, self._forget(id(buffer)))
+        return buffer
+
+    def _forget(self, key: int):
+        """Return the callback dropping a borrowed buffer that was freed."""
+        borrowed = self._borrowed
+
+        def forget(ref: weakref.ref) -> None:
+            # May run in the middle of any code of this thread, so no lock
+            if borrowed.get(key) is ref:
+                borrowed.pop(key, None)
+
+        return forget
+
+    def _is_borrowed(self, array: np.ndarray) -> bool:
+        ref = self._borrowed.get(id(array))
+        return ref is not None and ref() is array
+
+    def give_back(self, array: Optional[np.ndarray]) -> None:
+        """Return a borrowed array, or a view of one, to the arena.
+
+        Arrays that were not borrowed from this arena are ignored, so callers
+        can give back whatever array they ended up with. The array must not be
+        used afterwards.
+
+        :param array: The borrowed array or a view of it
+        :type array: Optional[np.ndarray]
+        """
+        while isinstance(array, np.ndarray) and not self._is_borrowed(array):
+            array = array.base
+        if array is None or not isinstance(array, np.ndarray):
+            return
+        with self._lock:
+            ref = self._borrowed.pop(id(array), None)
+            if ref is None or ref() is not array or array.nbytes > self.max_bytes:
+                return
+            buffer = array
+            key = (buffer.shape, buffer.dtype.str)
+            self._free.setdefault(key, []).append(buffer)
+            self._free.move_to_end(key)
+            self._free_bytes += buffer.nbytes
+            while self._free_bytes > self.max_bytes:
+                _, buffers = next(iter(self._free.items()))
+                evicted = buffers.pop(0)
+                if not buffers:
+                    self._free.popitem(last=False)
+                self._free_bytes -= evicted.nbytes
+                self._stats["evictions"] += 1
+            self._stats["peak_free_bytes"] = max(
+                self._stats["peak_free_bytes"], self._free_bytes
+            )
+
+    def clear(self) -> None:
+        """Release all free buffers."""
+        with self._lock:
+            self._free.clear()
+            self._free_bytes = 0
+
+    def stats(self) -> dict:
+        """Return the allocation statistics of the arena.
+
+        :returns: Counts of 'hits', 'misses' and 'evictions', the
+            'allocated_bytes' and 'reused_bytes' served, the 'free_bytes' held
+            now and at most ('peak_free_bytes'), and the process 'pid'
+        :rtype: dict
+        """
+        with self._lock:
+            return {**self._stats, "free_bytes": self._free_bytes, "pid": os.getpid()}
+
+
+def get_arena() -> BufferArena:
+    """Return the arena of the current process, creating it if needed.
+
+    A forked child does not reuse the arena inherited from its parent, so the
+    statistics of each worker only cover its own work.
+
+    :returns: The arena of this process
+    :rtype: BufferArena
+    """
+    pid = os.getpid()
+    if _arena.get("pid") != pid:
+        _arena["arena"] = BufferArena()
+        _arena["pid"] = pid
+    return _arena["arena"]
+
+
+def merge_stats(stats: List[dict]) -> dict:
+    """Sum the statistics of the arenas of several processes.
+
+    :param stats: Statistics as returned by :meth:`BufferArena.stats`
+    :type stats: List[dict]
+    :returns: Summed statistics, with the number of 'processes'
+    :rtype: dict
+    """
+    merged = {
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "allocated_bytes": 0,
+        "reused_bytes": 0,
+        "free_bytes": 0,
+        "peak_free_bytes": 0,
+    }
+    for item in stats:
+        for name in merged:
+            merged[name] += item[name]
+    merged["processes"] = len(stats)
+    return merged
+
+
+def describe_stats(stats: dict) -> str:
+    """Format merged arena statistics for the run summary.
+
+    :param stats: Statistics as returned by :func:`merge_stats`
+    :type stats: dict
+    :returns: One-line description
+    :rtype: str
+    """
+    requests = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / requests if requests else 0.0
+    return (
+        f"Buffer arena: {requests} buffers served in {stats['processes']} "
+        f"processes, {hit_rate:.0%} reused "
+        f"({stats['reused_bytes'] / 1024**2:.1f} MB reused, "
+        f"{stats['allocated_bytes'] / 1024**2:.1f} MB allocated), "
+        f"{stats['evictions']} evicted, "
+        f"peak {stats['peak_free_bytes'] / 1024**2:.1f} MB held"
+    )
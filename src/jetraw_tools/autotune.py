@@ -0,0 +1,180 @@
+"""Hill-climbing controller for the number of busy workers.
+
+The best worker count depends on where the batch is bound: on local NVMe
+compression is CPU-bound and every core helps, on a NAS the storage is the
+bottleneck and extra workers only thrash it. :class:`ConcurrencyTuner`
+measures the aggregate throughput and the host I/O wait over fixed windows
+while the batch runs, and moves the worker count one step at a time towards
+the highest throughput.
+"""
+
+from typing import List, Optional
+
+from .logger import logger
+from .resources import cpu_times
+
+# Value of --ncores that enables the tuner
+AUTO_TUNE = "auto-tune"
+
+# Seconds of work measured before each decision
+TUNE_INTERVAL = 10.0
+
+# Relative throughput change below which two windows are considered equal
+TOLERANCE = 0.05
+
+# Share of CPU time spent waiting for I/O above which the batch is I/O-bound
+IOWAIT_HIGH = 0.3
+
+
+class ConcurrencyTuner:
+    """Choose the number of busy workers from the observed throughput.
+
+    After every window of at least ``interval`` seconds, and at least one
+    completed file per worker, the throughput of the window is compared with
+    the previous one. The worker count keeps moving in the same direction
+    while throughput improves and turns around when it drops. When two
+    windows perform the same, fewer workers are preferred, and a batch that
+    starts with the host mostly waiting for I/O is first tried with fewer.
+
+    :param max_workers: Upper bound of the worker count
+    :type max_workers: int
+    :param min_workers: Lower bound of the worker count
+    :type min_workers: int
+    :param initial: Worker count of the first window, half of max_workers if
+        None
+    :type initial: Optional[int]
+    :param interval: Minimum duration of a window in seconds
+    :type interval: float
+    :param step: Workers added or removed per decision, an eighth of
+        max_workers if None
+    :type step: Optional[int]
+    :param stat: Path to the stat file read for the I/O wait
+    :type stat: str
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        min_workers: int = 1,
+        initial: Optional[int] = None,
+        interval: float = TUNE_INTERVAL,
+        step: Optional[int] = None,
+        stat: str = "/proc/stat",
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        if initial is None:
+            initial = (self.max_workers + 1) // 2
+        self.workers = max(self.min_workers, min(initial, self.max_workers))
+        self.interval = interval
+        self.step = step or max(1, self.max_workers // 8)
+        self.stat = stat
+        # One entry per window: 'start', 'workers', 'mb_per_s' and 'iowait'
+        self.history: List[dict] = []
+        self._direction = 1
+        # Whether the worker count changed before the current window
+        self._moved = True
+        self._previous_rate: Optional[float] = None
+        self._origin: Optional[float] = None
+        self._window_start: Optional[float] = None
+        self._window_bytes = 0
+        self._window_files = 0
+        self._cpu = cpu_times(stat)
+
+    def observe(self, n_bytes: int) -> None:
+        """Record a completed file.
+
+        :param n_bytes: Input size of the file in bytes
+        :type n_bytes: int
+        """
+        self._window_bytes += n_bytes
+        self._window_files += 1
+
+    def _iowait(self) -> Optional[float]:
+        """Return the I/O wait share of the host since the last call."""
+        cpu = cpu_times(self.stat)
+        previous, self._cpu = self._cpu, cpu
+        if cpu is None or previous is None or cpu[0] <= previous[0]:
+            return None
+        return (cpu[1] - previous[1]) / (cpu[0] - previous[0])
+
+    def update(self, now: float) -> Optional[int]:
+        """Close the current window if it is complete and pick the next count.
+
+        :param now: Current ``time.monotonic()``
+        :type now: float
+        :returns: The new worker count, or None if it did not change
+        :rtype: Optional[int]
+        """
+        if self._window_start is None:
+            self._origin = self._window_start = now
+            self._iowait()
+            return None
+        elapsed = now - self._window_start
+        if elapsed < self.interval or self._window_files < self.workers:
+            return None
+
+        rate = self._window_bytes / elapsed
+        iowait = self._iowait()
+        self.history.append(
+            {
+                "start": self._window_start - self._origin,
+                "workers": self.workers,
+                "mb_per_s": rate / 1024**2,
+                "iowait": iowait,
+            }
+        )
+        previous = self._previous_rate
+        self._previous_rate = rate
+        self._window_start = now
+        self._window_bytes = self._window_files = 0
+
+        if previous is None:
+            # An I/O-bound batch is first tried with fewer workers
+            if iowait is not None and iowait > IOWAIT_HIGH:
+                self._direction = -1
+        elif not self._moved:
+            # Held at a bound, probe the other way without judging
+            pass
+        elif rate < previous * (1 - TOLERANCE):
+            self._direction = -self._direction
+        elif rate <= previous * (1 + TOLERANCE):
+            self._direction = -1
+
+        workers = self.workers + self._direction * self.step
+        workers = max(self.min_workers, min(workers, self.max_workers))
+        iowait_text = "" if iowait is None else f", I/O wait {iowait:.0%}"
+        self._moved = workers != self.workers
+        if not self._moved:
+            # At a bound, try the other way next time
+            self._direction = -self._direction
+            logger.debug(
+                f"Auto-tune: {rate / 1024**2:.1f} MB/s with {self.workers} "
+                f"workers{iowait_text}, keeping {workers}"
+            )
+            return None
+        logger.info(
+            f"Auto-tune: {rate / 1024**2:.1f} MB/s with {self.workers} "
+            f"workers{iowait_text}, trying {workers}"
+        )
+        self.workers = workers
+        return workers
+
+    def summary(self) -> str:
+        """Describe the chosen concurrency for the run summary.
+
+        :returns: One-line description
+        :rtype: str
+        """
+        if not self.history:
+            return (
+                f"Auto-tune: ran with {self.workers} workers, the batch was too "
+                f"short to measure"
+            )
+        best = max(self.history, key=lambda window: window["mb_per_s"])
+        counts = " -> ".join(str(window["workers"]) for window in self.history)
+        return (
+            f"Auto-tune: finished with {self.workers} workers, best "
+            f"{best['mb_per_s']:.1f} MB/s with {best['workers']} workers "
+            f"(workers per window: {counts})"
+        )
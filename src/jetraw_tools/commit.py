@@ -0,0 +1,227 @@
+"""Write outputs under a temporary name and rename them once complete.
+
+An output is written, and its metadata patched in, under a hidden partial
+name in its final directory. Only then is it renamed to its final name, so
+a crash never leaves a truncated file that a later run would skip as
+processed. The partial files of a crashed run do not match any input and
+are overwritten when their input is processed again.
+
+Durability is set by ``sync_every``:
+
+* 1: every output is flushed to disk by the process that wrote it, before
+  it is renamed;
+* N > 1: the main process collects the outputs as their tasks finish and
+  flushes, then renames them, N at a time;
+* 0: outputs are flushed and renamed at the end of the run.
+
+The partial file is flushed before the rename and the directory after it,
+so a final name only ever points to complete data. Sources removed with
+``--remove`` are only removed once their output is committed.
+"""
+
+import os
+import threading
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from .logger import logger
+from .pagecache import drop_file
+
+# Prefix of the name of an output while it is written
+PARTIAL_PREFIX = ".partial-"
+
+# Suffixes of outputs whose metadata is also written as a JSON file
+_JSON_SUFFIXES = (".ome.p.tiff", ".p.tiff")
+
+
+class PendingOutput(NamedTuple):
+    """The files written for a task, waiting to be committed."""
+
+    # (partial path, final path) of each file written
+    files: List[Tuple[str, str]]
+    # Input to remove once the files are committed, if any
+    source: Optional[str] = None
+    # Key of the output in the index of the output folder, if any
+    key: Optional[str] = None
+
+
+def partial_path(path: str) -> str:
+    """Return the name an output is written under until it is complete.
+
+    :param path: Final path of the output
+    :type path: str
+    :returns: Path of the hidden partial file in the same directory
+    :rtype: str
+    """
+    folder, name = os.path.split(path)
+    return os.path.join(folder, PARTIAL_PREFIX + name)
+
+
+def written_files(path: str) -> List[Tuple[str, str]]:
+    """List the partial files written for an output and their final paths.
+
+    Besides the image, :func:`~jetraw_tools.tiff_writer.metadata_writer` may
+    have written the metadata as JSON next to it, named after the image
+    without its ".p.tiff" or ".ome.p.tiff" suffix depending on the metadata.
+
+    :param path: Final path of the output
+    :type path: str
+    :returns: (partial path, final path) of each file that exists
+    :rtype: List[Tuple[str, str]]
+    """
+    files = [(partial_path(path), path)]
+    for suffix in _JSON_SUFFIXES:
+        if path.endswith(suffix):
+            json_path = path[: -len(suffix)] + ".json"
+            files.append((partial_path(json_path), json_path))
+    return [(partial, final) for partial, final in files if os.path.exists(partial)]
+
+
+def _sync(path: str, directory: bool = False) -> None:
+    """Flush a file, or the entries of a directory, to disk."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        if not directory and hasattr(os, "fdatasync"):
+            os.fdatasync(fd)
+        else:
+            os.fsync(fd)
+    except OSError:
+        # Directories cannot be flushed on every platform
+        pass
+    finally:
+        os.close(fd)
+
+
+def commit_files(files: List[Tuple[str, str]], sync: bool = True) -> None:
+    """Rename partial files to their final names.
+
+    :param files: (partial path, final path) of each file
+    :type files: List[Tuple[str, str]]
+    :param sync: Flush the files before, and their directories after, the
+        rename
+    :type sync: bool
+    """
+    if sync:
+        for partial, _ in files:
+            _sync(partial)
+    for partial, final in files:
+        os.replace(partial, final)
+    if sync:
+        for folder in {os.path.dirname(final) for _, final in files}:
+            _sync(folder or ".", directory=True)
+
+
+def discard_files(path: str) -> None:
+    """Remove the partial files of an output that failed.
+
+    :param path: Final path of the output
+    :type path: str
+    """
+    for partial, _ in written_files(path):
+        os.remove(partial)
+
+
+class OutputCommitter:
+    """Commit the outputs of finished tasks in batches, in the main process.
+
+    :param sync_every: Number of outputs flushed and renamed together, 0 to
+        commit them all at the end of the run
+    :type sync_every: int
+    :param remove_source: Called with (final output, source) to remove the
+        source of a task once its output is committed
+    :type remove_source: Callable[[str, str], None]
+    :param cache_hints: Drop the outputs from the page cache once flushed
+    :type cache_hints: bool
+    :param on_commit: Called with (index key, final output) for the outputs
+        that have an index key, once committed
+    :type on_commit: Optional[Callable[[str, str], None]]
+    """
+
+    def __init__(
+        self,
+        sync_every: int,
+        remove_source: Callable[[str, str], None],
+        cache_hints: bool = True,
+        on_commit: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        self.sync_every = sync_every
+        self.remove_source = remove_source
+        self.cache_hints = cache_hints
+        self.on_commit = on_commit
+        self.committed = 0
+        self.batches = 0
+        self._pending: List[PendingOutput] = []
+        # The scratch mover adds outputs from its own threads
+        self._lock = threading.RLock()
+
+    def add(self, outputs: List[PendingOutput]) -> int:
+        """Queue the outputs of a finished task, committing a batch when full.
+
+        :param outputs: The outputs of the task
+        :type outputs: List[PendingOutput]
+        :returns: Number of outputs that could not be committed
+        :rtype: int
+        """
+        with self._lock:
+            self._pending.extend(outputs)
+            if self.sync_every and len(self._pending) >= self.sync_every:
+                return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """Commit the queued outputs and remove their sources.
+
+        The files of the batch are flushed together, then each output is
+        renamed on its own, so one that fails leaves the others committed.
+
+        :returns: Number of outputs that could not be committed
+        :rtype: int
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            for output in pending:
+                for partial, _ in output.files:
+                    _sync(partial)
+            failed = 0
+            committed = []
+            for output in pending:
+                try:
+                    commit_files(output.files, sync=False)
+                except OSError as e:
+                    name = output.files[0][1] if output.files else output.source
+                    logger.error(f"Could not commit {name}: {e}")
+                    failed += 1
+                    continue
+                committed.append(output)
+            folders = {
+                os.path.dirname(final)
+                for output in committed
+                for _, final in output.files
+            }
+            for folder in folders:
+                _sync(folder or ".", directory=True)
+            self.batches += 1
+            self.committed += len(committed)
+            for output in committed:
+                if not output.files:
+                    continue
+                image = output.files[0][1]
+                if output.key is not None and self.on_commit is not None:
+                    self.on_commit(output.key, image)
+                if output.source is not None:
+                    self.remove_source(image, output.source)
+                if self.cache_hints:
+                    drop_file(image)
+        return failed
+
+    def describe(self) -> str:
+        """Describe the commits for the run summary.
+
+        :returns: One-line description
+        :rtype: str
+        """
+        return f"Committed {self.committed} outputs in {self.batches} flushes"
@@ -3,15 +3,71 @@ import logging
 import numpy as np
 import tifffile
 import locale
+import itertools
 import multiprocessing
-from typing import Optional
+from typing import Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Local package imports
-from .dpcore import load_parameters
-from .utils import prepare_images, add_extension, create_compress_folder
+from .dpcore import ensure_parameters
+from .utils import (
+    add_extension,
+    as_compressible,
+    create_compress_folder,
+    prepare_images,
+)
 from .tiff_writer import imwrite, metadata_writer
-from .image_reader import ImageReader
+from .image_reader import VALID_SPLIT_AXES, ImageReader, count_positions
 from .logger import logger
+from .plane_split import (
+    SPLIT_MIN_FILE_SIZE,
+    can_split,
+    next_unit,
+    plan_chunks,
+    split_worker,
+    unit_layout,
+)
+from .shm_transport import FrameRing
+from .tiff_writer import TiffWriter_5D
+from .resources import detect_resources, memory_bound_workers
+from .arena import describe_stats, get_arena, merge_stats
+from .autotune import ConcurrencyTuner
+from .pagecache import drop_file
+from .commit import (
+    OutputCommitter,
+    PendingOutput,
+    commit_files,
+    discard_files,
+    partial_path,
+    written_files,
+)
+from .prefetch import DEFAULT_PREFETCH_DEPTH, PrefetchCache, Prefetcher
+from .scratch import DEFAULT_SCRATCH_QUOTA, ScratchArea, ScratchMover
+from .sharding import OutputIndex, index_key, next_slot, parse_layout
+from .throttle import (
+    IOThrottle,
+    get_throttle,
+    install_throttle,
+    parse_hours,
+    throttle_write,
+)
+from .worker_pool import (
+    RecyclePolicy,
+    TimeoutPolicy,
+    WorkerPool,
+    describe_reports,
+)
+from .workers import (
+    PRELOAD_ENV,
+    VALID_BACKENDS,
+    bootstrap_worker,
+    compute_chunksize,
+    init_worker,
+    resolve_backend,
+    run_job_task,
+    run_task,
+    task_output_folder,
+)
 
 
 class CompressionTool:
@@ -30,6 +86,92 @@ class CompressionTool:
     :type omit_processed: bool, optional
     :param verbose: Enable detailed logging output
     :type verbose: bool, optional
+    :param metadata_format: Preferred metadata format ('ome' or 'imagej')
+    :type metadata_format: str, optional
+    :param licence_key: JetRaw license key set in every worker process
+    :type licence_key: str, optional
+    :param start_method: Multiprocessing start method ('fork', 'spawn' or
+        'forkserver'). None uses the platform default. With 'forkserver' the
+        JetRaw libraries, license and calibration are preloaded in the server
+        so new workers start warm.
+    :type start_method: str, optional
+    :param backend: Execution backend: 'processes', 'threads' or 'auto'.
+        'auto' uses threads when the median input file is small, where
+        process startup and result IPC would dominate the runtime.
+    :type backend: str, optional
+    :param split_large_files: When compressing fewer files than workers,
+        split files larger than SPLIT_MIN_FILE_SIZE into page ranges that are
+        read and prepared by all workers in parallel.
+    :type split_large_files: bool, optional
+    :param split_axis: Axis along which each input is split into separate
+        outputs when compressing. 'P' writes one file per stage position of
+        ND2 inputs, each with the metadata of its position. None (default)
+        writes one output per input.
+    :type split_axis: str, optional
+    :param max_tasks_per_worker: Replace a worker process by a fresh one
+        after this many files. 0 (default) disables the limit.
+    :type max_tasks_per_worker: int, optional
+    :param max_bytes_per_worker: Replace a worker process after it read this
+        many input bytes. 0 (default) disables the limit.
+    :type max_bytes_per_worker: int, optional
+    :param max_worker_rss: Replace a worker process, between two files, once
+        its resident memory exceeds this many bytes. 0 (default) disables it.
+    :type max_worker_rss: int, optional
+    :param file_timeout: Seconds a worker process may spend on one file
+        before it is killed, plus timeout_per_gb per GB of input. The file is
+        retried once, then counted as failed. 0 (default) disables the limit.
+    :type file_timeout: float, optional
+    :param timeout_per_gb: Seconds added to the file timeout per GB of input.
+    :type timeout_per_gb: float, optional
+    :param straggler_factor: Also kill a worker whose file takes this many
+        times longer than the median rate of the run predicts. 0 (default)
+        disables straggler detection.
+    :type straggler_factor: float, optional
+    :param auto_tune: Adjust the number of busy worker processes while the
+        batch runs to maximise throughput, up to ncores (or the usable CPUs
+        when ncores is 0), see :class:`~jetraw_tools.autotune.ConcurrencyTuner`.
+    :type auto_tune: bool, optional
+    :param max_read_rate: Limit of the bytes per second read by all workers
+        together. 0 (default) does not limit reads.
+    :type max_read_rate: float, optional
+    :param max_write_rate: Limit of the bytes per second written by all
+        workers together. 0 (default) does not limit writes.
+    :type max_write_rate: float, optional
+    :param throttle_hours: Time windows in which the read and write limits
+        apply, e.g. "08:00-20:00". None (default) applies them all day.
+    :type throttle_hours: str, optional
+    :param cache_hints: Announce inputs as read once sequentially, and drop
+        inputs and outputs from the page cache once a file is done, so a
+        large batch does not evict the cache of other services. Outputs are
+        flushed to disk before they are dropped. Defaults to True.
+    :type cache_hints: bool, optional
+    :param scratch_dir: Directory on fast local disk where outputs are
+        written first, then moved to the output folder by background threads
+        with large sequential copies, see :mod:`jetraw_tools.scratch`. Only
+        used for folders of inputs. None (default) writes outputs in place.
+    :type scratch_dir: str, optional
+    :param scratch_quota: Upper bound of the bytes of outputs waiting in the
+        scratch directory. Workers wait before starting a file while it is
+        reached, and this wait counts towards file_timeout. 0 disables it.
+    :type scratch_quota: int, optional
+    :param prefetch_dir: Directory on fast local disk where the next source
+        files are copied with large sequential reads while the current ones
+        are processed, see :mod:`jetraw_tools.prefetch`. Only used for
+        folders of inputs. None (default) reads sources in place.
+    :type prefetch_dir: str, optional
+    :param prefetch_depth: Number of source files copied ahead of the workers.
+    :type prefetch_depth: int, optional
+    :param sync_every: Outputs are written under a temporary name and renamed
+        once complete. 1 (default) flushes every output to disk before its
+        rename, N > 1 flushes and renames N outputs at a time and 0 all of
+        them at the end of the run, see :mod:`jetraw_tools.commit`.
+    :type sync_every: int, optional
+    :param shard_layout: Spread the outputs of a folder over subdirectories
+        of the output folder and record them in its index, "hash[:K]" by the
+        first K hex digits of the hash of the input name or "files[:N]" N
+        outputs per subdirectory, see :mod:`jetraw_tools.sharding`. None
+        (default) writes every output at the top of the output folder.
+    :type shard_layout: str, optional
     :raises FileNotFoundError: If the specified calibration file doesn't exist
     """
 
@@ -41,6 +183,28 @@ class CompressionTool:
         omit_processed: bool = True,
         verbose: bool = False,
         metadata_format: str = "ome",
+        licence_key: Optional[str] = None,
+        start_method: Optional[str] = None,
+        backend: str = "processes",
+        split_large_files: bool = True,
+        split_axis: Optional[str] = None,
+        max_tasks_per_worker: int = 0,
+        max_bytes_per_worker: int = 0,
+        max_worker_rss: int = 0,
+        file_timeout: float = 0.0,
+        timeout_per_gb: float = 0.0,
+        straggler_factor: float = 0.0,
+        auto_tune: bool = False,
+        max_read_rate: float = 0,
+        max_write_rate: float = 0,
+        throttle_hours: Optional[str] = None,
+        cache_hints: bool = True,
+        scratch_dir: Optional[str] = None,
+        scratch_quota: int = DEFAULT_SCRATCH_QUOTA,
+        prefetch_dir: Optional[str] = None,
+        prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+        sync_every: int = 1,
+        shard_layout: Optional[str] = None,
     ):
         """:no-index:"""
         # Check if calibration file exists
@@ -57,9 +221,84 @@ class CompressionTool:
         self.omit_processed = omit_processed
         self.verbose = verbose
         self.metadata_format = metadata_format
+        self.licence_key = licence_key
+        self.start_method = start_method
+        if backend not in VALID_BACKENDS:
+            raise ValueError(
+                f"backend must be one of {VALID_BACKENDS}, got {backend!r}."
+            )
+        self.backend = backend
+        self.split_large_files = split_large_files
+        if split_axis is not None and split_axis not in VALID_SPLIT_AXES:
+            raise ValueError(
+                f"split_axis must be one of {VALID_SPLIT_AXES}, got {split_axis!r}."
+            )
+        self.split_axis = split_axis
+        # Worker recycling limits, 0 disables a limit
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_bytes_per_worker = max_bytes_per_worker
+        self.max_worker_rss = max_worker_rss
+        # Per-file time limits, 0 disables a limit
+        self.file_timeout = file_timeout
+        self.timeout_per_gb = timeout_per_gb
+        self.straggler_factor = straggler_factor
+        self.auto_tune = auto_tune
+        # Bandwidth limits shared by all workers, 0 disables a limit
+        parse_hours(throttle_hours)
+        self.max_read_rate = max_read_rate
+        self.max_write_rate = max_write_rate
+        self.throttle_hours = throttle_hours
+        self.cache_hints = cache_hints
+        self.scratch_dir = scratch_dir
+        self.scratch_quota = scratch_quota
+        self.prefetch_dir = prefetch_dir
+        self.prefetch_depth = prefetch_depth
+        if sync_every < 0:
+            raise ValueError(f"sync_every must be 0 or more, got {sync_every}.")
+        self.sync_every = sync_every
+        parse_layout(shard_layout)
+        self.shard_layout = shard_layout
         if verbose:
             logger.setLevel(logging.DEBUG)
 
+    def _worker_config(self) -> dict:
+        """
+        Return the constructor arguments needed to rebuild this tool in a worker.
+
+        :return: A dictionary of keyword arguments for CompressionTool.
+        """
+
+        return {
+            "calibration_file": self.calibration_file,
+            "identifier": self.identifier,
+            "ncores": self.ncores,
+            "omit_processed": self.omit_processed,
+            "verbose": self.verbose,
+            "metadata_format": self.metadata_format,
+            "licence_key": self.licence_key,
+            "start_method": self.start_method,
+            "backend": self.backend,
+            "split_large_files": self.split_large_files,
+            "split_axis": self.split_axis,
+            "max_tasks_per_worker": self.max_tasks_per_worker,
+            "max_bytes_per_worker": self.max_bytes_per_worker,
+            "max_worker_rss": self.max_worker_rss,
+            "file_timeout": self.file_timeout,
+            "timeout_per_gb": self.timeout_per_gb,
+            "straggler_factor": self.straggler_factor,
+            "auto_tune": self.auto_tune,
+            "max_read_rate": self.max_read_rate,
+            "max_write_rate": self.max_write_rate,
+            "throttle_hours": self.throttle_hours,
+            "cache_hints": self.cache_hints,
+            "scratch_dir": self.scratch_dir,
+            "scratch_quota": self.scratch_quota,
+            "prefetch_dir": self.prefetch_dir,
+            "prefetch_depth": self.prefetch_depth,
+            "sync_every": self.sync_every,
+            "shard_layout": self.shard_layout,
+        }
+
     def list_files(self, folder_path: str, image_extension: str) -> list:
         """
         List all files in a folder with a specific extension.
@@ -80,6 +319,23 @@ class CompressionTool:
 
         return image_files
 
+    def _file_sizes(self, folder_path: str, image_files: list) -> list:
+        """
+        Return the size in bytes of each input file (0 if it cannot be read).
+
+        :param folder_path: The path to the folder containing the images.
+        :param image_files: The image file names.
+        :return: A list of file sizes, in the order of image_files.
+        """
+
+        sizes = []
+        for image_file in image_files:
+            try:
+                sizes.append(os.path.getsize(os.path.join(folder_path, image_file)))
+            except OSError:
+                sizes.append(0)
+        return sizes
+
     def remove_files(self, output_tiff_filename: str, input_filename: str) -> None:
         """
         Remove original file after successful compression.
@@ -118,25 +374,109 @@ class CompressionTool:
 
         # Prepare input image
         locale.setlocale(locale.LC_ALL, locale.getlocale())
-        img_map = np.ascontiguousarray(img_map, dtype=img_map.dtype)
-        load_parameters(self.calibration_file)
-        prepare_images(img_map, identifier=self.identifier)
+        # The pixels are prepared in place; at most one conversion copy is made
+        arena = get_arena()
+        converted = as_compressible(img_map, arena=arena)
+        try:
+            ensure_parameters(self.calibration_file)
+            prepare_images(converted, identifier=self.identifier)
 
-        # Compress input image to JetRaw compressed TIFF format
-        imwrite(target_file, img_map, description="")
-        if metadata:
-            if not ome_bool:
-                imageJ_metadata = True
-            else:
-                imageJ_metadata = False
-            metadata_writer(
-                target_file,
-                metadata=metadata,
-                ome_bool=ome_bool,
-                imagej=imageJ_metadata,
-                as_json=metadata_json,
+            # Compress input image to JetRaw compressed TIFF format
+            imwrite(target_file, converted, description="")
+        finally:
+            if converted is not img_map:
+                arena.give_back(converted)
+        self._write_metadata(target_file, metadata, ome_bool, metadata_json)
+
+        logger.debug(f"Successfully compressed image to: {target_file}")
+        return True
+
+    def compress_image_split(
+        self,
+        input_filename: str,
+        target_file: str,
+        image_extension: str,
+        metadata: dict,
+        num_workers: int,
+        ome_bool: bool = True,
+        metadata_json: bool = True,
+    ) -> bool:
+        """
+        Compress one large image with several worker processes.
+
+        The file is split into chunks of page blocks that the workers read and
+        prepare in parallel, while this process appends the prepared pages to
+        the output in order (see :mod:`jetraw_tools.plane_split`).
+
+        :param input_filename: Path to the image file to compress
+        :param target_file: Output path for the compressed file
+        :param image_extension: The image file extension.
+        :param metadata: Dictionary containing image metadata
+        :param num_workers: Number of worker processes.
+        :param ome_bool: Save metadata in OME format
+        :param metadata_json: Additionally save metadata as JSON
+        :return: True if compression was successful
+        :raises ValueError: If the file cannot be split
+        :raises RuntimeError: If a worker fails
+        """
+
+        n_units, unit_shape = unit_layout(input_filename, image_extension)
+        unit_bytes = int(np.prod(unit_shape)) * 2
+        chunks = plan_chunks(n_units, num_workers, unit_bytes)
+        num_workers = max(1, min(num_workers, len(chunks)))
+        slots = 2 * max(len(chunk) for chunk in chunks) if chunks else 1
+        logger.debug(
+            f"Splitting {os.path.basename(input_filename)} into {len(chunks)} "
+            f"chunks over {num_workers} workers"
+        )
+
+        context = multiprocessing.get_context(self.start_method)
+        rings = [FrameRing(slots, unit_shape, ctx=context) for _ in range(num_workers)]
+        processes = [
+            context.Process(
+                target=split_worker,
+                args=(
+                    rings[worker],
+                    input_filename,
+                    image_extension,
+                    chunks[worker::num_workers],
+                    self.identifier,
+                    self.calibration_file,
+                    self.licence_key,
+                    get_throttle(),
+                ),
+                daemon=True,
             )
+            for worker in range(num_workers)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            with TiffWriter_5D(target_file, "") as writer:
+                for chunk_index, chunk in enumerate(chunks):
+                    worker = chunk_index % num_workers
+                    for index in chunk:
+                        unit = next_unit(rings[worker], processes[worker])
+                        if unit.meta != index:
+                            raise RuntimeError(
+                                f"Expected unit {index}, received {unit.meta}."
+                            )
+                        writer.write(unit.array)
+                        rings[worker].release(unit.slot)
+                        del unit
+        except BaseException:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            raise
+        finally:
+            for process in processes:
+                if process.pid is not None:
+                    process.join()
+            for ring in rings:
+                ring.close()
 
+        self._write_metadata(target_file, metadata, ome_bool, metadata_json)
         logger.debug(f"Successfully compressed image to: {target_file}")
         return True
 
@@ -161,6 +501,27 @@ class CompressionTool:
 
         with tifffile.TiffWriter(target_file) as tif:
             tif.write(img_map)
+        throttle_write(os.path.getsize(target_file))
+        self._write_metadata(target_file, metadata, ome_bool, metadata_json)
+
+        return True
+
+    def _write_metadata(
+        self,
+        target_file: str,
+        metadata: dict,
+        ome_bool: bool,
+        metadata_json: bool,
+    ) -> None:
+        """
+        Write the metadata of a processed image, if there is any.
+
+        :param target_file: The processed image file
+        :param metadata: Dictionary containing image metadata
+        :param ome_bool: Save metadata in OME format, ImageJ otherwise
+        :param metadata_json: Additionally save metadata as JSON
+        """
+
         if metadata:
             if not ome_bool:
                 imageJ_metadata = True
@@ -175,7 +536,58 @@ class CompressionTool:
                 as_json=metadata_json,
             )
 
-        return True
+    def _output_filename(
+        self,
+        output_folder: str,
+        image_file: str,
+        mode: str,
+        image_extension: str,
+        ome_bool: bool,
+        position: Optional[int] = None,
+    ) -> str:
+        """
+        Return the path of the file written for an input image.
+
+        :param output_folder: The path to the folder of the processed images.
+        :param image_file: The name of the input image file.
+        :param mode: The mode, either "compress" or "decompress".
+        :param image_extension: The image file extension.
+        :param ome_bool: Whether OME metadata is written.
+        :param position: ND2 stage position written to its own output, if any.
+        :return: The output file path.
+        """
+
+        output_filename = os.path.join(output_folder, image_file)
+        if position is not None:
+            stem = image_file[: -len(image_extension)]
+            output_filename = os.path.join(
+                output_folder, f"{stem}_P{position:03d}{image_extension}"
+            )
+        return add_extension(output_filename, image_extension, mode=mode, ome=ome_bool)
+
+    def _discard_output(self, job: dict, task: tuple) -> None:
+        """
+        Remove the partial output of a task whose worker was stopped.
+
+        Outputs are written under a temporary name, see
+        :mod:`jetraw_tools.commit`, so this only reclaims the disk space.
+
+        :param job: Options shared by every task.
+        :param task: The task record of (file index, file name[, position]).
+        """
+
+        index, image_file, *position = task
+        output_filename = self._output_filename(
+            task_output_folder(job, index, image_file),
+            image_file,
+            job["mode"],
+            job["image_extension"],
+            job["ome_bool"],
+            position[0] if position else None,
+        )
+        if written_files(output_filename):
+            logger.warning(f"Removing the partial output of {output_filename}")
+            discard_files(output_filename)
 
     def process_image(
         self,
@@ -189,6 +601,11 @@ class CompressionTool:
         metadata_json: bool,
         remove_source: bool,
         progress_info: tuple,
+        num_workers: int = 1,
+        position: Optional[int] = None,
+        staged: bool = False,
+        read_from: Optional[str] = None,
+        pending: Optional[list] = None,
     ) -> int:
         """
         Process a single image for compression or decompression.
@@ -205,7 +622,18 @@ class CompressionTool:
         :param metadata_json: Whether to write metadata as JSON.
         :param remove_source: Whether to remove the source files after processing.
         :param progress_info: The total number of files to process.
-        :return: None
+        :param num_workers: Number of worker processes to split the file
+            across when compressing. 1 processes it in the current process.
+        :param position: ND2 stage position to extract into its own output,
+            None to process the whole file.
+        :param staged: Whether the output is written to a scratch area, from
+            where it is moved, so it stays in the page cache.
+        :param read_from: Local copy of the input to read instead of the
+            input, see :mod:`jetraw_tools.prefetch`.
+        :param pending: List the outputs are appended to, as a
+            :class:`~jetraw_tools.commit.PendingOutput`, under their temporary
+            name. None commits them right away.
+        :return: The number of files that failed (0 or 1).
         """
 
         if self.verbose:
@@ -215,26 +643,47 @@ class CompressionTool:
 
         # Input/output files
         input_filename = os.path.join(folder_path, image_file)
-        output_filename = os.path.join(output_folder, image_file)
-
-        output_filename = add_extension(
-            output_filename, image_extension, mode=mode, ome=ome_bool
+        read_filename = read_from or input_filename
+        final_filename = self._output_filename(
+            output_folder, image_file, mode, image_extension, ome_bool, position
         )
+        # A staging directory is renamed as a whole
+        output_filename = final_filename if staged else partial_path(final_filename)
 
         failed_files = 0
+        img_map = None
         try:
             # Read image (and metadata only if requested)
             image_reader = ImageReader(
-                input_filename,
+                read_filename,
                 image_extension,
                 metadata_format=self.metadata_format,
                 read_metadata=process_metadata,
+                position=position,
+                arena=get_arena(),
+                cache_hints=self.cache_hints,
+                # The prefetcher paced the copy from the source
+                throttle_reads=read_from is None,
             )
-            img_map, metadata = image_reader.read_image()
+            if mode == "compress" and num_workers > 1:
+                # The workers read the pixel data themselves
+                img_map, metadata = None, image_reader.read_metadata_only()
+            else:
+                img_map, metadata = image_reader.read_image()
             if metadata is None:
                 metadata = {}
 
-            if mode == "compress":
+            if img_map is None:
+                self.compress_image_split(
+                    read_filename,
+                    output_filename,
+                    image_extension,
+                    metadata,
+                    num_workers,
+                    ome_bool=ome_bool,
+                    metadata_json=metadata_json,
+                )
+            elif mode == "compress":
                 self.compress_image(
                     img_map,
                     output_filename,
@@ -255,14 +704,235 @@ class CompressionTool:
                 logger.error(error_msg)
                 raise ValueError(error_msg)
 
-            if remove_source:
-                self.remove_files(output_filename, input_filename)
+            # Reuse the buffer, and release a memory-mapped source before it is removed
+            get_arena().give_back(img_map)
+            img_map = None
+            # The source still holds the other positions
+            source = input_filename if remove_source and position is None else None
+            if staged:
+                # Committed by the scratch mover once copied to the output folder
+                pass
+            elif pending is not None:
+                pending.append(PendingOutput(written_files(final_filename), source))
+            else:
+                commit_files(written_files(final_filename), sync=self.sync_every == 1)
+                output_filename = final_filename
+                if source is not None:
+                    self.remove_files(final_filename, input_filename)
         except Exception as e:
+            get_arena().give_back(img_map)
             failed_files += 1
             logger.error(f"Error processing {image_file}: {e}")
+            if not staged:
+                discard_files(final_filename)
+
+        if self.cache_hints:
+            # This run reads neither file again. Outputs that were not flushed
+            # yet are only dropped once written back.
+            drop_file(input_filename)
+            if not staged:
+                drop_file(output_filename)
 
         return failed_files
 
+    def _run_processes(
+        self,
+        job: dict,
+        tasks: list,
+        file_sizes: list,
+        num_workers: int,
+        chunksize: int,
+        reports: list,
+        lost: list,
+        tuner: Optional[ConcurrencyTuner] = None,
+    ) -> Iterator[Tuple[int, dict, list]]:
+        """
+        Run tasks in a pool of worker processes, yielding results as they arrive.
+
+        Workers are replaced by fresh processes according to the recycling
+        limits of the tool, see :class:`~jetraw_tools.worker_pool.RecyclePolicy`,
+        and killed when stuck on a file beyond its time limit, see
+        :class:`~jetraw_tools.worker_pool.TimeoutPolicy`.
+
+        :param job: Options shared by every task, sent once to each worker.
+        :param tasks: Task records of (file index, file name).
+        :param file_sizes: The size of each file, in the order of tasks.
+        :param num_workers: Number of worker processes.
+        :param chunksize: Number of tasks handed to a worker per dispatch.
+        :param reports: List extended with one report per worker, see
+            :attr:`~jetraw_tools.worker_pool.WorkerPool.reports`.
+        :param lost: List extended with the (task, reason) of every task
+            whose worker died or that timed out too often.
+        :param tuner: Adjusts the number of busy workers, up to num_workers,
+            from the observed throughput. None keeps all of them busy.
+        :return: An iterator over the number of failed files per task, the
+            arena statistics of the process that ran it and its outputs left
+            to commit.
+        """
+
+        context = multiprocessing.get_context(self.start_method)
+        preload_env = {}
+        if self.start_method == "forkserver":
+            # The server inherits the environment when it starts with the pool
+            context.set_forkserver_preload(["jetraw_tools.preload"])
+            preload_env = {
+                PRELOAD_ENV["calibration"]: self.calibration_file or "",
+                PRELOAD_ENV["mode"]: job["mode"],
+            }
+            os.environ.update(preload_env)
+        pool = WorkerPool(
+            context,
+            num_workers,
+            run_task,
+            initializer=init_worker,
+            initargs=(self._worker_config(), job),
+            policy=RecyclePolicy(
+                self.max_tasks_per_worker,
+                self.max_bytes_per_worker,
+                self.max_worker_rss,
+            ),
+            timeout=TimeoutPolicy(
+                self.file_timeout, self.timeout_per_gb, self.straggler_factor
+            ),
+            tuner=tuner,
+            lost_result=(1, {}, []),
+            chunksize=chunksize,
+        )
+        try:
+            pool.start(len(tasks))
+        finally:
+            for name in preload_env:
+                os.environ.pop(name, None)
+        try:
+            yield from pool.imap_unordered(tasks, file_sizes)
+        finally:
+            reports.extend(pool.reports)
+            lost.extend(pool.lost)
+
+    def _split_tasks(
+        self,
+        folder_path: str,
+        tasks: list,
+        file_sizes: list,
+        mode: str,
+        image_extension: str,
+        num_workers: int,
+    ) -> list:
+        """
+        Select the files to compress with intra-file parallelism.
+
+        Files are only split when compressing fewer files than workers, as
+        otherwise every worker already has files of its own.
+
+        :param folder_path: The path to the folder containing the images.
+        :param tasks: Task records of (file index, file name).
+        :param file_sizes: The size of each file, in the order of tasks.
+        :param mode: The mode, either "compress" or "decompress".
+        :param image_extension: The image file extension.
+        :param num_workers: Number of workers.
+        :return: The task records of the files to split.
+        """
+
+        if (
+            mode != "compress"
+            or not self.split_large_files
+            or num_workers < 2
+            or len(tasks) >= num_workers
+        ):
+            return []
+        # Tasks of a single position (index, file, position) are never split
+        return [
+            task
+            for task, size in zip(tasks, file_sizes)
+            if len(task) == 2
+            and size >= SPLIT_MIN_FILE_SIZE
+            and can_split(os.path.join(folder_path, task[1]), image_extension)
+        ]
+
+    def _position_tasks(
+        self, folder_path: str, image_files: list, file_sizes: list
+    ) -> tuple:
+        """
+        Expand ND2 files with several stage positions into one task per position.
+
+        :param folder_path: The path to the folder containing the images.
+        :param image_files: The image file names.
+        :param file_sizes: The size of each file, in the order of image_files.
+        :return: Tuple of (task records, estimated input size of each task).
+            Files with a single position keep a (task index, file name) record,
+            the others get (task index, file name, position) records.
+        """
+
+        tasks = []
+        sizes = []
+        for image_file, size in zip(image_files, file_sizes):
+            try:
+                n_positions = count_positions(os.path.join(folder_path, image_file))
+            except Exception as e:
+                logger.warning(f"Could not read the positions of {image_file}: {e}")
+                n_positions = 1
+            if n_positions > 1:
+                for position in range(n_positions):
+                    tasks.append((len(tasks), image_file, position))
+                    sizes.append(size // n_positions)
+            else:
+                tasks.append((len(tasks), image_file))
+                sizes.append(size)
+        return tasks, sizes
+
+    def _run_split(
+        self, job: dict, tasks: list, num_workers: int
+    ) -> Iterator[Tuple[int, dict, list]]:
+        """
+        Compress files one after the other, each split across all workers.
+
+        :param job: Options shared by every task.
+        :param tasks: Task records of (file index, file name).
+        :param num_workers: Number of worker processes per file.
+        :return: An iterator over the number of failed files per task, the
+            arena statistics of the process that ran it and its outputs left
+            to commit.
+        """
+
+        # This process appends the pages, so it needs the libraries as well
+        bootstrap_worker(self.calibration_file, self.licence_key, job["mode"])
+        for index, image_file in tasks:
+            pending = []
+            failed_files = run_job_task(
+                self, job, index, image_file, pending=pending, num_workers=num_workers
+            )
+            yield failed_files, get_arena().stats(), pending
+
+    def _run_threads(
+        self, job: dict, tasks: list, num_workers: int
+    ) -> Iterator[Tuple[int, dict, list]]:
+        """
+        Run tasks in a pool of threads, yielding results as they complete.
+
+        The worker state is initialised once in the current process and shared
+        by all threads. The heavy lifting (DPCore, JetRaw and tifffile I/O)
+        happens in foreign calls that release the GIL.
+
+        :param job: Options shared by every task.
+        :param tasks: Task records of (file index, file name).
+        :param num_workers: Number of threads.
+        :return: An iterator over the number of failed files per task, the
+            arena statistics of the process that ran it and its outputs left
+            to commit.
+        """
+
+        init_worker(self._worker_config(), job)
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        try:
+            futures = [executor.submit(run_task, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
     def process_folder(
         self,
         folder_path: str,
@@ -312,8 +982,21 @@ class CompressionTool:
         logger.debug(f"Using output directory: {output_folder}")
         image_files = self.list_files(folder_path, image_extension)
 
+        # Outputs of a folder are spread over subdirectories and indexed
+        layout = output_index = indexed = None
+        if self.shard_layout and os.path.isdir(folder_path):
+            output_index = OutputIndex(output_folder)
+            indexed = output_index.load()
+            layout = parse_layout(self.shard_layout)
+            layout = layout._replace(base=next_slot(indexed, layout.size))
+            logger.debug(f"{len(indexed)} outputs in {output_index.path}")
+
         removed_count = 0
-        if self.omit_processed:
+        if self.omit_processed and indexed is not None:
+            original_count = len(image_files)
+            image_files = [file for file in image_files if file not in indexed]
+            removed_count = original_count - len(image_files)
+        elif self.omit_processed:
             processed_files = set()
             # Only list directory contents if output_folder is actually a directory
             if os.path.isdir(output_folder):
@@ -329,48 +1012,240 @@ class CompressionTool:
             ]
             removed_count = original_count - len(image_files)
 
-        total_files = len(image_files)
+        tasks = list(enumerate(image_files))
+        file_sizes = self._file_sizes(folder_path, image_files)
+        if mode == "compress" and self.split_axis == "P" and image_extension == ".nd2":
+            # One task per stage position, each written to its own file
+            tasks, file_sizes = self._position_tasks(
+                folder_path, image_files, file_sizes
+            )
+            if self.omit_processed and indexed:
+                kept = [
+                    (task, size)
+                    for task, size in zip(tasks, file_sizes)
+                    if index_key(*task[1:]) not in indexed
+                ]
+                tasks = [(i, *task[1:]) for i, (task, _) in enumerate(kept)]
+                file_sizes = [size for _, size in kept]
+            if remove_source and len(tasks) > len(image_files):
+                logger.warning(
+                    "Source files split by position are not removed after processing"
+                )
+        total_files = len(tasks)
 
         if self.verbose:
             logger.info(f"Total files to process: {total_files}")
             logger.info(f"Files already processed: {removed_count}")
-        # Create a pool of worker processes
+        # Options shared by every task, sent once to each worker
+        job = {
+            "folder_path": folder_path,
+            "output_folder": output_folder,
+            "mode": mode,
+            "image_extension": image_extension,
+            "process_metadata": process_metadata,
+            "ome_bool": ome_bool,
+            "metadata_json": metadata_json,
+            "remove_source": remove_source,
+            "total_files": total_files,
+            "layout": layout,
+            "index": output_index,
+        }
+        # One budget for all workers, so it is created before any of them
+        throttle = None
+        if self.max_read_rate or self.max_write_rate:
+            throttle = IOThrottle(
+                self.max_read_rate,
+                self.max_write_rate,
+                self.throttle_hours,
+                context=multiprocessing.get_context(self.start_method),
+            )
+            logger.info(throttle.describe())
+        job["throttle"] = throttle
+        # Outputs flushed in batches are renamed by this process
+        committer = None
+        if self.sync_every != 1:
+            committer = OutputCommitter(
+                self.sync_every,
+                self.remove_files,
+                cache_hints=self.cache_hints,
+                on_commit=output_index.append if output_index is not None else None,
+            )
+        # Outputs are staged on local disk and moved by this process
+        scratch = mover = None
+        if self.scratch_dir and os.path.isdir(folder_path):
+            scratch = ScratchArea(
+                self.scratch_dir,
+                self.scratch_quota,
+                context=multiprocessing.get_context(self.start_method),
+            )
+            mover = ScratchMover(
+                scratch,
+                cache_hints=self.cache_hints,
+                remove_source=self.remove_files,
+                on_moved=output_index.append if output_index is not None else None,
+                committer=committer,
+            )
+            mover.start()
+            logger.info(f"Staging outputs in {scratch.path}")
+        elif self.scratch_dir:
+            logger.debug("Single files are written in place, not staged")
+        job["scratch"] = scratch
+        resources = detect_resources()
         if self.ncores > 0:
-            pool = multiprocessing.Pool(processes=self.ncores)
+            num_workers = self.ncores
         else:
-            num_processes = multiprocessing.cpu_count()
-            pool = multiprocessing.Pool(processes=num_processes)
-
-        # Prepare arguments for the worker function
-        worker_args = [
-            (
-                folder_path,
-                output_folder,
-                image_file,
-                mode,
-                image_extension,
-                process_metadata,
-                ome_bool,
-                metadata_json,
-                remove_source,
-                (index + 1, total_files),
+            num_workers = resources["cpus"]
+
+        # Large files that would leave workers idle are split across all of them
+        split_tasks = self._split_tasks(
+            folder_path, tasks, file_sizes, mode, image_extension, num_workers
+        )
+        split_workers = num_workers
+        if split_tasks:
+            split_indices = {index for index, _ in split_tasks}
+            tasks = [task for task in tasks if task[0] not in split_indices]
+            file_sizes = [
+                size
+                for index, size in enumerate(file_sizes)
+                if index not in split_indices
+            ]
+
+        if file_sizes:
+            # Keep the largest files of concurrent workers within the memory budget
+            bounded_workers = memory_bound_workers(
+                num_workers, max(file_sizes), resources["memory_budget"]
+            )
+            if bounded_workers < num_workers:
+                logger.warning(
+                    f"Reducing workers from {num_workers} to {bounded_workers} to "
+                    f"fit the {resources['memory_budget'] / 1024**3:.1f} GB memory budget"
+                )
+                num_workers = bounded_workers
+        backend = resolve_backend(self.backend, file_sizes)
+        logger.debug(f"Using the '{backend}' backend with {num_workers} workers")
+
+        # Sources are copied in the order the tasks are dispatched
+        prefetcher = None
+        job["prefetch"] = None
+        if self.prefetch_dir and os.path.isdir(folder_path):
+            cache = PrefetchCache(
+                self.prefetch_dir,
+                total_files,
+                self.prefetch_depth,
+                context=multiprocessing.get_context(self.start_method),
+            )
+            # Tasks of a single position share their source with others
+            sources = [
+                (task[0], os.path.join(folder_path, task[1]))
+                for task in split_tasks + tasks
+                if len(task) == 2
+            ]
+            prefetcher = Prefetcher(
+                cache, sources, cache_hints=self.cache_hints, throttle=throttle
+            )
+            prefetcher.start()
+            job["prefetch"] = cache
+            logger.info(f"Prefetching sources to {cache.path}")
+        elif self.prefetch_dir:
+            logger.debug("Single files are read in place, not prefetched")
+
+        worker_reports = []
+        lost_tasks = []
+        tuner = None
+        if not tasks:
+            results = iter(())
+        elif backend == "threads":
+            if self.file_timeout or self.timeout_per_gb or self.straggler_factor:
+                logger.warning("File timeouts only apply to the 'processes' backend")
+            if self.auto_tune:
+                logger.warning("Auto-tuning only applies to the 'processes' backend")
+            results = self._run_threads(job, tasks, num_workers)
+        else:
+            chunksize = compute_chunksize(
+                len(tasks),
+                num_workers,
+                avg_file_size=sum(file_sizes) / len(tasks),
+            )
+            if self.auto_tune:
+                tuner = ConcurrencyTuner(num_workers)
+                logger.info(
+                    f"Auto-tuning between 1 and {num_workers} workers, "
+                    f"starting with {tuner.workers}"
+                )
+            results = self._run_processes(
+                job,
+                tasks,
+                file_sizes,
+                num_workers,
+                chunksize,
+                worker_reports,
+                lost_tasks,
+                tuner=tuner,
+            )
+        if split_tasks:
+            results = itertools.chain(
+                self._run_split(job, split_tasks, split_workers), results
             )
-            for index, image_file in enumerate(image_files)
-        ]
 
-        # Run the worker function in parallel
-        results = pool.starmap(self.process_image, worker_args)
+        # Consume results as they arrive
+        progress_step = max(1, total_files // 10)
+        completed = 0
+        failed = 0
+        # Latest arena statistics of each process
+        arena_stats = {}
+        # Threads and split files read and write in this process
+        install_throttle(throttle)
+        try:
+            for failed_files, stats, pending in results:
+                completed += 1
+                failed += failed_files
+                if committer is not None:
+                    failed += committer.add(pending)
+                if stats:
+                    arena_stats[stats["pid"]] = stats
+                if self.verbose and (
+                    completed % progress_step == 0 or completed == total_files
+                ):
+                    logger.info(
+                        f"Progress: {completed}/{total_files} files done, {failed} failed"
+                    )
+        finally:
+            install_throttle(None)
+            if prefetcher is not None:
+                prefetcher.close()
+            if mover is not None:
+                # Every output must have reached the output folder
+                failed += mover.finish()
+            if committer is not None:
+                failed += committer.flush()
 
-        # Close the pool and wait for all tasks to complete
-        pool.close()
-        pool.join()
+        for task, reason in lost_tasks:
+            logger.error(f"Failed to process {task[1]}: {reason}")
+            self._discard_output(job, task)
+        if tuner is not None:
+            logger.info(tuner.summary())
+        if prefetcher is not None:
+            logger.info(prefetcher.describe())
+        if mover is not None:
+            logger.info(mover.describe())
+        if committer is not None:
+            logger.info(committer.describe())
+        if output_index is not None:
+            n_entries, n_parts = output_index.merge()
+            logger.info(
+                f"Indexed {n_entries} outputs in {output_index.path} "
+                f"({n_parts} parts merged)"
+            )
 
         if self.verbose:
-            logger.info(f"Processed {len(image_files)} images")
-            failed = sum(results)
-            success_files = len(image_files) - failed
+            logger.info(f"Processed {total_files} images")
+            success_files = total_files - failed
             logger.info(
                 f"{success_files} files processed correctly and {failed} images failed to process"
             )
+            if arena_stats:
+                logger.info(describe_stats(merge_stats(list(arena_stats.values()))))
+            for line in describe_reports(worker_reports):
+                logger.info(line)
 
         return True
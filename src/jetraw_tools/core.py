@@ -1,5 +1,5 @@
-from .jetraw_tiff import (  # noqa: F401
-    _jetraw_lib,
+from .jetraw_tiff import (
+    _get_libs,
     dp_status_as_exception,
 )
 import ctypes
@@ -20,6 +20,7 @@ def encode_raw(image: np.ndarray) -> np.ndarray:
     if image.ndim != 2:
         raise ValueError("Image must be a 2D array.")
 
+    _jetraw_lib, _ = _get_libs()
     output = np.empty(image.size, dtype="b")
     output_size = ctypes.c_int32(output.size)
     dp_status_as_exception(_jetraw_lib.jetraw_encode)(
@@ -63,6 +64,7 @@ def decode_raw(raw_encoded_image: np.ndarray, output: np.ndarray) -> None:
     if raw_encoded_image.ndim != 1:
         raise ValueError("Encoded image data must be 1d.")
 
+    _jetraw_lib, _ = _get_libs()
     dp_status_as_exception(_jetraw_lib.jetraw_decode)(
         raw_encoded_image.ctypes.data_as(ctypes.c_char_p),
         raw_encoded_image.size,
@@ -1,7 +1,7 @@
 import ctypes
 import ctypes.util
 import functools
-from typing import Callable
+from typing import Callable, Optional
 import numpy as np
 from .libs import (
     _adapt_path_to_os,
@@ -9,6 +9,9 @@ from .libs import (
     JetrawLibraryError,
 )
 
+# Calibration file currently loaded into DPCore by this process
+_current_parameters: Optional[str] = None
+
 
 def _get_libs():
     """Get the loaded DPCore libraries.
@@ -82,9 +85,32 @@ def load_parameters(path: str) -> int:
     :returns: DPCore status code
     :rtype: int
     """
+    global _current_parameters
     _, _dpcore_lib = _get_libs()
     cpath = _adapt_path_to_os(path)
-    return _dpcore_lib.dpcore_load_parameters(cpath)
+    # DPCore holds a single active calibration; forget it until this load succeeds
+    _current_parameters = None
+    status = _dpcore_lib.dpcore_load_parameters(cpath)
+    if status == 0:
+        _current_parameters = path
+    return status
+
+
+def ensure_parameters(path: str) -> None:
+    """Load DPCore parameters from a file unless they are the active ones.
+
+    DPCore holds a single active calibration per process, so the file is
+    reloaded whenever another calibration was loaded in between.
+
+    :param path: Path to the parameters file
+    :type path: str
+    :raises RuntimeError: If no file is given or DPCore fails to load the
+        parameters
+    """
+    if path is None:
+        raise RuntimeError("No calibration file is set to load the parameters from")
+    if path != _current_parameters:
+        load_parameters(path)
 
 
 @dp_status_as_exception
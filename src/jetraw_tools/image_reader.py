@@ -3,14 +3,22 @@ import tifffile
 import numpy as np
 import ome_types
 import os
+from .arena import BufferArena
 from .tiff_reader import imread
 from .utils import flatten_dict, dict2ome
 from .logger import logger
+from .pagecache import advise_mapping, advise_path, advise_sequential
+from .throttle import throttle_read_file
 from typing import Tuple, Union, Dict, Any, Optional
 
-
 VALID_METADATA_FORMATS = ("ome", "imagej")
 
+# Axes along which one input can be split into several outputs
+VALID_SPLIT_AXES = ("P",)
+
+# Unstructured ND2 metadata recorded once per frame, keyed "<name>|<frame>"
+_PER_FRAME_METADATA = ("ImageMetadataSeqLV",)
+
 # Module-level dedup so each unique fallback warning fires once per process.
 # Note: under multiprocessing.Pool, each worker subprocess maintains its own
 # copy of this set, so a batch run will emit each unique warning at most once
@@ -35,6 +43,74 @@ def _try_parse_ome(xml: Optional[str]) -> Optional[ome_types.OME]:
         return None
 
 
+def count_positions(input_filename: str) -> int:
+    """Return the number of stage positions (P axis) of an ND2 file.
+
+    :param input_filename: Path to the ND2 file
+    :type input_filename: str
+    :return: The number of positions, 1 if the file has no P axis
+    :rtype: int
+    """
+    with nd2.ND2File(input_filename) as img_nd2:
+        return img_nd2.sizes.get("P", 1)
+
+
+def position_metadata(
+    metadata: Dict[str, Any], loop_indices: Tuple[Dict[str, int], ...], position: int
+) -> Dict[str, Any]:
+    """Keep the per-frame entries of one position in unstructured ND2 metadata.
+
+    Entries recorded once per frame are dropped for the frames of the other
+    positions. The entries describing the whole acquisition, such as the
+    experiment loops and their list of stage points, are kept whole.
+
+    :param metadata: The output of ``ND2File.unstructured_metadata()``
+    :type metadata: Dict[str, Any]
+    :param loop_indices: The loop indices of each frame, ``ND2File.loop_indices``
+    :type loop_indices: Tuple[Dict[str, int], ...]
+    :param position: The position to keep
+    :type position: int
+    :return: The metadata without the frames of the other positions
+    :rtype: Dict[str, Any]
+    """
+    kept = {}
+    for key, value in metadata.items():
+        name, _, frame = key.rpartition("|")
+        if name in _PER_FRAME_METADATA and frame.isdigit():
+            frame = int(frame)
+            if frame < len(loop_indices):
+                if loop_indices[frame].get("P", position) != position:
+                    continue
+        kept[key] = value
+    return kept
+
+
+def memory_map_series(tif: tifffile.TiffFile) -> Optional[np.memmap]:
+    """Map the pixel data of the first series of a TIFF copy-on-write.
+
+    Only uncompressed series stored contiguously in the file can be mapped.
+    The mapping is private: the kernel pages the data in on demand, writes
+    to the array go to anonymous memory and the file is never modified.
+
+    :param tif: The open TIFF file
+    :type tif: tifffile.TiffFile
+    :return: The mapped series, or None if it cannot be mapped
+    :rtype: Optional[np.memmap]
+    """
+    if not tif.series:
+        return None
+    series = tif.series[0]
+    offset = series.dataoffset
+    if offset is None or series.size == 0:
+        return None
+    dtype = np.dtype(tif.byteorder + series.dtype.char)
+    if offset + series.size * dtype.itemsize > tif.filehandle.size:
+        return None
+    return np.memmap(
+        tif.filehandle.path, dtype=dtype, mode="c", offset=offset, shape=series.shape
+    )
+
+
 class ImageReader:
     """Class for reading microscopy images in various formats.
 
@@ -46,6 +122,19 @@ class ImageReader:
         to silence it. Defaults to 'ome'.
     :param read_metadata: If False, skip metadata parsing entirely and
         return None for metadata. Defaults to True.
+    :param position: For ND2 files, read only this stage position (P axis)
+        and keep only its image in the OME metadata. Defaults to None (all
+        positions).
+    :param memory_map: Map uncompressed, contiguous TIFFs copy-on-write
+        instead of reading them into memory. Defaults to True.
+    :param arena: Arena to borrow the buffers of TIFF pixel data from. The
+        caller gives the image back once done. Defaults to None (allocate).
+    :param cache_hints: Announce to the kernel that the pixel data is read
+        once, sequentially (see :mod:`jetraw_tools.pagecache`). Defaults to
+        False.
+    :param throttle_reads: Pace the read through the installed read limit
+        (see :mod:`jetraw_tools.throttle`). False for local copies, whose
+        transfer was already paced. Defaults to True.
     :raises FileNotFoundError: If input file does not exist
     :raises ValueError: If extension or metadata_format is not supported
     """
@@ -56,6 +145,11 @@ class ImageReader:
         image_extension: str,
         metadata_format: str = "ome",
         read_metadata: bool = True,
+        position: Optional[int] = None,
+        memory_map: bool = True,
+        arena: Optional[BufferArena] = None,
+        cache_hints: bool = False,
+        throttle_reads: bool = True,
     ):
         if not os.path.isfile(input_filename):
             raise FileNotFoundError(f"No file found at {input_filename}")
@@ -84,6 +178,11 @@ class ImageReader:
         self.image_extension = image_extension
         self.metadata_format = metadata_format
         self.read_metadata = read_metadata
+        self.position = position
+        self.memory_map = memory_map
+        self.arena = arena
+        self.cache_hints = cache_hints
+        self.throttle_reads = throttle_reads
 
     def _resolve_metadata(
         self, tif: tifffile.TiffFile
@@ -136,40 +235,80 @@ class ImageReader:
         :return: Tuple of (image array, OME metadata or None if read_metadata=False)
         :rtype: Tuple[np.ndarray, Union[ome_types.OME, None]]
         """
+        if self.cache_hints:
+            advise_path(self.input_filename)
         with nd2.ND2File(self.input_filename) as img_nd2:
-            img_map = img_nd2.asarray().astype(np.uint16)
+            if self.position is None:
+                img_map = img_nd2.asarray()
+            else:
+                # Only the frames of this position are read
+                img_map = img_nd2.asarray(position=self.position)
+                if "P" in img_nd2.sizes:
+                    img_map = np.squeeze(img_map, axis=list(img_nd2.sizes).index("P"))
+            img_map = img_map.astype(np.uint16, copy=False)
 
             if not self.read_metadata:
                 return img_map, None
 
-            if self.metadata_format == "imagej":
-                logger.debug(
-                    f"ND2 source '{os.path.basename(self.input_filename)}' only "
-                    f"exposes OME metadata; '--metadata-format imagej' is ignored "
-                    f"for the read step."
-                )
-
-            # Extract and combine metadata
-            ome_metadata = img_nd2.ome_metadata()
-            metadata_dict = img_nd2.unstructured_metadata()
-            flatten_metadata = flatten_dict(metadata_dict)
-            metadata_dict.update(ome_metadata.dict())
-            ome_extra = dict2ome(flatten_metadata)
-            ome_metadata.structured_annotations.extend([ome_extra])
-            metadata = ome_metadata
+            metadata = self._nd2_metadata(img_nd2)
 
         return img_map, metadata
 
+    def _nd2_metadata(self, img_nd2: nd2.ND2File) -> ome_types.OME:
+        """Combine the OME and unstructured metadata of an open ND2 file.
+
+        :param img_nd2: The open ND2 file
+        :type img_nd2: nd2.ND2File
+        :return: OME metadata with the flattened Nikon metadata as annotation
+        :rtype: ome_types.OME
+        """
+        if self.metadata_format == "imagej":
+            logger.debug(
+                f"ND2 source '{os.path.basename(self.input_filename)}' only "
+                f"exposes OME metadata; '--metadata-format imagej' is ignored "
+                f"for the read step."
+            )
+
+        # Extract and combine metadata
+        ome_metadata = img_nd2.ome_metadata()
+        metadata_dict = img_nd2.unstructured_metadata()
+        if self.position is not None:
+            metadata_dict = position_metadata(
+                metadata_dict, img_nd2.loop_indices, self.position
+            )
+        flatten_metadata = flatten_dict(metadata_dict)
+        metadata_dict.update(ome_metadata.dict())
+        ome_extra = dict2ome(flatten_metadata)
+        ome_metadata.structured_annotations.extend([ome_extra])
+        n_positions = img_nd2.sizes.get("P", 1)
+        if self.position is not None and len(ome_metadata.images) == n_positions:
+            # The OME metadata holds one image per position
+            ome_metadata.images = [ome_metadata.images[self.position]]
+        return ome_metadata
+
     def read_tiff(
         self,
     ) -> Tuple[np.ndarray, Union[Dict[str, Any], ome_types.OME, None]]:
         """Read TIFF image with metadata according to the requested format.
 
+        Uncompressed, contiguous pixel data is memory-mapped copy-on-write
+        (see :func:`memory_map_series`) unless ``memory_map`` is False.
+
         :return: Tuple of (image array, metadata)
         :rtype: Tuple[np.ndarray, Union[Dict[str, Any], ome_types.OME, None]]
         """
         with tifffile.TiffFile(self.input_filename) as tif:
-            img_map = tif.asarray()
+            if self.cache_hints:
+                advise_sequential(tif.filehandle.fileno())
+            img_map = memory_map_series(tif) if self.memory_map else None
+            if self.cache_hints:
+                advise_mapping(img_map)
+            if img_map is None and self.arena is not None and tif.series:
+                series = tif.series[0]
+                out = self.arena.borrow(series.shape, series.dtype)
+                img_map = tif.asarray(out=out)
+            elif img_map is None:
+                img_map = tif.asarray()
             metadata = self._resolve_metadata(tif) if self.read_metadata else None
 
         return img_map, metadata
@@ -182,7 +321,9 @@ class ImageReader:
         :return: Tuple of (image array, metadata)
         :rtype: Tuple[np.ndarray, Union[Dict[str, Any], ome_types.OME, None]]
         """
-        img_map = imread(self.input_filename)
+        if self.cache_hints:
+            advise_path(self.input_filename)
+        img_map = imread(self.input_filename, arena=self.arena)
         if not self.read_metadata:
             return img_map, None
         with tifffile.TiffFile(self.input_filename) as tif:
@@ -190,6 +331,20 @@ class ImageReader:
 
         return img_map, metadata
 
+    def read_metadata_only(self) -> Union[Dict[str, Any], ome_types.OME, None]:
+        """Read the metadata of the file without reading its pixel data.
+
+        :return: The metadata, as returned by :meth:`read_image`
+        :rtype: Union[Dict[str, Any], ome_types.OME, None]
+        """
+        if not self.read_metadata:
+            return None
+        if self.image_extension == ".nd2":
+            with nd2.ND2File(self.input_filename) as img_nd2:
+                return self._nd2_metadata(img_nd2)
+        with tifffile.TiffFile(self.input_filename) as tif:
+            return self._resolve_metadata(tif)
+
     def read_image(
         self,
     ) -> Tuple[np.ndarray, Union[Dict[str, Any], ome_types.OME, None]]:
@@ -198,9 +353,13 @@ class ImageReader:
         :return: Tuple of (image array, metadata)
         :rtype: Tuple[np.ndarray, Union[Dict[str, Any], ome_types.OME, None]]
         """
+        if self.throttle_reads:
+            # Paced before the file is decoded, in one call, from the page cache
+            throttle_read_file(self.input_filename)
         if self.image_extension == ".nd2":
-            return self.read_nd2_image()
+            image, metadata = self.read_nd2_image()
         elif self.image_extension in [".p.tif", ".p.tiff", ".ome.p.tif", ".ome.p.tiff"]:
-            return self.read_p_tiff()
+            image, metadata = self.read_p_tiff()
         else:
-            return self.read_tiff()
+            image, metadata = self.read_tiff()
+        return image, metadata
@@ -2,7 +2,7 @@ import numpy as np
 import ctypes
 import ctypes.util
 import functools
-from typing import Callable, Optional
+from typing import Callable, Iterable, Optional
 from .libs import (
     _adapt_path_to_os,
     _dptiff_ptr,
@@ -20,6 +20,23 @@ def _get_libs():
     return get_jetraw_libs()
 
 
+# Precomputed pointer type for uint16 image buffers
+_c_ushort_p = ctypes.POINTER(ctypes.c_ushort)
+
+
+def _raise_for_status(dp_status: int) -> None:
+    """Raise a RuntimeError describing a non-zero DPCore status code.
+
+    :param dp_status: DPCore status code
+    :type dp_status: int
+    :raises RuntimeError: If the status code indicates an error (non-zero)
+    """
+    if dp_status != 0:
+        _jetraw_lib, _ = _get_libs()
+        message = _jetraw_lib.dp_status_description(dp_status).decode("utf-8")
+        raise RuntimeError(message)
+
+
 def dp_status_as_exception(func: Callable[..., int]) -> Callable[..., None]:
     """Decorator that converts DPCore status codes to exceptions.
 
@@ -35,17 +52,18 @@ def dp_status_as_exception(func: Callable[..., int]) -> Callable[..., None]:
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        dp_status = func(*args, **kwargs)
-        if dp_status != 0:
-            _jetraw_lib, _ = _get_libs()
-            message = _jetraw_lib.dp_status_description(dp_status).decode("utf-8")
-            raise RuntimeError(message)
+        _raise_for_status(func(*args, **kwargs))
 
     return wrapper
 
 
 class JetrawTiff:
-    """Wrapper for Jetraw TIFF functions"""
+    """Wrapper for Jetraw TIFF functions
+
+    The foreign functions are bound once per instance and the image
+    dimensions are cached per open handle, so that per-page calls do not go
+    through the library lookup again.
+    """
 
     def __init__(self) -> None:
         """Initialize a new JetrawTiff instance.
@@ -54,9 +72,24 @@ class JetrawTiff:
         :raises JetrawLibraryError: If JetRaw libraries are not available
         """
         # This will raise JetrawLibraryError if libraries aren't available
-        _get_libs()
+        _, _jetraw_tiff_lib = _get_libs()
+        self._lib = _jetraw_tiff_lib
+        self._append_fn = _jetraw_tiff_lib.jetraw_tiff_append
+        self._read_page_fn = _jetraw_tiff_lib.jetraw_tiff_read_page
         self._handle = _dptiff_ptr()
         self._href = ctypes.byref(self._handle)
+        self._reset_dimensions()
+
+    def _reset_dimensions(self, mode: Optional[str] = None) -> None:
+        """Forget the cached dimensions of the handle.
+
+        :param mode: Mode the handle was opened with, None when closed
+        :type mode: Optional[str]
+        """
+        self._mode = mode
+        self._width: Optional[int] = None
+        self._height: Optional[int] = None
+        self._pages: Optional[int] = None
 
     @property
     def width(self) -> int:
@@ -65,8 +98,9 @@ class JetrawTiff:
         :returns: Image width in pixels
         :rtype: int
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        return _jetraw_tiff_lib.jetraw_tiff_get_width(self._handle)
+        if self._width is None:
+            self._width = self._lib.jetraw_tiff_get_width(self._handle)
+        return self._width
 
     @property
     def height(self) -> int:
@@ -75,18 +109,26 @@ class JetrawTiff:
         :returns: Image height in pixels
         :rtype: int
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        return _jetraw_tiff_lib.jetraw_tiff_get_height(self._handle)
+        if self._height is None:
+            self._height = self._lib.jetraw_tiff_get_height(self._handle)
+        return self._height
 
     @property
     def pages(self) -> int:
         """Get the number of pages in the TIFF file.
 
+        The page count is cached only for files opened for reading, as it
+        grows while pages are appended.
+
         :returns: Number of pages
         :rtype: int
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        return _jetraw_tiff_lib.jetraw_tiff_get_pages(self._handle)
+        if self._pages is not None:
+            return self._pages
+        pages = self._lib.jetraw_tiff_get_pages(self._handle)
+        if self._mode == "r":
+            self._pages = pages
+        return pages
 
     @dp_status_as_exception
     def open(
@@ -112,42 +154,58 @@ class JetrawTiff:
         :returns: DPCore status code
         :rtype: int
         """
-        _, _jetraw_tiff_lib = _get_libs()
         cpath = _adapt_path_to_os(path)
         cdescr = bytes(description, "UTF-8")
         cmode = bytes(mode, "UTF-8")
-        return _jetraw_tiff_lib.jetraw_tiff_open(
+        self._reset_dimensions(mode)
+        return self._lib.jetraw_tiff_open(
             cpath, width, height, cdescr, self._href, cmode
         )
 
-    @dp_status_as_exception
-    def append_page(self, image: np.ndarray) -> int:
+    def append_page(self, image: np.ndarray) -> None:
         """Append a page to the TIFF file.
 
-        :param image: Image array to append
+        :param image: Contiguous uint16 image array to append
         :type image: np.ndarray
-        :returns: DPCore status code
-        :rtype: int
+        :raises RuntimeError: If the page could not be appended
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        bufptr = image.ctypes.data_as(ctypes.POINTER(ctypes.c_ushort))
-        return _jetraw_tiff_lib.jetraw_tiff_append(self._handle, bufptr)
+        dp_status = self._append_fn(self._handle, image.ctypes.data)
+        if dp_status != 0:
+            _raise_for_status(dp_status)
 
-    @dp_status_as_exception
-    def _read_page_buffer(
-        self, bufptr: ctypes.POINTER(ctypes.c_ushort), pageidx: int
-    ) -> int:
+    def _read_page_buffer(self, bufptr: _c_ushort_p, pageidx: int) -> None:
         """Read a page from the TIFF into a buffer.
 
-        :param bufptr: Pointer to the buffer to read into
+        :param bufptr: Pointer (or integer address) of the buffer to read into
         :type bufptr: ctypes.POINTER(ctypes.c_ushort)
         :param pageidx: Page index to read
         :type pageidx: int
-        :returns: DPCore status code
-        :rtype: int
+        :raises RuntimeError: If the page could not be read
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        return _jetraw_tiff_lib.jetraw_tiff_read_page(self._handle, bufptr, pageidx)
+        dp_status = self._read_page_fn(self._handle, bufptr, pageidx)
+        if dp_status != 0:
+            _raise_for_status(dp_status)
+
+    def _read_pages(self, address: int, stride: int, pages: Iterable[int]) -> None:
+        """Read consecutive pages into memory starting at a raw address.
+
+        The n-th page of ``pages`` is written to ``address + n * stride``. The
+        caller is responsible for the memory being large enough.
+
+        :param address: Address of the first output frame
+        :type address: int
+        :param stride: Distance in bytes between consecutive output frames
+        :type stride: int
+        :param pages: Page indices to read
+        :type pages: Iterable[int]
+        :raises RuntimeError: If a page could not be read
+        """
+        read_page = self._read_page_fn
+        handle = self._handle
+        for i, pageidx in enumerate(pages):
+            dp_status = read_page(handle, address + i * stride, pageidx)
+            if dp_status != 0:
+                _raise_for_status(dp_status)
 
     def read_page(self, pageidx: int) -> np.ndarray:
         """Read a page from the TIFF file.
@@ -158,8 +216,7 @@ class JetrawTiff:
         :rtype: np.ndarray
         """
         image = np.empty((self.height, self.width), dtype=np.uint16)
-        bufptr = image.ctypes.data_as(ctypes.POINTER(ctypes.c_ushort))
-        self._read_page_buffer(bufptr, pageidx)
+        self._read_page_buffer(image.ctypes.data, pageidx)
         return image
 
     @dp_status_as_exception
@@ -169,5 +226,5 @@ class JetrawTiff:
         :returns: DPCore status code
         :rtype: int
         """
-        _, _jetraw_tiff_lib = _get_libs()
-        return _jetraw_tiff_lib.jetraw_tiff_close(self._href)
+        self._reset_dimensions()
+        return self._lib.jetraw_tiff_close(self._href)
@@ -1,7 +1,9 @@
 import configparser
 import ctypes
 import ctypes.util
+import json
 import os
+import time
 from pathlib import Path
 from sys import platform as _platform
 from typing import Tuple, Union, Optional
@@ -9,6 +11,23 @@ from typing import Tuple, Union, Optional
 # Cache for loaded libraries
 _libs_cache: dict = {}
 
+_CONFIG_FILE = os.path.expanduser("~/.config/jetraw_tools/jetraw_tools.cfg")
+
+# Persistent cache of resolved absolute library paths, shared by all processes
+LIB_CACHE_FILE = os.path.expanduser("~/.config/jetraw_tools/lib_cache.json")
+
+# In-memory copy of the library path cache, read once per process
+_lib_path_cache: Optional[dict] = None
+
+# Result of _add_lib_paths per library, so the config is parsed once per process
+_lib_paths_added: dict = {}
+
+# Library initialisation time in seconds, per library group
+_load_times: dict = {}
+
+# License key currently registered with jetraw_tiff in this process
+_current_license: Optional[str] = None
+
 
 class JetrawLibraryError(ImportError):
     """Raised when JetRaw/DPCore libraries cannot be loaded."""
@@ -88,7 +107,22 @@ def _add_lib_paths(lib: str) -> bool:
     """Add library installation paths to the environment variables.
 
     Reads paths from configuration file and adds bin/lib directories
-    to the appropriate environment variables.
+    to the appropriate environment variables. The configuration is only
+    parsed once per process and library.
+
+    :param lib: Library identifier ('dpcore' or 'jetraw')
+    :type lib: str
+    :returns: True if paths were successfully added, False otherwise
+    :rtype: bool
+    """
+    if lib in _lib_paths_added:
+        return _lib_paths_added[lib]
+    _lib_paths_added[lib] = _read_lib_paths(lib)
+    return _lib_paths_added[lib]
+
+
+def _read_lib_paths(lib: str) -> bool:
+    """Read library installation paths from the config file into the environment.
 
     :param lib: Library identifier ('dpcore' or 'jetraw')
     :type lib: str
@@ -96,7 +130,7 @@ def _add_lib_paths(lib: str) -> bool:
     :rtype: bool
     """
     # Read configuration file
-    config_file = os.path.expanduser("~/.config/jetraw_tools/jetraw_tools.cfg")
+    config_file = _CONFIG_FILE
     config = configparser.ConfigParser()
     _os_platform = _check_os()
     try:
@@ -153,6 +187,145 @@ def _add_lib_paths(lib: str) -> bool:
     return False
 
 
+def _stat_signature(path: str) -> Optional[list]:
+    """Return [size, mtime_ns] of a file, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_lib_cache() -> dict:
+    """Load the library path cache, discarding it if the config file changed.
+
+    :returns: Cache dictionary with 'config' (config file signature) and 'libs'
+    :rtype: dict
+    """
+    global _lib_path_cache
+    if _lib_path_cache is None:
+        try:
+            with open(LIB_CACHE_FILE, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        config_signature = _stat_signature(_CONFIG_FILE)
+        if (
+            not isinstance(cache, dict)
+            or cache.get("config") != config_signature
+            or not isinstance(cache.get("libs"), dict)
+        ):
+            cache = {"config": config_signature, "libs": {}}
+        _lib_path_cache = cache
+    return _lib_path_cache
+
+
+def _write_lib_cache(cache: dict) -> None:
+    """Atomically persist the library path cache, ignoring write errors."""
+    tmp_file = f"{LIB_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(LIB_CACHE_FILE), exist_ok=True)
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_file, LIB_CACHE_FILE)
+    except OSError:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+
+def _search_library_dirs(filename: str) -> Optional[str]:
+    """Find the absolute path of a library file name in the loader search paths.
+
+    :param filename: Library file name as returned by ctypes.util.find_library
+    :type filename: str
+    :returns: Absolute path to the library, or None if not found
+    :rtype: Optional[str]
+    """
+    dirs = []
+    for var in ("LD_LIBRARY_PATH", "DYLD_FALLBACK_LIBRARY_PATH", "PATH"):
+        dirs.extend(d for d in os.environ.get(var, "").split(os.pathsep) if d)
+    dirs.extend(
+        [
+            "/usr/local/lib",
+            "/usr/local/lib64",
+            "/usr/lib",
+            "/usr/lib64",
+            "/lib",
+            "/lib64",
+            "/usr/lib/x86_64-linux-gnu",
+            "/usr/lib/aarch64-linux-gnu",
+        ]
+    )
+    for folder in dirs:
+        candidate = os.path.join(folder, filename)
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+
+def _resolve_library(name: str) -> str:
+    """Resolve the path of a shared library, using the persistent cache.
+
+    A cached absolute path is reused as long as a stat of the file still
+    matches, which avoids ctypes.util.find_library (that may shell out to
+    ldconfig, gcc or ld) in every process.
+
+    :param name: Library name without prefix or suffix (e.g. 'jetraw')
+    :type name: str
+    :returns: Absolute path to the library, or the name found by the loader
+    :rtype: str
+    :raises OSError: If the library cannot be found
+    """
+    cache = _read_lib_cache()
+    entry = cache["libs"].get(name)
+    if entry and _stat_signature(entry["path"]) == entry["signature"]:
+        return entry["path"]
+
+    found = ctypes.util.find_library(name)
+    if found is None:
+        raise OSError(f"Library '{name}' could not be found.")
+    path = found if os.path.isabs(found) else _search_library_dirs(found)
+    if path is None:
+        # Let the dynamic loader resolve the name, but do not cache it
+        return found
+
+    cache["libs"][name] = {"path": path, "signature": _stat_signature(path)}
+    _write_lib_cache(cache)
+    return path
+
+
+def _load_library(name: str) -> ctypes.CDLL:
+    """Load a shared library by name from its resolved (cached) path.
+
+    :param name: Library name without prefix or suffix (e.g. 'jetraw')
+    :type name: str
+    :returns: The loaded library
+    :rtype: ctypes.CDLL
+    :raises OSError: If the library cannot be found or loaded
+    """
+    path = _resolve_library(name)
+    try:
+        return ctypes.cdll.LoadLibrary(path)
+    except OSError:
+        # Drop a stale cache entry so the next attempt resolves it again
+        cache = _read_lib_cache()
+        if cache["libs"].pop(name, None) is not None:
+            _write_lib_cache(cache)
+        raise
+
+
+def get_library_load_times() -> dict:
+    """Return the library initialisation time of this process.
+
+    :returns: Seconds spent loading and initialising each library group
+        ('dpcore', 'jetraw') that has been loaded so far
+    :rtype: dict
+    """
+    return dict(_load_times)
+
+
 def _load_libraries(lib: str) -> Tuple[ctypes.CDLL, ctypes.CDLL]:
     """Load the specified C libraries and configure function signatures.
 
@@ -173,11 +346,8 @@ def _load_libraries(lib: str) -> Tuple[ctypes.CDLL, ctypes.CDLL]:
 
     if lib == "dpcore":
         try:
-            path_to_jetraw = ctypes.util.find_library("jetraw")
-            path_to_dpcore = ctypes.util.find_library("dpcore")
-
-            _jetraw_lib = ctypes.cdll.LoadLibrary(path_to_jetraw)
-            _dpcore_lib = ctypes.cdll.LoadLibrary(path_to_dpcore)
+            _jetraw_lib = _load_library("jetraw")
+            _dpcore_lib = _load_library("dpcore")
 
         except OSError:
             raise ImportError(f"JetRaw/DPCore C libraries could not be loaded.")
@@ -207,11 +377,8 @@ def _load_libraries(lib: str) -> Tuple[ctypes.CDLL, ctypes.CDLL]:
 
     elif lib == "jetraw":
         try:
-            path_to_jetraw = ctypes.util.find_library("jetraw")
-            path_to_jetraw_tiff = ctypes.util.find_library("jetraw_tiff")
-
-            _jetraw_lib = ctypes.cdll.LoadLibrary(path_to_jetraw)
-            _jetraw_tiff_lib = ctypes.cdll.LoadLibrary(path_to_jetraw_tiff)
+            _jetraw_lib = _load_library("jetraw")
+            _jetraw_tiff_lib = _load_library("jetraw_tiff")
 
         except OSError:
             raise ImportError(f"JetRaw C libraries could not be loaded.")
@@ -248,15 +415,17 @@ def _load_libraries(lib: str) -> Tuple[ctypes.CDLL, ctypes.CDLL]:
         ]
 
         # Register jetraw_tiff_append function signature
+        # Buffers are passed as c_void_p so that both ctypes pointers and raw
+        # integer addresses are accepted without building a pointer per page
         _jetraw_tiff_lib.jetraw_tiff_append.argtypes = [
             _dptiff_ptr,
-            ctypes.POINTER(ctypes.c_ushort),
+            ctypes.c_void_p,
         ]
 
         # Register jetraw_tiff_read_page function signature
         _jetraw_tiff_lib.jetraw_tiff_read_page.argtypes = [
             _dptiff_ptr,
-            ctypes.POINTER(ctypes.c_ushort),
+            ctypes.c_void_p,
             ctypes.c_int,
         ]
 
@@ -283,9 +452,11 @@ def get_dpcore_libs() -> Tuple[ctypes.CDLL, ctypes.CDLL]:
     """
     if "dpcore" not in _libs_cache:
         try:
+            start = time.perf_counter()
             _jetraw_lib, _dpcore_lib = _load_libraries(lib="dpcore")
             _dpcore_lib.dpcore_init()
             _libs_cache["dpcore"] = (_jetraw_lib, _dpcore_lib)
+            _load_times["dpcore"] = time.perf_counter() - start
         except (ImportError, AttributeError, OSError) as e:
             raise JetrawLibraryError(
                 f"DPCore/JetRaw C libraries could not be loaded. "
@@ -304,6 +475,7 @@ def get_jetraw_libs() -> Tuple[ctypes.CDLL, ctypes.CDLL]:
     """
     if "jetraw" not in _libs_cache:
         try:
+            start = time.perf_counter()
             _jetraw_lib, _jetraw_tiff_lib = _load_libraries(lib="jetraw")
             # Initialize jetraw_tiff
             status = _jetraw_tiff_lib.jetraw_tiff_init()
@@ -311,6 +483,7 @@ def get_jetraw_libs() -> Tuple[ctypes.CDLL, ctypes.CDLL]:
                 message = _jetraw_lib.dp_status_description(status).decode("utf-8")
                 raise RuntimeError(f"jetraw_tiff_init failed: {message}")
             _libs_cache["jetraw"] = (_jetraw_lib, _jetraw_tiff_lib)
+            _load_times["jetraw"] = time.perf_counter() - start
         except (ImportError, AttributeError, OSError, RuntimeError) as e:
             raise JetrawLibraryError(
                 f"JetRaw C libraries could not be loaded. "
@@ -320,6 +493,25 @@ def get_jetraw_libs() -> Tuple[ctypes.CDLL, ctypes.CDLL]:
     return _libs_cache["jetraw"]
 
 
+def set_license(key: str) -> None:
+    """Register the JetRaw license key in the current process.
+
+    The license is process-local state of the jetraw_tiff library, so it has
+    to be set in every worker process that writes compressed files. Setting
+    the key that is already registered is a no-op.
+
+    :param key: JetRaw license key
+    :type key: str
+    :raises JetrawLibraryError: If libraries cannot be loaded
+    """
+    global _current_license
+    if key == _current_license:
+        return
+    _, _jetraw_tiff_lib = get_jetraw_libs()
+    _jetraw_tiff_lib.jetraw_tiff_set_license(key.encode("utf-8"))
+    _current_license = key
+
+
 def is_jetraw_available() -> bool:
     """Check if JetRaw libraries are available without raising an error.
 
@@ -0,0 +1,104 @@
+"""Page cache hints for files that are read or written once.
+
+A batch streams every source file in once and every output out once, so
+without hints the kernel fills the page cache with data that is never used
+again and evicts what other services on the host rely on. Inputs are
+announced as sequential, which also doubles the readahead window on
+spinning disks, and both inputs and outputs are dropped from the cache once
+a file is done. The hints are advisory: on platforms without
+``posix_fadvise`` or ``madvise`` they do nothing.
+"""
+
+import mmap
+import os
+from typing import Optional
+
+import numpy as np
+
+# Bytes at the start of an input whose readahead is started on open
+WILLNEED_MAX_BYTES = 256 * 1024**2
+
+
+def _fadvise(fd: int, offset: int, length: int, advice_name: str) -> bool:
+    """Apply a posix_fadvise advice by name, returning whether it was applied."""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        return False
+    return True
+
+
+def advise_sequential(fd: int) -> None:
+    """Announce that an open file will be read once from start to end.
+
+    Sequential access widens the readahead of this file descriptor, and the
+    readahead of the start of the file is started right away.
+
+    :param fd: File descriptor the file is read through
+    :type fd: int
+    """
+    _fadvise(fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+    _fadvise(fd, 0, WILLNEED_MAX_BYTES, "POSIX_FADV_WILLNEED")
+
+
+def advise_path(path: str) -> None:
+    """Start the readahead of a file read through a descriptor we do not own.
+
+    Used for readers that open the file themselves (nd2, the JetRaw library).
+
+    :param path: Path to the file
+    :type path: str
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, 0, WILLNEED_MAX_BYTES, "POSIX_FADV_WILLNEED")
+    finally:
+        os.close(fd)
+
+
+def advise_mapping(array: Optional[np.ndarray]) -> None:
+    """Announce that a memory-mapped array will be read sequentially.
+
+    :param array: The array, ignored unless it is an ``np.memmap``
+    :type array: Optional[np.ndarray]
+    """
+    mapping = getattr(array, "_mmap", None)
+    if mapping is None or not hasattr(mmap, "MADV_SEQUENTIAL"):
+        return
+    try:
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    except (OSError, ValueError):
+        pass
+
+
+def drop_file(path: str, flush: bool = False) -> None:
+    """Drop the cached pages of a file that is done with.
+
+    Only pages already written back can be dropped, so outputs are flushed
+    first with ``flush``.
+
+    :param path: Path to the file
+    :type path: str
+    :param flush: Write the dirty pages of the file to disk first
+    :type flush: bool
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        if flush and hasattr(os, "fdatasync"):
+            os.fdatasync(fd)
+        elif flush:
+            os.fsync(fd)
+        _fadvise(fd, 0, 0, "POSIX_FADV_DONTNEED")
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -8,18 +8,30 @@ except importlib.metadata.PackageNotFoundError:
 import os
 import re
 import logging
+import multiprocessing
 import configparser
-from typing import Optional
+from typing import Optional, Tuple, Union
 
 import typer
 from rich.console import Console
 
 # Local package imports - lazy import jetraw_tiff only when needed
+from jetraw_tools.autotune import AUTO_TUNE
 from jetraw_tools.compression_tool import CompressionTool
 from jetraw_tools.config import init as config_init
-from jetraw_tools.image_reader import VALID_METADATA_FORMATS
+from jetraw_tools.image_reader import VALID_METADATA_FORMATS, VALID_SPLIT_AXES
 from jetraw_tools.logger import logger, setup_logger
+from jetraw_tools.planner import (
+    DEFAULT_FILES_PER_TYPE,
+    DEFAULT_SAMPLES_PER_FILE,
+    describe_plan,
+    plan_files,
+)
+from jetraw_tools.resources import describe_resources, detect_resources
+from jetraw_tools.sharding import parse_layout
+from jetraw_tools.throttle import parse_hours
 from jetraw_tools.utils import cores_validation
+from jetraw_tools.workers import VALID_BACKENDS
 
 app = typer.Typer(
     name="jetraw_tools",
@@ -48,6 +60,95 @@ _METADATA_FORMAT_HELP = (
 )
 
 
+_START_METHOD_HELP = (
+    "Worker start method: 'fork', 'spawn' or 'forkserver' (defaults to the "
+    "platform default). 'forkserver' preloads the JetRaw libraries, license "
+    "and calibration so new workers start warm."
+)
+
+
+_SPLIT_LARGE_HELP = (
+    "When compressing fewer files than cores, split large files into page "
+    "ranges prepared by all cores in parallel."
+)
+
+_SPLIT_AXIS_HELP = (
+    "Write one output per index of this axis. 'P' writes one file per stage "
+    "position of ND2 inputs, each with its own metadata."
+)
+
+_FILES_PER_TYPE_HELP = (
+    "Files sampled per acquisition type (extension, frame shape and pixel "
+    "type); 0 samples every file."
+)
+
+_MAX_WORKER_RSS_HELP = (
+    "Replace a worker, between two files, once its resident memory exceeds "
+    "this many GB (0: never). The run summary reports each worker's peak."
+)
+
+_NCORES_HELP = (
+    "Number of cores to use (0: all usable cores but one), or 'auto-tune' "
+    "to adjust the number of busy workers to the highest measured throughput."
+)
+
+_FILE_TIMEOUT_HELP = (
+    "Kill a worker stuck on one file after this many seconds, plus "
+    "--timeout-per-gb per GB of input; the file is retried once, then "
+    "counted as failed (0: no limit)."
+)
+
+_STRAGGLER_HELP = (
+    "Also kill a worker whose file runs this many times longer than the "
+    "median rate of the run predicts, and at least a minute (0: disabled)."
+)
+
+_THROTTLE_HOURS_HELP = (
+    "Time windows in which --max-read-mbps and --max-write-mbps apply, e.g. "
+    "'08:00-20:00' or '08:00-12:00,13:00-18:00' (default: all day)."
+)
+
+_CACHE_HINTS_HELP = (
+    "Tell the kernel that inputs are read once, sequentially, and drop inputs "
+    "and flushed outputs from the page cache once each file is done."
+)
+
+_SCRATCH_HELP = (
+    "Directory on fast local disk where outputs are written first, then moved "
+    "to the output folder in the background with large sequential copies. "
+    "Speeds up writing to network storage."
+)
+
+_SCRATCH_QUOTA_HELP = (
+    "GB of finished outputs that may wait in --scratch to be moved before "
+    "workers pause (0: no limit)."
+)
+
+_PREFETCH_HELP = (
+    "Directory on fast local disk where the next source files are copied with "
+    "large sequential reads while the current ones are processed. Speeds up "
+    "reading from network storage."
+)
+
+_SYNC_EVERY_HELP = (
+    "Outputs are written under a temporary name and renamed once complete. "
+    "Flush them to disk one at a time (1), N at a time, or at the end of the "
+    "run (0)."
+)
+
+_SHARD_HELP = (
+    "Spread the outputs of a folder over subdirectories and list them in "
+    "index.tsv: 'hash[:K]' by the first K hex digits of the hash of the input "
+    "name (default 2), 'files[:N]' N outputs per subdirectory (default 1000)."
+)
+
+_BACKEND_HELP = (
+    "Execution backend: 'processes' (default), 'threads' or 'auto'. 'auto' "
+    "uses threads when the median input file is small, where process startup "
+    "and IPC dominate."
+)
+
+
 @app.command()
 def compress(
     path: str = typer.Argument(..., help="Path to folder/file to compress"),
@@ -68,7 +169,55 @@ def compress(
     extension: str = typer.Option(
         ".nd2", "--extension", help="File extension to process"
     ),
-    ncores: int = typer.Option(0, "--ncores", help="Number of cores to use"),
+    ncores: str = typer.Option("0", "--ncores", help=_NCORES_HELP),
+    start_method: Optional[str] = typer.Option(
+        None, "--start-method", help=_START_METHOD_HELP
+    ),
+    backend: str = typer.Option("processes", "--backend", help=_BACKEND_HELP),
+    recycle_files: int = typer.Option(
+        0, "--recycle-files", help="Replace a worker after this many files (0: never)"
+    ),
+    recycle_gb: float = typer.Option(
+        0, "--recycle-gb", help="Replace a worker after it read this many GB (0: never)"
+    ),
+    max_worker_rss_gb: float = typer.Option(
+        0, "--max-worker-rss-gb", help=_MAX_WORKER_RSS_HELP
+    ),
+    file_timeout: float = typer.Option(0, "--file-timeout", help=_FILE_TIMEOUT_HELP),
+    timeout_per_gb: float = typer.Option(
+        0, "--timeout-per-gb", help="Seconds added to --file-timeout per GB of input"
+    ),
+    straggler_factor: float = typer.Option(
+        0, "--straggler-factor", help=_STRAGGLER_HELP
+    ),
+    max_read_mbps: float = typer.Option(
+        0, "--max-read-mbps", help="Limit of the MB/s read by all workers (0: none)"
+    ),
+    max_write_mbps: float = typer.Option(
+        0, "--max-write-mbps", help="Limit of the MB/s written by all workers (0: none)"
+    ),
+    throttle_hours: Optional[str] = typer.Option(
+        None, "--throttle-hours", help=_THROTTLE_HOURS_HELP
+    ),
+    cache_hints: bool = typer.Option(
+        True, "--cache-hints/--no-cache-hints", help=_CACHE_HINTS_HELP
+    ),
+    scratch: Optional[str] = typer.Option(None, "--scratch", help=_SCRATCH_HELP),
+    scratch_quota_gb: float = typer.Option(
+        50, "--scratch-quota-gb", help=_SCRATCH_QUOTA_HELP
+    ),
+    prefetch: Optional[str] = typer.Option(None, "--prefetch", help=_PREFETCH_HELP),
+    prefetch_files: int = typer.Option(
+        8, "--prefetch-files", help="Number of source files copied ahead of the workers"
+    ),
+    sync_every: int = typer.Option(1, "--sync-every", help=_SYNC_EVERY_HELP),
+    shard: Optional[str] = typer.Option(None, "--shard", help=_SHARD_HELP),
+    split_large: bool = typer.Option(
+        True, "--split-large/--no-split-large", help=_SPLIT_LARGE_HELP
+    ),
+    split_axis: Optional[str] = typer.Option(
+        None, "--split-axis", help=_SPLIT_AXIS_HELP
+    ),
     output: Optional[str] = typer.Option(
         None, "-o", "--output", help="Output directory"
     ),
@@ -101,6 +250,26 @@ def compress(
         op,
         verbose,
         metadata_format,
+        start_method,
+        backend,
+        split_large,
+        split_axis,
+        recycle_files,
+        recycle_gb,
+        max_worker_rss_gb,
+        file_timeout,
+        timeout_per_gb,
+        straggler_factor,
+        max_read_mbps,
+        max_write_mbps,
+        throttle_hours,
+        cache_hints,
+        scratch,
+        scratch_quota_gb,
+        prefetch,
+        prefetch_files,
+        sync_every,
+        shard,
     )
 
 
@@ -124,7 +293,49 @@ def decompress(
     extension: str = typer.Option(
         ".ome.p.tiff", "--extension", help="File extension to process"
     ),
-    ncores: int = typer.Option(0, "--ncores", help="Number of cores to use"),
+    ncores: str = typer.Option("0", "--ncores", help=_NCORES_HELP),
+    start_method: Optional[str] = typer.Option(
+        None, "--start-method", help=_START_METHOD_HELP
+    ),
+    backend: str = typer.Option("processes", "--backend", help=_BACKEND_HELP),
+    recycle_files: int = typer.Option(
+        0, "--recycle-files", help="Replace a worker after this many files (0: never)"
+    ),
+    recycle_gb: float = typer.Option(
+        0, "--recycle-gb", help="Replace a worker after it read this many GB (0: never)"
+    ),
+    max_worker_rss_gb: float = typer.Option(
+        0, "--max-worker-rss-gb", help=_MAX_WORKER_RSS_HELP
+    ),
+    file_timeout: float = typer.Option(0, "--file-timeout", help=_FILE_TIMEOUT_HELP),
+    timeout_per_gb: float = typer.Option(
+        0, "--timeout-per-gb", help="Seconds added to --file-timeout per GB of input"
+    ),
+    straggler_factor: float = typer.Option(
+        0, "--straggler-factor", help=_STRAGGLER_HELP
+    ),
+    max_read_mbps: float = typer.Option(
+        0, "--max-read-mbps", help="Limit of the MB/s read by all workers (0: none)"
+    ),
+    max_write_mbps: float = typer.Option(
+        0, "--max-write-mbps", help="Limit of the MB/s written by all workers (0: none)"
+    ),
+    throttle_hours: Optional[str] = typer.Option(
+        None, "--throttle-hours", help=_THROTTLE_HOURS_HELP
+    ),
+    cache_hints: bool = typer.Option(
+        True, "--cache-hints/--no-cache-hints", help=_CACHE_HINTS_HELP
+    ),
+    scratch: Optional[str] = typer.Option(None, "--scratch", help=_SCRATCH_HELP),
+    scratch_quota_gb: float = typer.Option(
+        50, "--scratch-quota-gb", help=_SCRATCH_QUOTA_HELP
+    ),
+    prefetch: Optional[str] = typer.Option(None, "--prefetch", help=_PREFETCH_HELP),
+    prefetch_files: int = typer.Option(
+        8, "--prefetch-files", help="Number of source files copied ahead of the workers"
+    ),
+    sync_every: int = typer.Option(1, "--sync-every", help=_SYNC_EVERY_HELP),
+    shard: Optional[str] = typer.Option(None, "--shard", help=_SHARD_HELP),
     output: Optional[str] = typer.Option(
         None, "-o", "--output", help="Output directory"
     ),
@@ -156,9 +367,87 @@ def decompress(
         op,
         verbose,
         metadata_format,
+        start_method,
+        backend,
+        recycle_files=recycle_files,
+        recycle_gb=recycle_gb,
+        max_worker_rss_gb=max_worker_rss_gb,
+        file_timeout=file_timeout,
+        timeout_per_gb=timeout_per_gb,
+        straggler_factor=straggler_factor,
+        max_read_mbps=max_read_mbps,
+        max_write_mbps=max_write_mbps,
+        throttle_hours=throttle_hours,
+        cache_hints=cache_hints,
+        scratch=scratch,
+        scratch_quota_gb=scratch_quota_gb,
+        prefetch=prefetch,
+        prefetch_files=prefetch_files,
+        sync_every=sync_every,
+        shard=shard,
     )
 
 
+@app.command()
+def plan(
+    path: str = typer.Argument(..., help="Path to folder/file to plan"),
+    calibration_file: str = typer.Option(
+        "",
+        "--calibration_file",
+        help="Path to calibration file (defaults to config file if not provided)",
+    ),
+    identifier: str = typer.Option(
+        "",
+        "-i",
+        "--identifier",
+        help="Camera identifier (defaults to first identifier from config file if not provided)",
+    ),
+    key: str = typer.Option(
+        "", "--key", help="License key (defaults to config file if not provided)"
+    ),
+    extension: str = typer.Option(
+        ".nd2", "--extension", help="File extension to process"
+    ),
+    ncores: int = typer.Option(0, "--ncores", help="Number of cores to use"),
+    samples: int = typer.Option(
+        DEFAULT_SAMPLES_PER_FILE, "--samples", help="Planes sampled per file"
+    ),
+    files_per_type: int = typer.Option(
+        DEFAULT_FILES_PER_TYPE, "--files-per-type", help=_FILES_PER_TYPE_HELP
+    ),
+    verbose: bool = typer.Option(False, "-v", "--verbose", help="Verbose output"),
+) -> None:
+    """Estimate output size and duration of compressing, without writing files."""
+    setup_logger(level=logging.DEBUG if verbose else logging.INFO)
+
+    cal_file, identifier, _ = _load_run_settings(calibration_file, identifier, key)
+
+    status, validated_ncores, message = cores_validation(ncores, detect_resources())
+    if status == "ERROR":
+        logger.error(message)
+        raise typer.Exit(1)
+
+    full_path = os.path.join(os.getcwd(), path)
+    try:
+        image_files = CompressionTool(cal_file, identifier).list_files(
+            full_path, extension
+        )
+        report = plan_files(
+            full_path,
+            image_files,
+            extension,
+            identifier,
+            validated_ncores,
+            calibration_file=cal_file,
+            samples_per_file=samples,
+            files_per_type=files_per_type,
+        )
+    except Exception as e:
+        logger.error(f"Planning failed: {e}")
+        raise typer.Exit(1)
+    logger.info(describe_plan(report))
+
+
 @app.command()
 def settings() -> None:
     """Run configuration setup wizard."""
@@ -433,6 +722,72 @@ def _resolve_calibration_and_identifier(
     return (cal_file, identifier_value)
 
 
+def _load_run_settings(
+    calibration_file: str, identifier: str, key: str
+) -> Tuple[str, str, str]:
+    """Resolve the calibration file, identifier and license key of a run.
+
+    Values that are not given on the command line are taken from the config
+    file. The license is registered with the JetRaw library when available.
+
+    :param calibration_file: Path to calibration file, "" for the configured one
+    :type calibration_file: str
+    :param identifier: Camera identifier, "" for the configured one
+    :type identifier: str
+    :param key: License key, "" for the configured one
+    :type key: str
+    :return: Tuple of (calibration file, identifier, license key)
+    :rtype: Tuple[str, str, str]
+    :raises typer.Exit: If the configuration is missing or incomplete
+    """
+
+    # Load existing configuration
+    config_file = os.path.expanduser("~/.config/jetraw_tools/jetraw_tools.cfg")
+
+    if not os.path.exists(config_file):
+        logger.error(
+            f"Config file not found at {config_file}. Run 'jetraw_tools settings' first."
+        )
+        raise typer.Exit(1)
+
+    config = configparser.ConfigParser()
+    config.read(config_file)
+
+    # Resolve calibration file and identifier using multi-calibration logic
+    cal_file, identifier = _resolve_calibration_and_identifier(
+        config, calibration_file, identifier
+    )
+
+    # Set license key
+    if key == "":
+        try:
+            licence_key = config["licence_key"]["key"]
+        except KeyError:
+            logger.error(
+                "No license key configured. Run 'jetraw_tools settings' first."
+            )
+            raise typer.Exit(1)
+    else:
+        licence_key = key
+
+    # Set license in jetraw library (lazy import)
+    try:
+        from jetraw_tools.libs import get_library_load_times, set_license
+
+        set_license(licence_key)
+        for lib, seconds in get_library_load_times().items():
+            logger.debug(f"Initialised {lib} libraries in {seconds * 1000:.1f} ms")
+    except (ImportError, AttributeError):
+        # Libraries not available or license setting not supported
+        pass
+
+    if identifier == "" or cal_file == "":
+        logger.error("Identifier and calibration file must be set.")
+        raise typer.Exit(1)
+
+    return cal_file, identifier, licence_key
+
+
 def _process_files(
     path: str,
     mode: str,
@@ -440,7 +795,7 @@ def _process_files(
     identifier: str,
     key: str,
     extension: str,
-    ncores: int,
+    ncores: Union[int, str],
     output: Optional[str],
     metadata: bool,
     json: bool,
@@ -448,6 +803,26 @@ def _process_files(
     op: bool,
     verbose: bool,
     metadata_format: str = "ome",
+    start_method: Optional[str] = None,
+    backend: str = "processes",
+    split_large_files: bool = True,
+    split_axis: Optional[str] = None,
+    recycle_files: int = 0,
+    recycle_gb: float = 0,
+    max_worker_rss_gb: float = 0,
+    file_timeout: float = 0,
+    timeout_per_gb: float = 0,
+    straggler_factor: float = 0,
+    max_read_mbps: float = 0,
+    max_write_mbps: float = 0,
+    throttle_hours: Optional[str] = None,
+    cache_hints: bool = True,
+    scratch: Optional[str] = None,
+    scratch_quota_gb: float = 50,
+    prefetch: Optional[str] = None,
+    prefetch_files: int = 8,
+    sync_every: int = 1,
+    shard: Optional[str] = None,
 ) -> None:
     """Process files for compression or decompression operations.
 
@@ -466,8 +841,8 @@ def _process_files(
     :type key: str
     :param extension: File extension to process
     :type extension: str
-    :param ncores: Number of cores to use
-    :type ncores: int
+    :param ncores: Number of cores to use, or 'auto-tune'
+    :type ncores: Union[int, str]
     :param output: Output directory path
     :type output: Optional[str]
     :param metadata: Whether to process metadata
@@ -480,6 +855,50 @@ def _process_files(
     :type op: bool
     :param verbose: Whether to enable verbose output
     :type verbose: bool
+    :param metadata_format: Preferred metadata format ('ome' or 'imagej')
+    :type metadata_format: str
+    :param start_method: Multiprocessing start method for the worker pool
+    :type start_method: Optional[str]
+    :param backend: Execution backend ('processes', 'threads' or 'auto')
+    :type backend: str
+    :param split_large_files: Whether to split large files across workers
+    :type split_large_files: bool
+    :param split_axis: Axis to split each input into separate outputs ('P')
+    :type split_axis: Optional[str]
+    :param recycle_files: Replace a worker process after this many files
+    :type recycle_files: int
+    :param recycle_gb: Replace a worker process after it read this many GB
+    :type recycle_gb: float
+    :param max_worker_rss_gb: Replace a worker process whose resident memory
+        exceeds this many GB, between two files
+    :type max_worker_rss_gb: float
+    :param file_timeout: Seconds after which a worker stuck on a file is killed
+    :type file_timeout: float
+    :param timeout_per_gb: Seconds added to the file timeout per GB of input
+    :type timeout_per_gb: float
+    :param straggler_factor: Kill a worker whose file runs this many times
+        longer than the median rate predicts
+    :type straggler_factor: float
+    :param max_read_mbps: Limit of the MB/s read by all workers together
+    :type max_read_mbps: float
+    :param max_write_mbps: Limit of the MB/s written by all workers together
+    :type max_write_mbps: float
+    :param throttle_hours: Time windows in which the limits apply
+    :type throttle_hours: Optional[str]
+    :param cache_hints: Whether to give page cache hints for inputs and outputs
+    :type cache_hints: bool
+    :param scratch: Local directory where outputs are staged before being moved
+    :type scratch: Optional[str]
+    :param scratch_quota_gb: GB of staged outputs waiting to be moved
+    :type scratch_quota_gb: float
+    :param prefetch: Local directory where the next source files are copied
+    :type prefetch: Optional[str]
+    :param prefetch_files: Number of source files copied ahead of the workers
+    :type prefetch_files: int
+    :param sync_every: Number of outputs flushed to disk together, 0 at the end
+    :type sync_every: int
+    :param shard: Layout of the output subdirectories, e.g. "hash:2"
+    :type shard: Optional[str]
     :raises typer.Exit: If configuration is invalid or processing fails
     """
 
@@ -487,59 +906,34 @@ def _process_files(
     log_level = logging.DEBUG if verbose else logging.INFO
     setup_logger(level=log_level)
 
-    # Load existing configuration
-    config_file = os.path.expanduser("~/.config/jetraw_tools/jetraw_tools.cfg")
-
-    if not os.path.exists(config_file):
-        logger.error(
-            f"Config file not found at {config_file}. Run 'jetraw_tools settings' first."
-        )
-        raise typer.Exit(1)
-
-    config = configparser.ConfigParser()
-    config.read(config_file)
-
-    # Resolve calibration file and identifier using multi-calibration logic
-    cal_file, identifier = _resolve_calibration_and_identifier(
-        config, calibration_file, identifier
+    cal_file, identifier, licence_key = _load_run_settings(
+        calibration_file, identifier, key
     )
 
-    # Set license key
-    if key == "":
+    resources = detect_resources()
+    logger.info(describe_resources(resources))
+    auto_tune = ncores == AUTO_TUNE
+    if auto_tune:
+        # The tuner picks the count, the usable CPUs bound it
+        ncores = 0
+    else:
         try:
-            licence_key = config["licence_key"]["key"]
-        except KeyError:
+            ncores = int(ncores)
+        except ValueError:
             logger.error(
-                "No license key configured. Run 'jetraw_tools settings' first."
+                f"Invalid --ncores '{ncores}'. Must be a number or '{AUTO_TUNE}'."
             )
             raise typer.Exit(1)
-    else:
-        licence_key = key
-
-    # Set license in jetraw library (lazy import)
-    try:
-        from jetraw_tools.libs import get_jetraw_libs
-
-        _, _jetraw_tiff_lib = get_jetraw_libs()
-        _jetraw_tiff_lib.jetraw_tiff_set_license(licence_key.encode("utf-8"))
-    except (ImportError, AttributeError):
-        # Libraries not available or license setting not supported
-        pass
-
-    if identifier == "" or cal_file == "":
-        logger.error("Identifier and calibration file must be set.")
-        raise typer.Exit(1)
-
-    status, validated_ncores, message = cores_validation(ncores)
-    if status == "ERROR":
-        logger.error(message)
-        raise typer.Exit(1)
-    elif status == "WARN":
-        logger.warning(message)
-    else:  # status == 'OK'
-        logger.info(message)
+        status, validated_ncores, message = cores_validation(ncores, resources)
+        if status == "ERROR":
+            logger.error(message)
+            raise typer.Exit(1)
+        elif status == "WARN":
+            logger.warning(message)
+        else:  # status == 'OK'
+            logger.info(message)
 
-    ncores = validated_ncores
+        ncores = validated_ncores
 
     full_path = os.path.join(os.getcwd(), path)
 
@@ -556,6 +950,65 @@ def _process_files(
         )
         raise typer.Exit(1)
 
+    # Validate worker start method
+    if start_method is not None and (
+        start_method not in multiprocessing.get_all_start_methods()
+    ):
+        logger.error(
+            f"Invalid --start-method '{start_method}'. "
+            f"Must be one of {tuple(multiprocessing.get_all_start_methods())}."
+        )
+        raise typer.Exit(1)
+
+    # Validate execution backend
+    if backend not in VALID_BACKENDS:
+        logger.error(f"Invalid --backend '{backend}'. Must be one of {VALID_BACKENDS}.")
+        raise typer.Exit(1)
+
+    # Validate split axis
+    if split_axis is not None:
+        if split_axis not in VALID_SPLIT_AXES:
+            logger.error(
+                f"Invalid --split-axis '{split_axis}'. "
+                f"Must be one of {VALID_SPLIT_AXES}."
+            )
+            raise typer.Exit(1)
+        if extension != ".nd2":
+            logger.error("--split-axis P is only supported for .nd2 files.")
+            raise typer.Exit(1)
+
+    # Validate throttle windows
+    try:
+        parse_hours(throttle_hours)
+    except ValueError as e:
+        logger.error(f"Invalid --throttle-hours: {e}")
+        raise typer.Exit(1)
+
+    # Validate the scratch directory
+    if scratch is not None and not os.path.isdir(scratch):
+        logger.error(f"Invalid --scratch '{scratch}'. Must be an existing directory.")
+        raise typer.Exit(1)
+
+    # Validate the prefetch directory
+    if prefetch is not None and not os.path.isdir(prefetch):
+        logger.error(f"Invalid --prefetch '{prefetch}'. Must be an existing directory.")
+        raise typer.Exit(1)
+    if prefetch_files < 1:
+        logger.error(f"Invalid --prefetch-files {prefetch_files}. Must be at least 1.")
+        raise typer.Exit(1)
+
+    # Validate the output durability
+    if sync_every < 0:
+        logger.error(f"Invalid --sync-every {sync_every}. Must be 0 or more.")
+        raise typer.Exit(1)
+
+    # Validate the output layout
+    try:
+        parse_layout(shard)
+    except ValueError as e:
+        logger.error(f"Invalid --shard: {e}")
+        raise typer.Exit(1)
+
     compressor = CompressionTool(
         cal_file,
         identifier,
@@ -563,6 +1016,28 @@ def _process_files(
         op,
         verbose,
         metadata_format=metadata_format,
+        licence_key=licence_key,
+        start_method=start_method,
+        backend=backend,
+        split_large_files=split_large_files,
+        split_axis=split_axis,
+        max_tasks_per_worker=recycle_files,
+        max_bytes_per_worker=int(recycle_gb * 1024**3),
+        max_worker_rss=int(max_worker_rss_gb * 1024**3),
+        file_timeout=file_timeout,
+        timeout_per_gb=timeout_per_gb,
+        straggler_factor=straggler_factor,
+        auto_tune=auto_tune,
+        max_read_rate=max_read_mbps * 1024**2,
+        max_write_rate=max_write_mbps * 1024**2,
+        throttle_hours=throttle_hours,
+        cache_hints=cache_hints,
+        scratch_dir=scratch,
+        scratch_quota=int(scratch_quota_gb * 1024**3),
+        prefetch_dir=prefetch,
+        prefetch_depth=prefetch_files,
+        sync_every=sync_every,
+        shard_layout=shard,
     )
     compressor.process_folder(
         full_path,
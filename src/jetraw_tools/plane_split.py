@@ -0,0 +1,263 @@
+"""Intra-file parallelism: compress one large file with several workers.
+
+A large input is split into chunks of consecutive page blocks ("units": one
+ND2 sequence frame with all its channels, or one TIFF page). Chunk ``j`` is
+read and prepared with ``dpcore.prepare_image`` by worker ``j % n_workers``,
+which publishes the prepared units in order into its own shared-memory
+:class:`~jetraw_tools.shm_transport.FrameRing`. A single writer takes the
+chunks round-robin from the rings and appends the pages to the JetRaw TIFF in
+sequence, so the output is identical to compressing the whole file at once.
+
+Every worker has its own ring, so a worker can only run ahead of the writer
+by its own slots and the unit the writer needs next is always either
+published or being prepared: the pipeline cannot deadlock.
+"""
+
+import math
+import queue
+from typing import List, Optional, Tuple
+
+import nd2
+import numpy as np
+import tifffile
+
+from .dpcore import prepare_image
+from .logger import logger
+from .shm_transport import Frame, FrameRing
+from .throttle import IOThrottle, install_throttle, throttle_read
+from .workers import bootstrap_worker
+
+# Input size from which a file is split across workers when there are fewer
+# files than workers
+SPLIT_MIN_FILE_SIZE = 512 * 1024**2
+
+# Input formats that can be read unit by unit
+SPLIT_EXTENSIONS = (".nd2", ".tif", ".tiff", ".ome.tif", ".ome.tiff")
+
+# Upper bound of the shared memory used by the rings of one split file
+SPLIT_BUFFER_BYTES = 1024**3
+
+# Largest number of units in one chunk
+MAX_CHUNK_UNITS = 16
+
+
+class PlaneSource:
+    """Random access to the page blocks (units) of an uncompressed image file.
+
+    A unit is one ND2 sequence frame, of shape (channels, height, width), or
+    one TIFF page, of shape (1, height, width). Reading the units in order
+    yields the pages in the order they are written when the whole file is
+    compressed at once. ``n_units``, ``unit_shape`` and ``dtype`` describe
+    the file.
+
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension (see :data:`SPLIT_EXTENSIONS`)
+    :type image_extension: str
+    :raises ValueError: If the file cannot be read unit by unit
+    """
+
+    def __init__(self, input_filename: str, image_extension: str) -> None:
+        if image_extension not in SPLIT_EXTENSIONS:
+            raise ValueError(f"Files with extension {image_extension} cannot be split.")
+        self._nd2 = None
+        self._tif = None
+        if image_extension == ".nd2":
+            self._nd2 = nd2.ND2File(input_filename)
+            sizes = self._nd2.sizes
+            if self._nd2.is_rgb or "S" in sizes:
+                self.close()
+                raise ValueError("RGB ND2 files cannot be split.")
+            self.n_units = math.prod(
+                n for axis, n in sizes.items() if axis not in ("C", "Y", "X")
+            )
+            self.unit_shape = (sizes.get("C", 1), sizes["Y"], sizes["X"])
+            self.dtype = np.dtype(self._nd2.dtype)
+        else:
+            self._tif = tifffile.TiffFile(input_filename)
+            series = self._tif.series
+            page_shape = self._tif.pages[0].shape
+            self.n_units = len(self._tif.pages)
+            if (
+                len(series) != 1
+                or len(page_shape) != 2
+                or tuple(series[0].shape[-2:]) != page_shape
+                or math.prod(series[0].shape[:-2]) != self.n_units
+            ):
+                self.close()
+                raise ValueError("Only single-series TIFFs of 2D pages can be split.")
+            self.unit_shape = (1,) + tuple(page_shape)
+            self.dtype = np.dtype(self._tif.pages[0].dtype)
+
+    def __enter__(self) -> "PlaneSource":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def read(self, index: int) -> np.ndarray:
+        """Read one unit.
+
+        :param index: Unit index
+        :type index: int
+        :returns: The unit, reshaped to :attr:`unit_shape`
+        :rtype: np.ndarray
+        """
+        if self._nd2 is not None:
+            unit = self._nd2.read_frame(index)
+        else:
+            unit = self._tif.pages[index].asarray()
+        throttle_read(unit.nbytes)
+        return unit.reshape(self.unit_shape)
+
+    def close(self) -> None:
+        """Close the underlying file."""
+        if self._nd2 is not None:
+            self._nd2.close()
+            self._nd2 = None
+        if self._tif is not None:
+            self._tif.close()
+            self._tif = None
+
+
+def can_split(input_filename: str, image_extension: str) -> bool:
+    """Return whether a file can be compressed unit by unit.
+
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension
+    :type image_extension: str
+    :returns: True if :class:`PlaneSource` can read the file
+    :rtype: bool
+    """
+    if image_extension not in SPLIT_EXTENSIONS:
+        return False
+    try:
+        with PlaneSource(input_filename, image_extension):
+            return True
+    except Exception:
+        return False
+
+
+def plan_chunks(
+    n_units: int, n_workers: int, unit_bytes: int, chunk_units: Optional[int] = None
+) -> List[range]:
+    """Split the units of a file into chunks of consecutive units.
+
+    Aims at about four chunks per worker so the work stays balanced, with at
+    most :data:`MAX_CHUNK_UNITS` units per chunk, and keeps the shared memory
+    of all rings (two chunks per worker) within :data:`SPLIT_BUFFER_BYTES`.
+
+    :param n_units: Number of units in the file
+    :type n_units: int
+    :param n_workers: Number of workers
+    :type n_workers: int
+    :param unit_bytes: Size of one unit in bytes
+    :type unit_bytes: int
+    :param chunk_units: Units per chunk, overriding the heuristic
+    :type chunk_units: Optional[int]
+    :returns: Ranges of unit indices, in order
+    :rtype: List[range]
+    """
+    if chunk_units is None:
+        chunk_units = math.ceil(n_units / (4 * max(1, n_workers)))
+        chunk_units = min(chunk_units, MAX_CHUNK_UNITS)
+        memory_bound = SPLIT_BUFFER_BYTES // max(1, 2 * n_workers * unit_bytes)
+        chunk_units = max(1, min(chunk_units, memory_bound))
+    return [
+        range(start, min(start + chunk_units, n_units))
+        for start in range(0, n_units, chunk_units)
+    ]
+
+
+def split_worker(
+    ring: FrameRing,
+    input_filename: str,
+    image_extension: str,
+    chunks: List[range],
+    identifier: str,
+    calibration_file: Optional[str],
+    licence_key: Optional[str],
+    throttle: Optional[IOThrottle] = None,
+) -> None:
+    """Read and prepare the units of the given chunks into a ring, in order.
+
+    On failure the error is logged and the end of the stream is signalled, so
+    the writer stops waiting for this worker.
+
+    :param ring: The ring of this worker
+    :type ring: FrameRing
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension
+    :type image_extension: str
+    :param chunks: Chunks handled by this worker, in order
+    :type chunks: List[range]
+    :param identifier: Camera identifier for dpcore.prepare_image
+    :type identifier: str
+    :param calibration_file: Path to the JetRaw calibration file
+    :type calibration_file: Optional[str]
+    :param licence_key: JetRaw license key
+    :type licence_key: Optional[str]
+    :param throttle: Bandwidth limits of the run, shared with the other workers
+    :type throttle: Optional[IOThrottle]
+    """
+    bootstrap_worker(calibration_file, licence_key, "compress")
+    install_throttle(throttle)
+    try:
+        with PlaneSource(input_filename, image_extension) as source:
+            for chunk in chunks:
+                for index in chunk:
+                    slot = ring.acquire()
+                    unit = ring.frame(slot)
+                    np.copyto(unit, source.read(index), casting="unsafe")
+                    for plane in unit:
+                        prepare_image(plane, identifier)
+                    ring.publish(slot, meta=index)
+                    del unit
+    except Exception as e:
+        logger.error(f"Error preparing {input_filename}: {e}")
+        ring.finish()
+    finally:
+        ring.close()
+
+
+def next_unit(ring: FrameRing, process, poll_interval: float = 1.0) -> Frame:
+    """Wait for the next unit of a worker.
+
+    :param ring: The ring of the worker
+    :type ring: FrameRing
+    :param process: The worker process
+    :param poll_interval: Seconds between checks that the worker is alive
+    :type poll_interval: float
+    :returns: The next unit published by the worker
+    :rtype: Frame
+    :raises RuntimeError: If the worker failed or exited early
+    """
+    while True:
+        try:
+            frame = ring.get(timeout=poll_interval)
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(
+                    f"Split worker exited unexpectedly (exit code {process.exitcode})."
+                )
+            continue
+        if frame is None:
+            raise RuntimeError("Split worker failed, see the log for details.")
+        return frame
+
+
+def unit_layout(input_filename: str, image_extension: str) -> Tuple[int, tuple]:
+    """Return the number of units and the unit shape of a file.
+
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension
+    :type image_extension: str
+    :returns: Tuple of (number of units, unit shape)
+    :rtype: Tuple[int, tuple]
+    :raises ValueError: If the file cannot be split
+    """
+    with PlaneSource(input_filename, image_extension) as source:
+        return source.n_units, source.unit_shape
@@ -0,0 +1,257 @@
+"""Dry-run planning: estimate output size and runtime of a compression run.
+
+Only file headers are read for every input. For each acquisition type (file
+extension, frame shape and pixel type) a few files are sampled, and a few
+evenly spaced planes of each sampled file go through ``dpcore.prepare_image``
+and the JetRaw encoder in memory. The measured compression ratio and
+single-core throughput of each type are then extrapolated to all its files.
+Nothing is written to disk.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .core import encode_raw
+from .dpcore import ensure_parameters, prepare_image
+from .logger import logger
+from .plane_split import PlaneSource
+
+DEFAULT_SAMPLES_PER_FILE = 4
+
+DEFAULT_FILES_PER_TYPE = 3
+
+
+def _evenly_spaced(n_items: int, n_samples: int) -> List[int]:
+    """Return up to n_samples distinct, evenly spaced indices in range(n_items)."""
+    if n_items <= 0 or n_samples <= 0:
+        return []
+    if n_samples >= n_items:
+        return list(range(n_items))
+    return sorted({int(i) for i in np.linspace(0, n_items - 1, n_samples)})
+
+
+def describe_file(input_filename: str, image_extension: str) -> Optional[dict]:
+    """Read the layout of an input file from its header.
+
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension
+    :type image_extension: str
+    :returns: Dictionary with the path, size on disk, number of units, unit
+        shape, pixel type, uncompressed uint16 size in bytes ('raw_bytes') and
+        acquisition type, or None if the file cannot be sampled
+    :rtype: Optional[dict]
+    """
+    try:
+        with PlaneSource(input_filename, image_extension) as source:
+            n_units, unit_shape, dtype = source.n_units, source.unit_shape, source.dtype
+    except Exception as e:
+        logger.debug(f"Cannot sample {input_filename}: {e}")
+        return None
+    return {
+        "path": input_filename,
+        "size": os.path.getsize(input_filename),
+        "n_units": n_units,
+        "unit_shape": unit_shape,
+        "dtype": dtype.name,
+        "raw_bytes": n_units * int(np.prod(unit_shape)) * 2,
+        "type": (image_extension, unit_shape, dtype.name),
+    }
+
+
+def measure_file(
+    input_filename: str, image_extension: str, identifier: str, n_samples: int
+) -> dict:
+    """Prepare and encode sampled planes of a file in memory.
+
+    :param input_filename: Path to the image file
+    :type input_filename: str
+    :param image_extension: File extension
+    :type image_extension: str
+    :param identifier: Camera identifier for dpcore.prepare_image
+    :type identifier: str
+    :param n_samples: Number of units to sample
+    :type n_samples: int
+    :returns: Dictionary with the sampled 'raw_bytes', 'compressed_bytes',
+        'read_seconds' and 'codec_seconds'
+    :rtype: dict
+    """
+    raw_bytes = compressed_bytes = 0
+    read_seconds = codec_seconds = 0.0
+    with PlaneSource(input_filename, image_extension) as source:
+        for index in _evenly_spaced(source.n_units, n_samples):
+            start = time.perf_counter()
+            # Always a private copy: prepare_image modifies the planes in place
+            unit = np.array(source.read(index), dtype=np.uint16, order="C")
+            read_done = time.perf_counter()
+            for plane in unit:
+                prepare_image(plane, identifier)
+                compressed_bytes += encode_raw(plane).size
+            codec_seconds += time.perf_counter() - read_done
+            read_seconds += read_done - start
+            raw_bytes += unit.nbytes
+    return {
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": compressed_bytes,
+        "read_seconds": read_seconds,
+        "codec_seconds": codec_seconds,
+    }
+
+
+def plan_files(
+    folder_path: str,
+    image_files: List[str],
+    image_extension: str,
+    identifier: str,
+    ncores: int,
+    calibration_file: Optional[str] = None,
+    samples_per_file: int = DEFAULT_SAMPLES_PER_FILE,
+    files_per_type: int = DEFAULT_FILES_PER_TYPE,
+) -> dict:
+    """Estimate the output size and duration of compressing a set of files.
+
+    The duration assumes that the per-core throughput measured on the sampled
+    planes (read, prepare and encode) scales linearly to ``ncores``; writing
+    the output is not included.
+
+    :param folder_path: The path to the folder containing the images
+    :type folder_path: str
+    :param image_files: The image file names
+    :type image_files: List[str]
+    :param image_extension: The image file extension
+    :type image_extension: str
+    :param identifier: Camera identifier for dpcore.prepare_image
+    :type identifier: str
+    :param ncores: Number of cores of the planned run
+    :type ncores: int
+    :param calibration_file: JetRaw calibration file to load, if not loaded yet
+    :type calibration_file: Optional[str]
+    :param samples_per_file: Number of planes (units) sampled per file
+    :type samples_per_file: int
+    :param files_per_type: Number of files sampled per acquisition type, 0 to
+        sample every file
+    :type files_per_type: int
+    :returns: The plan, see :func:`describe_plan`
+    :rtype: dict
+    """
+    if calibration_file is not None:
+        ensure_parameters(calibration_file)
+
+    files = []
+    skipped = []
+    for image_file in image_files:
+        info = describe_file(os.path.join(folder_path, image_file), image_extension)
+        if info is None:
+            skipped.append(image_file)
+        else:
+            files.append(info)
+
+    groups: Dict[tuple, List[dict]] = {}
+    for info in files:
+        groups.setdefault(info["type"], []).append(info)
+
+    types = []
+    totals = {"input_bytes": 0, "raw_bytes": 0, "output_bytes": 0, "cpu_seconds": 0.0}
+    for acquisition_type, members in groups.items():
+        if files_per_type > 0:
+            sampled = [members[i] for i in _evenly_spaced(len(members), files_per_type)]
+        else:
+            sampled = members
+        measured = {
+            "raw_bytes": 0,
+            "compressed_bytes": 0,
+            "read_seconds": 0.0,
+            "codec_seconds": 0.0,
+        }
+        for info in sampled:
+            for name, value in measure_file(
+                info["path"], image_extension, identifier, samples_per_file
+            ).items():
+                measured[name] += value
+
+        ratio = measured["compressed_bytes"] / max(1, measured["raw_bytes"])
+        seconds = measured["read_seconds"] + measured["codec_seconds"]
+        throughput = measured["raw_bytes"] / seconds if seconds > 0 else float("inf")
+        raw_bytes = sum(info["raw_bytes"] for info in members)
+        input_bytes = sum(info["size"] for info in members)
+        output_bytes = raw_bytes * ratio
+        cpu_seconds = raw_bytes / throughput
+        types.append(
+            {
+                "type": acquisition_type,
+                "files": len(members),
+                "sampled_files": len(sampled),
+                "sampled_bytes": measured["raw_bytes"],
+                "ratio": ratio,
+                "core_throughput": throughput,
+                "input_bytes": input_bytes,
+                "raw_bytes": raw_bytes,
+                "output_bytes": output_bytes,
+                "cpu_seconds": cpu_seconds,
+            }
+        )
+        totals["input_bytes"] += input_bytes
+        totals["raw_bytes"] += raw_bytes
+        totals["output_bytes"] += output_bytes
+        totals["cpu_seconds"] += cpu_seconds
+
+    ncores = max(1, ncores)
+    return {
+        "files": len(files),
+        "skipped": skipped,
+        "types": types,
+        "ncores": ncores,
+        "wall_seconds": totals["cpu_seconds"] / ncores,
+        **totals,
+    }
+
+
+def _format_bytes(n_bytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n_bytes) < 1024 or unit == "TB":
+            return f"{n_bytes:.1f} {unit}" if unit != "B" else f"{n_bytes:.0f} B"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "unknown"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def describe_plan(plan: dict) -> str:
+    """Format a plan as a human-readable report.
+
+    :param plan: Plan as returned by :func:`plan_files`
+    :type plan: dict
+    :returns: Multi-line report
+    :rtype: str
+    """
+    lines = []
+    for group in plan["types"]:
+        extension, unit_shape, dtype = group["type"]
+        lines.append(
+            f"{extension} {'x'.join(str(n) for n in unit_shape)} {dtype}: "
+            f"{group['files']} files ({group['sampled_files']} sampled), "
+            f"ratio {group['ratio']:.3f}, "
+            f"{group['core_throughput'] / 1024**2:.1f} MB/s per core"
+        )
+    saved = plan["input_bytes"] - plan["output_bytes"]
+    lines.append(
+        f"Total: {plan['files']} files, {_format_bytes(plan['input_bytes'])} in, "
+        f"~{_format_bytes(plan['output_bytes'])} out "
+        f"(~{_format_bytes(saved)} saved)"
+    )
+    lines.append(
+        f"Estimated duration on {plan['ncores']} cores: "
+        f"{_format_duration(plan['wall_seconds'])}"
+    )
+    if plan["skipped"]:
+        lines.append(f"Not sampled (unsupported layout): {len(plan['skipped'])} files")
+    return "\n".join(lines)
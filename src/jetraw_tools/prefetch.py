@@ -0,0 +1,298 @@
+"""Copy the next source files of a batch to local disk ahead of the workers.
+
+Readers like ``nd2.ND2File`` issue many small random reads, which is slow
+over SMB or NFS. A :class:`Prefetcher` in the main process copies the files
+the workers will process next, in the order they are dispatched, to a
+local cache directory with large sequential reads. A worker reads the local
+copy when it is complete and the source otherwise, then removes the copy,
+which makes room for the next one. At most ``depth`` copies are on local
+disk at once.
+
+Each task has a state in an array shared with the workers, so a copy that
+finishes after its worker already started on the source is thrown away
+instead of filling the cache.
+"""
+
+import collections
+import os
+import shutil
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+from .logger import logger
+from .pagecache import advise_sequential, drop_file
+from .throttle import IOThrottle
+
+# Default number of source files copied ahead of the workers
+DEFAULT_PREFETCH_DEPTH = 8
+
+# Threads copying source files, several streams help on network storage
+PREFETCH_THREADS = 2
+
+# Bytes per read when copying a source file
+COPY_BUFFER = 8 * 1024**2
+
+# Seconds between two checks for room in the cache
+POLL_INTERVAL = 0.05
+
+# Task states
+PENDING, COPYING, CACHED, TAKEN = range(4)
+
+
+class PrefetchCache:
+    """Local directory holding copies of the next source files of a run.
+
+    Created in the main process before the workers start, and passed to
+    them with the job options, so the task states are shared.
+
+    :param cache_dir: Directory on fast local storage, created if needed
+    :type cache_dir: str
+    :param n_tasks: Number of tasks of the run
+    :type n_tasks: int
+    :param depth: Upper bound of the copies on local disk
+    :type depth: int
+    :param context: Multiprocessing context of the worker processes
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        n_tasks: int,
+        depth: int = DEFAULT_PREFETCH_DEPTH,
+        context=None,
+    ):
+        if context is None:
+            import multiprocessing
+
+            context = multiprocessing.get_context()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="jetraw_tools-", dir=cache_dir)
+        self.depth = max(1, depth)
+        self._states = context.Array("b", max(1, n_tasks))
+        # Only changed under the lock of the states
+        self._cached = context.Value("i", 0, lock=False)
+
+    @property
+    def cached(self) -> int:
+        """Number of copies on local disk or being copied."""
+        return self._cached.value
+
+    def local_path(self, task_index: int, source: str) -> str:
+        """Return the path of the local copy of a task's source.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :param source: Path to the source file
+        :type source: str
+        :returns: Path in the cache directory
+        :rtype: str
+        """
+        return os.path.join(self.path, f"{task_index}-{os.path.basename(source)}")
+
+    def pending(self, task_index: int) -> bool:
+        """Whether a task was neither copied nor started yet."""
+        return self._states[task_index] == PENDING
+
+    def reserve(self, task_index: int) -> bool:
+        """Claim room for copying a task's source, if it was not started yet.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :returns: Whether the source should be copied now, False if the
+            cache is full or the task was started in the meantime
+        :rtype: bool
+        """
+        with self._states.get_lock():
+            if self._states[task_index] != PENDING:
+                return False
+            if self._cached.value >= self.depth:
+                return False
+            self._states[task_index] = COPYING
+            self._cached.value += 1
+        return True
+
+    def complete(self, task_index: int, partial: str, source: str) -> bool:
+        """Publish a finished copy, or drop it if its worker already started.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :param partial: Path of the finished copy under a temporary name
+        :type partial: str
+        :param source: Path to the source file
+        :type source: str
+        :returns: Whether the copy is used
+        :rtype: bool
+        """
+        with self._states.get_lock():
+            if self._states[task_index] == COPYING:
+                os.rename(partial, self.local_path(task_index, source))
+                self._states[task_index] = CACHED
+                return True
+            self._cached.value -= 1
+        os.remove(partial)
+        return False
+
+    def abandon(self, task_index: int) -> None:
+        """Give back the room of a copy that failed; the source is read instead.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        """
+        with self._states.get_lock():
+            if self._states[task_index] == COPYING:
+                self._states[task_index] = TAKEN
+            self._cached.value -= 1
+
+    def take(self, task_index: int, source: str) -> Optional[str]:
+        """Start a task, returning the local copy of its source if complete.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :param source: Path to the source file
+        :type source: str
+        :returns: Path of the local copy, or None to read the source
+        :rtype: Optional[str]
+        """
+        with self._states.get_lock():
+            state = self._states[task_index]
+            self._states[task_index] = TAKEN
+        if state == CACHED:
+            return self.local_path(task_index, source)
+        return None
+
+    def evict(self, task_index: int, source: str) -> None:
+        """Remove the local copy of a task that is done, if any.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :param source: Path to the source file
+        :type source: str
+        """
+        try:
+            os.remove(self.local_path(task_index, source))
+        except FileNotFoundError:
+            return
+        with self._states.get_lock():
+            self._cached.value -= 1
+
+
+class Prefetcher:
+    """Copy the sources of upcoming tasks to a :class:`PrefetchCache`.
+
+    :param cache: The cache of the run
+    :type cache: PrefetchCache
+    :param sources: (task index, source path) of the tasks, in the order
+        they are dispatched to the workers
+    :type sources: List[Tuple[int, str]]
+    :param threads: Number of copy threads
+    :type threads: int
+    :param cache_hints: Drop the sources from the page cache once copied
+    :type cache_hints: bool
+    :param throttle: Read limit of the run, charged before each read of a
+        source; the workers then read the local copies unthrottled
+    :type throttle: Optional[IOThrottle]
+    """
+
+    def __init__(
+        self,
+        cache: PrefetchCache,
+        sources: List[Tuple[int, str]],
+        threads: int = PREFETCH_THREADS,
+        cache_hints: bool = True,
+        throttle: Optional[IOThrottle] = None,
+    ) -> None:
+        self.cache = cache
+        self.cache_hints = cache_hints
+        self.throttle = throttle
+        self.copied = 0
+        self.copied_bytes = 0
+        self._sources = collections.deque(sources)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True) for _ in range(threads)
+        ]
+
+    def start(self) -> None:
+        """Start copying."""
+        for thread in self._threads:
+            thread.start()
+
+    def _next(self) -> Optional[Tuple[int, str]]:
+        """Claim the next task whose source is not copied or taken yet."""
+        while not self._stop.is_set():
+            with self._lock:
+                while self._sources and not self.cache.pending(self._sources[0][0]):
+                    # Its worker started on the source already
+                    self._sources.popleft()
+                if not self._sources:
+                    return None
+                if self.cache.reserve(self._sources[0][0]):
+                    return self._sources.popleft()
+            self._stop.wait(POLL_INTERVAL)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            index, source = task
+            partial = self.cache.local_path(index, source) + ".partial"
+            try:
+                n_bytes = self._copy(source, partial)
+                used = self.cache.complete(index, partial, source)
+            except OSError as e:
+                logger.warning(f"Could not prefetch {source}, reading it in place: {e}")
+                if os.path.exists(partial):
+                    os.remove(partial)
+                self.cache.abandon(index)
+                continue
+            if not used:
+                continue
+            with self._lock:
+                self.copied += 1
+                self.copied_bytes += n_bytes
+
+    def _copy(self, source: str, target: str) -> int:
+        """Copy a file with large sequential reads, returning its size."""
+        n_bytes = 0
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            advise_sequential(src.fileno())
+            total = os.fstat(src.fileno()).st_size
+            while not self._stop.is_set():
+                size = COPY_BUFFER
+                if self.throttle is not None:
+                    # Charged before the read, in chunks the limit can pace
+                    size = min(size, self.throttle.read_chunk() or size)
+                    self.throttle.read(min(size, total - n_bytes))
+                block = src.read(size)
+                if not block:
+                    break
+                dst.write(block)
+                n_bytes += len(block)
+        if self._stop.is_set():
+            raise OSError("the run ended")
+        if self.cache_hints:
+            drop_file(source)
+        return n_bytes
+
+    def close(self) -> None:
+        """Stop copying and remove the cache directory."""
+        self._stop.set()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+        shutil.rmtree(self.cache.path, ignore_errors=True)
+
+    def describe(self) -> str:
+        """Describe the copies for the run summary.
+
+        :returns: One-line description
+        :rtype: str
+        """
+        return (
+            f"Prefetch: copied {self.copied} sources "
+            f"({self.copied_bytes / 1024**3:.2f} GB) to local disk"
+        )
@@ -0,0 +1,28 @@
+"""Preload the JetRaw state into a forkserver process.
+
+Importing this module loads and initialises the dpcore and jetraw_tiff
+libraries and, when the parent exported it through the environment (see
+``workers.PRELOAD_ENV``), also loads the calibration. It is registered with
+``set_forkserver_preload`` so that workers forked from the server start with
+all of this already in place; their initializer then only verifies it and
+sets the license, which is passed with the initializer arguments instead.
+"""
+
+import os
+
+from .libs import JetrawLibraryError, get_dpcore_libs, get_jetraw_libs
+from .workers import PRELOAD_ENV, bootstrap_worker
+
+try:
+    get_jetraw_libs()
+    get_dpcore_libs()
+except JetrawLibraryError:
+    # Workers will report the error when they bootstrap
+    pass
+else:
+    if os.environ.get(PRELOAD_ENV["mode"]):
+        bootstrap_worker(
+            os.environ.get(PRELOAD_ENV["calibration"]) or None,
+            None,
+            os.environ[PRELOAD_ENV["mode"]],
+        )
@@ -0,0 +1,316 @@
+import math
+import os
+import sys
+from typing import Optional, Tuple
+
+# cgroup v1 reports "no limit" as a huge page-aligned number
+_CGROUP_V1_UNLIMITED = 2**60
+
+# Fraction of the memory limit handed out to workers, the rest is headroom
+MEMORY_BUDGET_FRACTION = 0.8
+
+# Peak memory of a worker as a multiple of its input file size
+WORKER_MEMORY_FACTOR = 2.0
+
+
+def _read_text(path: str) -> Optional[str]:
+    """Read a small text file, returning None if it is missing or unreadable."""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _ancestors(base: str, path: str) -> list:
+    """List a cgroup directory and its parents up to the mount point, deepest first."""
+    parts = [part for part in path.split("/") if part]
+    return [os.path.join(base, *parts[:depth]) for depth in range(len(parts), -1, -1)]
+
+
+def _cgroup_dirs(
+    controller: str, cgroup_root: str, proc_cgroup: str
+) -> Tuple[list, list]:
+    """List the cgroup v2 and v1 directories whose limits apply to this process.
+
+    Limits set on a parent cgroup, e.g. a SLURM job or a systemd slice,
+    bound the cgroups below it, so every ancestor up to the mount point is
+    listed.
+
+    :param controller: cgroup v1 controller name ('cpu' or 'memory')
+    :param cgroup_root: Mount point of the cgroup filesystem
+    :param proc_cgroup: Path to the /proc/self/cgroup file
+    :returns: Tuple of (v2 directories, v1 directories), most specific first
+    """
+    v2_dirs, v1_dirs = [], []
+    content = _read_text(proc_cgroup) or ""
+    for line in content.splitlines():
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, path = parts
+        if controllers == "":
+            v2_dirs += _ancestors(cgroup_root, path)
+        elif controller in controllers.split(","):
+            v1_dirs += _ancestors(os.path.join(cgroup_root, controllers), path)
+            v1_dirs += _ancestors(os.path.join(cgroup_root, controller), path)
+    # Inside a container the cgroup namespace usually maps to the mount root
+    v2_dirs.append(cgroup_root)
+    v1_dirs.append(os.path.join(cgroup_root, controller))
+    return list(dict.fromkeys(v2_dirs)), list(dict.fromkeys(v1_dirs))
+
+
+def _v2_cpu_limit(folder: str) -> Optional[float]:
+    content = _read_text(os.path.join(folder, "cpu.max"))
+    if content is None:
+        return None
+    quota, _, period = content.partition(" ")
+    try:
+        return int(quota) / int(period or 100000)
+    except ValueError:
+        # "max": no quota
+        return None
+
+
+def _v1_cpu_limit(folder: str) -> Optional[float]:
+    quota = _read_text(os.path.join(folder, "cpu.cfs_quota_us"))
+    period = _read_text(os.path.join(folder, "cpu.cfs_period_us"))
+    if quota is None or period is None:
+        return None
+    try:
+        quota_us, period_us = int(quota), int(period)
+    except ValueError:
+        return None
+    if quota_us <= 0 or period_us <= 0:
+        return None
+    return quota_us / period_us
+
+
+def cgroup_cpu_limit(
+    cgroup_root: str = "/sys/fs/cgroup", proc_cgroup: str = "/proc/self/cgroup"
+) -> Optional[float]:
+    """Return the CPU quota of the current cgroup, in CPUs.
+
+    Reads ``cpu.max`` (cgroup v2) or ``cpu.cfs_quota_us``/``cpu.cfs_period_us``
+    (cgroup v1) of the cgroup of this process and of its ancestors, and
+    returns the tightest.
+
+    :param cgroup_root: Mount point of the cgroup filesystem
+    :type cgroup_root: str
+    :param proc_cgroup: Path to the /proc/self/cgroup file
+    :type proc_cgroup: str
+    :returns: Number of CPUs allowed by the quota, or None if unlimited or unknown
+    :rtype: Optional[float]
+    """
+    v2_dirs, v1_dirs = _cgroup_dirs("cpu", cgroup_root, proc_cgroup)
+    limits = [_v2_cpu_limit(folder) for folder in v2_dirs]
+    limits += [_v1_cpu_limit(folder) for folder in v1_dirs]
+    limits = [limit for limit in limits if limit is not None]
+    return min(limits) if limits else None
+
+
+def _memory_limit(path: str) -> Optional[int]:
+    content = _read_text(path)
+    if content is None:
+        return None
+    try:
+        limit = int(content)
+    except ValueError:
+        # "max": no limit
+        return None
+    return None if limit >= _CGROUP_V1_UNLIMITED else limit
+
+
+def cgroup_memory_limit(
+    cgroup_root: str = "/sys/fs/cgroup", proc_cgroup: str = "/proc/self/cgroup"
+) -> Optional[int]:
+    """Return the memory limit of the current cgroup, in bytes.
+
+    Reads ``memory.max`` (cgroup v2) or ``memory.limit_in_bytes`` (cgroup v1)
+    of the cgroup of this process and of its ancestors, and returns the
+    tightest.
+
+    :param cgroup_root: Mount point of the cgroup filesystem
+    :type cgroup_root: str
+    :param proc_cgroup: Path to the /proc/self/cgroup file
+    :type proc_cgroup: str
+    :returns: Memory limit in bytes, or None if unlimited or unknown
+    :rtype: Optional[int]
+    """
+    v2_dirs, v1_dirs = _cgroup_dirs("memory", cgroup_root, proc_cgroup)
+    limits = [_memory_limit(os.path.join(folder, "memory.max")) for folder in v2_dirs]
+    limits += [
+        _memory_limit(os.path.join(folder, "memory.limit_in_bytes"))
+        for folder in v1_dirs
+    ]
+    limits = [limit for limit in limits if limit is not None]
+    return min(limits) if limits else None
+
+
+def physical_memory() -> Optional[int]:
+    """Return the total physical memory of the host in bytes, if known."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def current_rss(statm: str = "/proc/self/statm") -> Optional[int]:
+    """Return the resident set size of this process in bytes, if known.
+
+    Reads ``/proc/self/statm`` on Linux. Elsewhere the peak RSS is returned
+    instead, see :func:`peak_rss`.
+
+    :param statm: Path to the statm file of the process
+    :type statm: str
+    :returns: Resident memory in bytes, or None if unknown
+    :rtype: Optional[int]
+    """
+    content = _read_text(statm)
+    if content:
+        try:
+            return int(content.split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (IndexError, ValueError, OSError):
+            pass
+    return peak_rss()
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process in bytes, if known.
+
+    :returns: Peak resident memory in bytes, or None if unknown
+    :rtype: Optional[int]
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_times(stat: str = "/proc/stat") -> Optional[Tuple[int, int]]:
+    """Return the total and I/O wait CPU time of the host, if known.
+
+    Reads the aggregate ``cpu`` line of ``/proc/stat`` on Linux. The values
+    are cumulative clock ticks, so only differences between two calls are
+    meaningful.
+
+    :param stat: Path to the stat file
+    :type stat: str
+    :returns: Tuple of (total ticks, I/O wait ticks), or None if unknown
+    :rtype: Optional[Tuple[int, int]]
+    """
+    content = _read_text(stat)
+    if not content:
+        return None
+    fields = content.splitlines()[0].split()
+    if fields[0] != "cpu" or len(fields) < 6:
+        return None
+    try:
+        ticks = [int(value) for value in fields[1:]]
+    except ValueError:
+        return None
+    # user nice system idle iowait ..., guest time is already in user and nice
+    return sum(ticks[:8]), ticks[4]
+
+
+def detect_resources(
+    cgroup_root: str = "/sys/fs/cgroup", proc_cgroup: str = "/proc/self/cgroup"
+) -> dict:
+    """Detect the CPUs and memory actually available to this process.
+
+    Combines the host CPU count, the CPU affinity mask (``os.sched_getaffinity``,
+    e.g. set by SLURM or taskset), the cgroup CPU quota (Kubernetes, Docker,
+    SLURM) and the cgroup memory limit, falling back to the physical memory.
+
+    :param cgroup_root: Mount point of the cgroup filesystem
+    :type cgroup_root: str
+    :param proc_cgroup: Path to the /proc/self/cgroup file
+    :type proc_cgroup: str
+    :returns: Dictionary with 'cpus' (usable CPUs), 'host_cpus', 'affinity_cpus',
+        'quota_cpus', 'memory_limit' (bytes or None), 'memory_source'
+        ('cgroup', 'physical' or None) and 'memory_budget' (bytes or None)
+    :rtype: dict
+    """
+    host_cpus = os.cpu_count() or 1
+    try:
+        affinity_cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        affinity_cpus = None
+    quota_cpus = cgroup_cpu_limit(cgroup_root, proc_cgroup)
+
+    cpus = host_cpus
+    if affinity_cpus:
+        cpus = min(cpus, affinity_cpus)
+    if quota_cpus is not None:
+        # A fractional quota still allows one busy worker
+        cpus = min(cpus, max(1, math.ceil(quota_cpus)))
+
+    memory_limit = cgroup_memory_limit(cgroup_root, proc_cgroup)
+    memory_source = "cgroup" if memory_limit is not None else None
+    host_memory = physical_memory()
+    if host_memory is not None and (memory_limit is None or host_memory < memory_limit):
+        memory_limit = host_memory
+        memory_source = "physical"
+
+    return {
+        "cpus": cpus,
+        "host_cpus": host_cpus,
+        "affinity_cpus": affinity_cpus,
+        "quota_cpus": quota_cpus,
+        "memory_limit": memory_limit,
+        "memory_source": memory_source,
+        "memory_budget": (
+            int(memory_limit * MEMORY_BUDGET_FRACTION) if memory_limit else None
+        ),
+    }
+
+
+def describe_resources(resources: dict) -> str:
+    """Format detected resources for logging.
+
+    :param resources: Dictionary returned by :func:`detect_resources`
+    :type resources: dict
+    :returns: Human-readable summary
+    :rtype: str
+    """
+    parts = [f"{resources['cpus']} usable CPUs (host: {resources['host_cpus']}"]
+    if resources["affinity_cpus"] is not None:
+        parts.append(f", affinity: {resources['affinity_cpus']}")
+    if resources["quota_cpus"] is not None:
+        parts.append(f", cgroup quota: {resources['quota_cpus']:g}")
+    parts.append(")")
+    if resources["memory_limit"] is not None:
+        parts.append(
+            f", memory limit {resources['memory_limit'] / 1024**3:.1f} GB "
+            f"({resources['memory_source']}), worker budget "
+            f"{resources['memory_budget'] / 1024**3:.1f} GB"
+        )
+    return "Detected resources: " + "".join(parts)
+
+
+def memory_bound_workers(
+    n_workers: int,
+    max_file_size: int,
+    memory_budget: Optional[int],
+    memory_factor: float = WORKER_MEMORY_FACTOR,
+) -> int:
+    """Limit the worker count so the largest files fit in the memory budget.
+
+    :param n_workers: Requested number of workers
+    :type n_workers: int
+    :param max_file_size: Size in bytes of the largest input file
+    :type max_file_size: int
+    :param memory_budget: Memory available to workers in bytes, or None if unknown
+    :type memory_budget: Optional[int]
+    :param memory_factor: Peak worker memory as a multiple of the input file size
+    :type memory_factor: float
+    :returns: Number of workers, at least 1
+    :rtype: int
+    """
+    if not memory_budget or max_file_size <= 0:
+        return n_workers
+    per_worker = max_file_size * memory_factor
+    return max(1, min(n_workers, int(memory_budget // per_worker)))
@@ -0,0 +1,400 @@
+"""Stage outputs on local scratch disk and move them to the target in the background.
+
+Writing a JetRaw TIFF page by page, and then rewriting its description, is
+a stream of small synchronous writes that crawls on NFS or SMB. With a
+:class:`ScratchArea`, every task writes its outputs to a directory of its
+own on fast local disk. Once the task succeeds, the directory is renamed to
+mark it ready and a :class:`ScratchMover` in the main process copies the
+files to the output folder with large sequential copies, in background
+threads, while the workers go on compressing.
+
+A byte quota bounds the disk used by the outputs waiting to be moved:
+workers wait before starting a new file while the quota is used up, and
+give up once the mover failed to move outputs. The copies are committed to
+their final names like outputs written in place, see
+:mod:`jetraw_tools.commit`, so they follow ``sync_every`` too. Source files
+are only removed once their output is committed.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from .commit import OutputCommitter, PendingOutput, commit_files, partial_path
+from .logger import logger
+from .pagecache import drop_file
+
+# Default upper bound of the bytes waiting in the scratch area
+DEFAULT_SCRATCH_QUOTA = 50 * 1024**3
+
+# Threads copying outputs to the output folder
+MOVER_THREADS = 2
+
+# Seconds between two checks of the quota or of the ready outputs
+POLL_INTERVAL = 0.1
+
+# Name of the file describing the outputs of a staging directory
+MANIFEST = ".move.json"
+
+
+class ScratchArea:
+    """Directory on local disk where tasks write their outputs first.
+
+    Created in the main process before the workers start, and passed to
+    them with the job options, so the byte counter is shared.
+
+    :param scratch_dir: Directory on fast local storage, created if needed
+    :type scratch_dir: str
+    :param quota: Upper bound of the bytes waiting to be moved, 0 for none.
+        Files being written are not counted, so the quota can be exceeded by
+        up to one output per worker.
+    :type quota: int
+    :param context: Multiprocessing context of the worker processes
+    """
+
+    def __init__(
+        self, scratch_dir: str, quota: int = DEFAULT_SCRATCH_QUOTA, context=None
+    ):
+        if context is None:
+            import multiprocessing
+
+            context = multiprocessing.get_context()
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="jetraw_tools-", dir=scratch_dir)
+        self.quota = quota
+        self._used = context.Value("q", 0)
+        # Tasks whose outputs could not be moved
+        self._failed = context.Value("i", 0)
+
+    @property
+    def used(self) -> int:
+        """Bytes of the outputs waiting to be moved."""
+        return self._used.value
+
+    def stage(self, task_index: int) -> str:
+        """Create the staging directory of a task, once the quota allows it.
+
+        :param task_index: Index of the task
+        :type task_index: int
+        :returns: The directory the task writes its outputs to
+        :rtype: str
+        :raises OSError: If the quota is used up and the mover failed to move
+            outputs, which may never be moved
+        """
+        waited = 0.0
+        while self.quota and self._used.value >= self.quota:
+            if self._failed.value:
+                raise OSError(
+                    f"The scratch quota is used up and {self._failed.value} "
+                    f"outputs could not be moved from {self.path}"
+                )
+            time.sleep(POLL_INTERVAL)
+            waited += POLL_INTERVAL
+        if waited:
+            logger.debug(f"Waited {waited:.1f} s for the scratch quota")
+        staging = os.path.join(self.path, f"partial-{os.getpid()}-{task_index}")
+        os.makedirs(staging, exist_ok=True)
+        return staging
+
+    def commit(
+        self,
+        staging: str,
+        target_dir: str,
+        source: Optional[str] = None,
+        output: Optional[str] = None,
+        key: Optional[str] = None,
+    ) -> None:
+        """Mark the outputs of a task ready to be moved.
+
+        :param staging: Directory returned by :meth:`stage`
+        :type staging: str
+        :param target_dir: Directory the outputs are moved to
+        :type target_dir: str
+        :param source: Input file to remove once the outputs are moved
+        :type source: Optional[str]
+        :param output: Name of the output the source removal is checked against
+        :type output: Optional[str]
+        :param key: Key of the output in the index of the output folder
+        :type key: Optional[str]
+        """
+        n_bytes = sum(entry.stat().st_size for entry in os.scandir(staging))
+        manifest = {
+            "target_dir": target_dir,
+            "source": source,
+            "output": output,
+            "key": key,
+            "bytes": n_bytes,
+        }
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+        with self._used.get_lock():
+            self._used.value += n_bytes
+        name = os.path.basename(staging).replace("partial-", "ready-", 1)
+        os.rename(staging, os.path.join(self.path, name))
+
+    def discard(self, staging: str) -> None:
+        """Remove the staging directory of a task that failed.
+
+        :param staging: Directory returned by :meth:`stage`
+        :type staging: str
+        """
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def release(self, n_bytes: int, failed: bool = False) -> None:
+        """Give back the quota of outputs that were moved, or failed to be.
+
+        Outputs that could not be moved stay in the scratch directory but no
+        longer count towards the quota, so they cannot block the run.
+
+        :param n_bytes: Bytes of the outputs
+        :type n_bytes: int
+        :param failed: Whether the outputs could not be moved
+        :type failed: bool
+        """
+        with self._used.get_lock():
+            self._used.value -= n_bytes
+        if failed:
+            with self._failed.get_lock():
+                self._failed.value += 1
+
+
+def run_staged(
+    area: Optional[ScratchArea],
+    task_index: int,
+    output_folder: str,
+    process: Callable[[str], int],
+    source: Optional[str] = None,
+    output: Optional[str] = None,
+    key: Optional[str] = None,
+) -> int:
+    """Run a task writing to its own staging directory of a scratch area.
+
+    :param area: The scratch area of the run
+    :type area: ScratchArea
+    :param task_index: Index of the task
+    :type task_index: int
+    :param output_folder: The output folder of the run
+    :type output_folder: str
+    :param process: Called with the folder to write the outputs to, returns
+        the number of failed files
+    :type process: Callable[[str], int]
+    :param source: Input file to remove once the outputs are moved
+    :type source: Optional[str]
+    :param output: Name of the output the source removal is checked against
+    :type output: Optional[str]
+    :param key: Key of the output in the index of the output folder
+    :type key: Optional[str]
+    :returns: The number of failed files (0 or 1)
+    :rtype: int
+    """
+    try:
+        staging = area.stage(task_index)
+    except OSError as e:
+        logger.error(f"Could not stage the outputs of task {task_index}: {e}")
+        return 1
+    failed = 1
+    try:
+        failed = process(staging)
+    finally:
+        if failed:
+            area.discard(staging)
+        else:
+            area.commit(staging, output_folder, source, output, key)
+    return failed
+
+
+class ScratchMover:
+    """Copy ready outputs from a scratch area to their target in the background.
+
+    :param area: The scratch area of the run
+    :type area: ScratchArea
+    :param threads: Number of copy threads
+    :type threads: int
+    :param cache_hints: Drop the copies from the page cache once committed
+    :type cache_hints: bool
+    :param remove_source: Called with (moved output, source) to remove the
+        source of a task once its outputs are moved. None removes it as is.
+    :type remove_source: Optional[Callable[[str, str], None]]
+    :param on_moved: Called with (index key, moved output) for the tasks
+        whose outputs have an index key
+    :type on_moved: Optional[Callable[[str, str], None]]
+    :param committer: Commits the copies in batches (``sync_every`` other
+        than 1), and then removes their sources and records them itself.
+        None flushes and commits the copies of each task as they complete.
+    :type committer: Optional[OutputCommitter]
+    """
+
+    def __init__(
+        self,
+        area: ScratchArea,
+        threads: int = MOVER_THREADS,
+        cache_hints: bool = True,
+        remove_source: Optional[Callable[[str, str], None]] = None,
+        on_moved: Optional[Callable[[str, str], None]] = None,
+        committer: Optional[OutputCommitter] = None,
+    ) -> None:
+        self.area = area
+        self.cache_hints = cache_hints
+        self.remove_source = remove_source
+        self.on_moved = on_moved
+        self.committer = committer
+        self.moved = 0
+        self.moved_bytes = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._claimed: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._scanner = threading.Thread(target=self._scan, daemon=True)
+
+    def start(self) -> None:
+        """Start looking for ready outputs."""
+        self._scanner.start()
+
+    def _submit_ready(self) -> None:
+        for entry in sorted(os.scandir(self.area.path), key=lambda e: e.name):
+            if entry.name.startswith("ready-") and entry.name not in self._claimed:
+                self._claimed.add(entry.name)
+                self._executor.submit(self._move, entry.path)
+
+    def _scan(self) -> None:
+        while not self._stop.wait(POLL_INTERVAL):
+            self._submit_ready()
+
+    def _move(self, staging: str) -> None:
+        """Copy the outputs of one task to their target and commit them."""
+        manifest = None
+        files: List[Tuple[str, str]] = []
+        try:
+            with open(os.path.join(staging, MANIFEST)) as f:
+                manifest = json.load(f)
+            target_dir = manifest["target_dir"]
+            output = None
+            if manifest["output"] is not None:
+                output = os.path.join(target_dir, manifest["output"])
+            for entry in os.scandir(staging):
+                if entry.name != MANIFEST:
+                    target = os.path.join(target_dir, entry.name)
+                    self._move_file(entry.path, partial_path(target))
+                    files.append((partial_path(target), target))
+            # The image first, it stands for the task when committed
+            files.sort(key=lambda pair: pair[1] != output)
+            source = manifest["source"]
+            if source is not None and not os.path.exists(source):
+                source = None
+            if self.committer is not None:
+                # Committed, and their source removed, with the next batch
+                pending = PendingOutput(files, source, manifest.get("key"))
+                failed = self.committer.add([pending])
+                if failed:
+                    with self._lock:
+                        self.failed += failed
+            else:
+                self._commit(files, source, output, manifest.get("key"))
+        except (OSError, ValueError) as e:
+            self._restore(files, staging)
+            logger.error(
+                f"Could not move the outputs in {staging}: {e}. They are kept "
+                f"in the scratch directory."
+            )
+            with self._lock:
+                self.failed += 1
+            if manifest is not None:
+                self.area.release(manifest["bytes"], failed=True)
+            return
+        shutil.rmtree(staging, ignore_errors=True)
+        self.area.release(manifest["bytes"])
+        with self._lock:
+            self.moved += 1
+            self.moved_bytes += manifest["bytes"]
+
+    def _commit(
+        self,
+        files: List[Tuple[str, str]],
+        source: Optional[str],
+        output: Optional[str],
+        key: Optional[str],
+    ) -> None:
+        """Flush and commit the copies of one task, then remove its source."""
+        commit_files(files)
+        if source is not None:
+            if self.remove_source is None:
+                os.remove(source)
+            else:
+                self.remove_source(output, source)
+        if key is not None and self.on_moved is not None:
+            self.on_moved(key, output)
+        if self.cache_hints:
+            for _, target in files:
+                drop_file(target)
+
+    def _move_file(self, path: str, partial: str) -> None:
+        """Move one file next to its target, under its partial name."""
+        try:
+            os.rename(path, partial)
+            return
+        except OSError:
+            # Another filesystem: copy
+            pass
+        try:
+            shutil.copyfile(path, partial)
+        except OSError:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def _restore(self, files: List[Tuple[str, str]], staging: str) -> None:
+        """Put the outputs of a task that could not be moved back in place."""
+        for partial, target in files:
+            if not os.path.exists(partial):
+                continue
+            path = os.path.join(staging, os.path.basename(target))
+            if os.path.exists(path):
+                # A copy, the original is still staged
+                os.remove(partial)
+            else:
+                try:
+                    os.rename(partial, path)
+                except OSError:
+                    pass
+
+    def finish(self) -> int:
+        """Move the remaining outputs and remove the scratch area.
+
+        Staging directories of tasks that did not finish, e.g. whose worker
+        was killed, are removed. Outputs that could not be moved are kept.
+
+        :returns: The number of tasks whose outputs could not be moved
+        :rtype: int
+        """
+        self._stop.set()
+        if self._scanner.is_alive():
+            self._scanner.join()
+        self._submit_ready()
+        self._executor.shutdown(wait=True)
+        for entry in os.scandir(self.area.path):
+            if entry.name.startswith("partial-"):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        try:
+            os.rmdir(self.area.path)
+        except OSError:
+            logger.warning(
+                f"Outputs that could not be moved remain in {self.area.path}"
+            )
+        return self.failed
+
+    def describe(self) -> str:
+        """Describe the moves for the run summary.
+
+        :returns: One-line description
+        :rtype: str
+        """
+        return (
+            f"Scratch: moved {self.moved} outputs "
+            f"({self.moved_bytes / 1024**3:.2f} GB), {self.failed} failed"
+        )
@@ -0,0 +1,213 @@
+"""Spread the outputs of very large batches over subdirectories.
+
+With hundreds of thousands of files, a single flat output folder makes every
+directory operation slow, including the listing done to skip processed
+files. A :class:`ShardLayout` puts every output in a subdirectory of the
+output folder:
+
+* ``hash[:K]``: named after the first K (default 2) hex digits of the hash
+  of the input name, so an input always lands in the same subdirectory;
+* ``files[:N]``: numbered subdirectories of N (default 1000) outputs each,
+  filled in order, continuing after the highest subdirectory of earlier
+  runs.
+
+An :class:`OutputIndex` records which output was written for which input,
+one ``input<TAB>output`` line per output, in ``index.tsv`` at the top of the
+output folder. Outputs of a single ND2 position are recorded as
+``input#P<position>``. Skip checks read the index instead of listing the
+folder, and downstream tools can use it to find the outputs.
+
+Every process appends the outputs it committed to a file of its own in
+``index.d``, so no two processes write to the same file. The parts are
+merged into ``index.tsv`` at the end of the run, and read along with it
+should the run be interrupted.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Name of the index in the output folder, and of its per-process parts
+INDEX_FILE = "index.tsv"
+INDEX_PARTS = "index.d"
+
+VALID_LAYOUTS = ("hash", "files")
+DEFAULT_SHARD_SIZE = {"hash": 2, "files": 1000}
+
+# The open index part of this process, see OutputIndex.append
+_part: dict = {}
+
+
+class ShardLayout(NamedTuple):
+    """Layout of the output subdirectories, see :func:`parse_layout`."""
+
+    kind: str
+    size: int
+    # Number of the first output of the run ('files' layout), see next_slot
+    base: int = 0
+
+    def shard(self, task_index: int, image_file: str) -> str:
+        """Return the subdirectory of the output of a task.
+
+        :param task_index: Index of the task in the run
+        :type task_index: int
+        :param image_file: Input file name relative to the input folder
+        :type image_file: str
+        :returns: Subdirectory relative to the output folder
+        :rtype: str
+        """
+        if self.kind == "hash":
+            return hashlib.sha1(image_file.encode("utf-8")).hexdigest()[: self.size]
+        return f"{(self.base + task_index) // self.size:06d}"
+
+
+def parse_layout(spec: Optional[str]) -> Optional[ShardLayout]:
+    """Parse a layout such as "hash", "hash:3" or "files:500".
+
+    :param spec: The layout, or None for a flat output folder
+    :type spec: Optional[str]
+    :returns: The layout, or None
+    :rtype: Optional[ShardLayout]
+    :raises ValueError: If the layout is malformed
+    """
+    if not spec:
+        return None
+    kind, _, size = spec.partition(":")
+    if kind not in VALID_LAYOUTS:
+        raise ValueError(
+            f"Invalid shard layout '{spec}', expected one of {VALID_LAYOUTS} "
+            f"optionally followed by ':<size>'"
+        )
+    try:
+        size = int(size) if size else DEFAULT_SHARD_SIZE[kind]
+    except ValueError:
+        raise ValueError(f"Invalid shard size in '{spec}'") from None
+    if size < 1 or (kind == "hash" and size > 40):
+        raise ValueError(f"Invalid shard size in '{spec}'")
+    return ShardLayout(kind, size)
+
+
+def next_slot(entries: Dict[str, str], size: int) -> int:
+    """Return where the numbering of a 'files' layout continues.
+
+    An interrupted run commits its outputs out of order, so the highest
+    subdirectory in the index may hold outputs numbered past the count of
+    the index. Numbering continues after the outputs of that subdirectory,
+    which leaves gaps in the lower ones but never fills one past ``size``.
+
+    :param entries: The index, as returned by :meth:`OutputIndex.load`
+    :type entries: Dict[str, str]
+    :param size: Outputs per subdirectory
+    :type size: int
+    :returns: The ``base`` of the layout
+    :rtype: int
+    """
+    counts: Dict[int, int] = {}
+    for output in entries.values():
+        shard = output.replace(os.sep, "/").partition("/")[0]
+        if shard.isdigit():
+            counts[int(shard)] = counts.get(int(shard), 0) + 1
+    if not counts:
+        return 0
+    highest = max(counts)
+    return highest * size + min(counts[highest], size)
+
+
+def index_key(image_file: str, position: Optional[int] = None) -> str:
+    """Return the input column of the index line of an output.
+
+    :param image_file: Input file name relative to the input folder
+    :type image_file: str
+    :param position: ND2 stage position written to its own output, if any
+    :type position: Optional[int]
+    :returns: The key
+    :rtype: str
+    """
+    if position is None:
+        return image_file
+    return f"{image_file}#P{position:03d}"
+
+
+class OutputIndex:
+    """Index of the outputs written to a sharded output folder.
+
+    :param output_folder: The output folder
+    :type output_folder: str
+    """
+
+    def __init__(self, output_folder: str) -> None:
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, INDEX_FILE)
+        self.parts = os.path.join(output_folder, INDEX_PARTS)
+
+    def _files(self) -> list:
+        files = [self.path] if os.path.exists(self.path) else []
+        if os.path.isdir(self.parts):
+            files += sorted(
+                os.path.join(self.parts, name) for name in os.listdir(self.parts)
+            )
+        return files
+
+    def load(self) -> Dict[str, str]:
+        """Read the outputs recorded so far.
+
+        :returns: Output path relative to the output folder, by input key
+        :rtype: Dict[str, str]
+        """
+        entries = {}
+        for path in self._files():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    key, sep, output = line.rstrip("\n").partition("\t")
+                    # A line cut short by an interrupted run has no output
+                    if sep and output:
+                        entries[key] = output
+        return entries
+
+    def append(self, key: str, output: str) -> None:
+        """Record an output that was committed.
+
+        :param key: Input key, see :func:`index_key`
+        :type key: str
+        :param output: Final path of the output
+        :type output: str
+        """
+        line = f"{key}\t{os.path.relpath(output, self.output_folder)}\n"
+        if _part.get("pid") != os.getpid() or _part.get("index") != self.path:
+            os.makedirs(self.parts, exist_ok=True)
+            name = os.path.join(self.parts, f"{os.getpid()}.tsv")
+            _part.update(
+                pid=os.getpid(),
+                index=self.path,
+                file=open(name, "a", encoding="utf-8"),
+                lock=threading.Lock(),
+            )
+        with _part["lock"]:
+            _part["file"].write(line)
+            _part["file"].flush()
+
+    def merge(self) -> Tuple[int, int]:
+        """Merge the parts written by the processes of a run into the index.
+
+        Only call it once every process of the run is done.
+
+        :returns: Number of outputs in the index and number of parts merged
+        :rtype: Tuple[int, int]
+        """
+        if _part.get("index") == self.path:
+            _part.pop("file").close()
+            _part.clear()
+        parts = self._files()[1:] if os.path.exists(self.path) else self._files()
+        if not parts:
+            return len(self.load()), 0
+        entries = self.load()
+        partial = self.path + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            for key, output in entries.items():
+                f.write(f"{key}\t{output}\n")
+        os.replace(partial, self.path)
+        for part in parts:
+            os.remove(part)
+        os.rmdir(self.parts)
+        return len(entries), len(parts)
@@ -0,0 +1,230 @@
+"""Shared-memory transport of image frames between processes.
+
+A :class:`FrameRing` is a fixed number of equally sized slots in one
+``multiprocessing.shared_memory`` block, plus two small queues: one with the
+indices of free slots and one with descriptors of filled slots. Producers copy
+(or decode) frames straight into a free slot and publish its descriptor;
+consumers get a numpy view of the slot and release it when done. Only slot
+indices, shapes and small metadata go through the queues, so frames are never
+pickled.
+
+The ring is created in the parent process and handed to worker processes as a
+``Process`` argument or pool initializer argument (the queues cannot be sent
+through pool task arguments).
+"""
+
+import os
+import sys
+from multiprocessing import shared_memory
+from typing import Any, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class Frame(NamedTuple):
+    """A filled slot of a :class:`FrameRing`, as returned by ``get``."""
+
+    slot: int
+    array: np.ndarray
+    meta: Any
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing shared memory block without tracking it.
+
+    Before Python 3.13, attaching registers the block with the resource
+    tracker, which then warns about (or unlinks) it when the attaching process
+    exits although the creator still owns it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != "win32":
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class FrameRing:
+    """Ring of fixed-size shared memory slots with a descriptor queue.
+
+    :param n_slots: Number of slots, i.e. frames that can be in flight
+    :type n_slots: int
+    :param slot_shape: Largest frame shape a slot must hold
+    :type slot_shape: Tuple[int, ...]
+    :param dtype: Frame data type. Defaults to uint16
+    :type dtype: np.dtype
+    :param ctx: multiprocessing context used to create the queues. Defaults
+        to the default context
+    """
+
+    def __init__(
+        self,
+        n_slots: int,
+        slot_shape: Tuple[int, ...],
+        dtype=np.uint16,
+        ctx=None,
+    ) -> None:
+        if n_slots < 1:
+            raise ValueError(f"n_slots must be >= 1, got {n_slots}.")
+        if ctx is None:
+            import multiprocessing
+
+            ctx = multiprocessing.get_context()
+
+        self.n_slots = n_slots
+        self.slot_shape = tuple(int(n) for n in slot_shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_bytes = int(np.prod(self.slot_shape)) * self.dtype.itemsize
+        # Only the creating process frees the block, also when forked
+        self._owner_pid = os.getpid()
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(1, n_slots * self.slot_bytes)
+        )
+        self._free = ctx.Queue()
+        self._ready = ctx.Queue()
+        for slot in range(n_slots):
+            self._free.put(slot)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        state["_owner_pid"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._shm = _attach_shared_memory(state["_shm"])
+
+    def __enter__(self) -> "FrameRing":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """Name of the underlying shared memory block."""
+        return self._shm.name
+
+    def frame(self, slot: int, shape: Optional[Tuple[int, ...]] = None) -> np.ndarray:
+        """Return a numpy view of a slot.
+
+        :param slot: Slot index
+        :type slot: int
+        :param shape: Shape of the view. Defaults to the slot shape; smaller
+            frames use the start of the slot
+        :type shape: Optional[Tuple[int, ...]]
+        :returns: Writable array backed by the shared memory slot
+        :rtype: np.ndarray
+        :raises ValueError: If the shape does not fit in a slot
+        """
+        if shape is None:
+            shape = self.slot_shape
+        count = int(np.prod(shape))
+        if count * self.dtype.itemsize > self.slot_bytes:
+            raise ValueError(
+                f"Frame shape {tuple(shape)} does not fit in a slot of "
+                f"shape {self.slot_shape}."
+            )
+        return np.ndarray(
+            shape, dtype=self.dtype, buffer=self._shm.buf, offset=slot * self.slot_bytes
+        )
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """Wait for a free slot and return its index.
+
+        :param timeout: Seconds to wait, None to wait forever
+        :type timeout: Optional[float]
+        :returns: Index of the acquired slot
+        :rtype: int
+        :raises queue.Empty: If no slot became free within the timeout
+        """
+        return self._free.get(timeout=timeout)
+
+    def publish(
+        self, slot: int, shape: Optional[Tuple[int, ...]] = None, meta: Any = None
+    ) -> None:
+        """Hand a filled slot over to the consumers.
+
+        :param slot: Index of a slot obtained from :meth:`acquire`
+        :type slot: int
+        :param shape: Shape of the frame in the slot. Defaults to the slot shape
+        :type shape: Optional[Tuple[int, ...]]
+        :param meta: Small picklable payload sent along, e.g. a page index
+        :type meta: Any
+        """
+        shape = self.slot_shape if shape is None else tuple(shape)
+        self._ready.put((slot, shape, meta))
+
+    def put(
+        self, array: np.ndarray, meta: Any = None, timeout: Optional[float] = None
+    ) -> int:
+        """Copy a frame into a free slot and publish it.
+
+        :param array: Frame to send
+        :type array: np.ndarray
+        :param meta: Small picklable payload sent along, e.g. a page index
+        :type meta: Any
+        :param timeout: Seconds to wait for a free slot, None to wait forever
+        :type timeout: Optional[float]
+        :returns: Index of the slot used
+        :rtype: int
+        """
+        slot = self.acquire(timeout)
+        try:
+            np.copyto(self.frame(slot, array.shape), array, casting="same_kind")
+        except BaseException:
+            self.release(slot)
+            raise
+        self.publish(slot, array.shape, meta)
+        return slot
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Frame]:
+        """Wait for the next published frame.
+
+        The returned array is a view of the slot: call :meth:`release` with
+        its slot index once the frame is no longer needed.
+
+        :param timeout: Seconds to wait, None to wait forever
+        :type timeout: Optional[float]
+        :returns: The frame, or None once a producer called :meth:`finish`
+        :rtype: Optional[Frame]
+        :raises queue.Empty: If no frame arrived within the timeout
+        """
+        item = self._ready.get(timeout=timeout)
+        if item is None:
+            return None
+        slot, shape, meta = item
+        return Frame(slot, self.frame(slot, shape), meta)
+
+    def release(self, slot: int) -> None:
+        """Return a consumed slot to the free list."""
+        self._free.put(slot)
+
+    def finish(self, n_consumers: int = 1) -> None:
+        """Signal the end of the stream to each consumer.
+
+        :param n_consumers: Number of consumers reading from the ring
+        :type n_consumers: int
+        """
+        for _ in range(n_consumers):
+            self._ready.put(None)
+
+    def close(self) -> None:
+        """Detach from the shared memory, and free it if this is the creator.
+
+        Views returned by :meth:`frame` and :meth:`get` must not be used
+        afterwards.
+        """
+        if self._shm is None:
+            return
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views of the slots are still alive; leave the mapping to the GC
+            pass
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+        self._shm = None
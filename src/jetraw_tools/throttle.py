@@ -0,0 +1,282 @@
+"""Bandwidth limits on the reads and writes of a run.
+
+Compressing on the storage server while microscopes write to it can starve
+the acquisitions. An :class:`IOThrottle` holds one token bucket for reads and
+one for writes, kept in shared memory so every worker process of the pool
+draws from the same budget. It can be limited to time windows, e.g. the
+working hours, outside of which the run goes at full speed.
+
+The readers and writers of the package report the bytes they move with
+:func:`throttle_read` and :func:`throttle_write`, which sleep as needed once
+the throttle of the run is installed in the process. Inputs decoded in one
+call are first read with :func:`throttle_read_file`, in chunks charged
+before they are read, so no read bursts past the bucket.
+"""
+
+import multiprocessing
+import os
+import time
+from typing import List, Optional, Tuple
+
+# The throttle of this process, see install_throttle
+_throttle: dict = {}
+
+# Largest read charged to the read limit at once, see throttle_read_file
+READ_CHUNK = 8 * 1024**2
+
+
+def parse_hours(hours: Optional[str]) -> List[Tuple[int, int]]:
+    """Parse comma-separated time windows such as "08:00-12:00,13:00-20:00".
+
+    A window whose end is before its start wraps past midnight.
+
+    :param hours: The windows, or None or an empty string for none
+    :type hours: Optional[str]
+    :returns: (start, end) minutes after midnight of every window
+    :rtype: List[Tuple[int, int]]
+    :raises ValueError: If a window is malformed
+    """
+    windows = []
+    for text in (hours or "").split(","):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            start, end = (_parse_minutes(bound.strip()) for bound in text.split("-", 1))
+        except ValueError:
+            raise ValueError(
+                f"Invalid time window '{text}', expected HH:MM-HH:MM"
+            ) from None
+        windows.append((start, end))
+    return windows
+
+
+def _parse_minutes(text: str) -> int:
+    hours, minutes = text.split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 1440:
+        raise ValueError(text)
+    return hours * 60 + minutes
+
+
+def in_windows(windows: List[Tuple[int, int]], minute: int) -> bool:
+    """Return whether a time of day falls in any of the windows.
+
+    :param windows: Windows as returned by :func:`parse_hours`
+    :type windows: List[Tuple[int, int]]
+    :param minute: Minutes after midnight
+    :type minute: int
+    :returns: True if the time is in a window
+    :rtype: bool
+    """
+    for start, end in windows:
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+
+class TokenBucket:
+    """Token bucket shared by all processes started after its creation.
+
+    Tokens are bytes, refilled at ``rate`` per second up to ``burst``. A
+    consumer takes what it moved even if the bucket runs dry and then sleeps
+    until the debt is paid back, so the long-term rate holds across any
+    number of processes.
+
+    :param rate: Refill rate in bytes per second
+    :type rate: float
+    :param burst: Capacity of the bucket in bytes, one second of rate if None
+    :type burst: Optional[float]
+    :param context: Multiprocessing context of the processes sharing it
+    """
+
+    def __init__(
+        self, rate: float, burst: Optional[float] = None, context=None
+    ) -> None:
+        context = context or multiprocessing.get_context()
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        # Tokens left and time of the last refill
+        self._state = context.Array("d", [self.burst, time.monotonic()])
+
+    def consume(self, n_bytes: int) -> float:
+        """Take tokens for bytes moved, sleeping while the bucket is in debt.
+
+        :param n_bytes: Bytes read or written
+        :type n_bytes: int
+        :returns: Seconds slept
+        :rtype: float
+        """
+        with self._state.get_lock():
+            now = time.monotonic()
+            tokens = self._state[0] + (now - self._state[1]) * self.rate
+            tokens = min(self.burst, tokens) - n_bytes
+            self._state[0] = tokens
+            self._state[1] = now
+        if tokens >= 0:
+            return 0.0
+        delay = -tokens / self.rate
+        time.sleep(delay)
+        return delay
+
+
+class IOThrottle:
+    """Read and write bandwidth limits of a run, optionally in time windows.
+
+    :param read_rate: Read limit in bytes per second, 0 for none
+    :type read_rate: float
+    :param write_rate: Write limit in bytes per second, 0 for none
+    :type write_rate: float
+    :param hours: Time windows in which the limits apply, see
+        :func:`parse_hours`. Empty applies them all day.
+    :type hours: Optional[str]
+    :param context: Multiprocessing context of the worker processes
+    """
+
+    def __init__(
+        self,
+        read_rate: float = 0,
+        write_rate: float = 0,
+        hours: Optional[str] = None,
+        context=None,
+    ) -> None:
+        self.windows = parse_hours(hours)
+        self.hours = hours or ""
+        self._read = TokenBucket(read_rate, context=context) if read_rate else None
+        self._write = TokenBucket(write_rate, context=context) if write_rate else None
+
+    def active(self, now: Optional[float] = None) -> bool:
+        """Return whether the limits apply at a given time.
+
+        :param now: Time as returned by ``time.time()``, now if None
+        :type now: Optional[float]
+        :returns: True inside the time windows, or always without windows
+        :rtype: bool
+        """
+        if not self.windows:
+            return True
+        local = time.localtime(now)
+        return in_windows(self.windows, local.tm_hour * 60 + local.tm_min)
+
+    def read(self, n_bytes: int) -> float:
+        """Account for bytes read, sleeping if over the read limit.
+
+        :param n_bytes: Bytes read
+        :type n_bytes: int
+        :returns: Seconds slept
+        :rtype: float
+        """
+        if self._read is None or n_bytes <= 0 or not self.active():
+            return 0.0
+        return self._read.consume(n_bytes)
+
+    def read_chunk(self) -> int:
+        """Return the size of the chunks reads are paced in.
+
+        :returns: At most the capacity of the read bucket, 0 when reads are
+            not limited now
+        :rtype: int
+        """
+        if self._read is None or not self.active():
+            return 0
+        return int(min(READ_CHUNK, self._read.burst))
+
+    def write(self, n_bytes: int) -> float:
+        """Account for bytes written, sleeping if over the write limit.
+
+        :param n_bytes: Bytes written
+        :type n_bytes: int
+        :returns: Seconds slept
+        :rtype: float
+        """
+        if self._write is None or n_bytes <= 0 or not self.active():
+            return 0.0
+        return self._write.consume(n_bytes)
+
+    def describe(self) -> str:
+        """Format the limits for logging.
+
+        :returns: One-line description
+        :rtype: str
+        """
+        limits = []
+        if self._read is not None:
+            limits.append(f"reads to {self._read.rate / 1024**2:g} MB/s")
+        if self._write is not None:
+            limits.append(f"writes to {self._write.rate / 1024**2:g} MB/s")
+        when = f" between {self.hours}" if self.windows else ""
+        return f"Throttling {' and '.join(limits)}{when}"
+
+
+def install_throttle(throttle: Optional[IOThrottle]) -> None:
+    """Make a throttle apply to the reads and writes of this process.
+
+    :param throttle: The throttle of the run, None to remove it
+    :type throttle: Optional[IOThrottle]
+    """
+    _throttle["throttle"] = throttle
+
+
+def get_throttle() -> Optional[IOThrottle]:
+    """Return the throttle installed in this process, if any.
+
+    :returns: The throttle, or None
+    :rtype: Optional[IOThrottle]
+    """
+    return _throttle.get("throttle")
+
+
+def throttle_read(n_bytes: int) -> None:
+    """Report bytes read to the installed throttle, if any.
+
+    :param n_bytes: Bytes read
+    :type n_bytes: int
+    """
+    throttle = _throttle.get("throttle")
+    if throttle is not None:
+        throttle.read(n_bytes)
+
+
+def throttle_read_file(path: str) -> int:
+    """Read a file through the installed read limit, before it is decoded.
+
+    Readers that decode a whole file in one call would move it at full link
+    speed and only delay the next file. The file is read in chunks instead,
+    each charged before it is read, and the reader then finds it in the
+    page cache.
+
+    :param path: The file
+    :type path: str
+    :returns: Bytes read, 0 when reads are not limited
+    :rtype: int
+    """
+    throttle = _throttle.get("throttle")
+    chunk = throttle.read_chunk() if throttle is not None else 0
+    if not chunk:
+        return 0
+    buffer = memoryview(bytearray(chunk))
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        while total < size:
+            n_bytes = min(chunk, size - total)
+            throttle.read(n_bytes)
+            n_read = f.readinto(buffer[:n_bytes])
+            if not n_read:
+                break
+            total += n_read
+    return total
+
+
+def throttle_write(n_bytes: int) -> None:
+    """Report bytes written to the installed throttle, if any.
+
+    :param n_bytes: Bytes written
+    :type n_bytes: int
+    """
+    throttle = _throttle.get("throttle")
+    if throttle is not None:
+        throttle.write(n_bytes)
@@ -1,8 +1,10 @@
+import queue
+import threading
 import numpy as np
 import tifffile
 import ome_types
-import ctypes
-from typing import Optional, Union, List, Tuple, Any, Dict
+from typing import Optional, Union, List, Tuple, Any, Dict, Iterator
+from .arena import BufferArena
 from .jetraw_tiff import JetrawTiff
 from .libs import JetrawLibraryError
 
@@ -103,11 +105,18 @@ class TiffReader:
             raise RuntimeError("File was already closed.")
         return self._jrtif.pages
 
-    def read(self, pages: Optional[Union[int, range, List[int]]] = None) -> np.ndarray:
+    def read(
+        self,
+        pages: Optional[Union[int, range, List[int]]] = None,
+        arena: Optional[BufferArena] = None,
+    ) -> np.ndarray:
         """Read pages from the TIFF file.
 
         :param pages: Indices of TIFF pages to be read. By default all pages are read
         :type pages: Optional[Union[int, range, List[int]]]
+        :param arena: Arena to borrow the output buffer from, see
+            :class:`~jetraw_tools.arena.BufferArena`. The caller gives it back
+        :type arena: Optional[BufferArena]
         :returns: Image data as numpy array
         :rtype: np.ndarray
         :raises IOError: If file was already closed
@@ -118,15 +127,179 @@ class TiffReader:
         # compute list to be read
         pages_list, num_pages = self._compute_list_to_read(pages)
         # create buffer for range of pages
-        out = np.empty((num_pages, self.height, self.width), dtype=np.uint16)
-
-        c_uint16_p = ctypes.POINTER(ctypes.c_uint16)
-        for i, page_idx in enumerate(pages_list):
-            buf = out[i].ctypes.data_as(c_uint16_p)
-            self._jrtif._read_page_buffer(buf, page_idx)
+        jrtif = self._jrtif
+        shape = (num_pages, jrtif.height, jrtif.width)
+        if arena is None:
+            out = np.empty(shape, dtype=np.uint16)
+        else:
+            out = arena.borrow(shape, np.uint16)
+        jrtif._read_pages(out.ctypes.data, out.strides[0], pages_list)
 
         return np.squeeze(out)
 
+    def read_into(
+        self, out: np.ndarray, pages: Optional[Union[int, range, List[int]]] = None
+    ) -> np.ndarray:
+        """Read pages from the TIFF file directly into a caller-provided array.
+
+        The pages are decoded straight into the memory of ``out``, without
+        intermediate allocations, so it can be a reused buffer, a numpy memmap
+        or an array backed by a ``multiprocessing.shared_memory`` block.
+
+        :param out: Writable uint16 array of shape (num_pages, height, width),
+            or (height, width) when a single page is read. Each frame must be
+            C-contiguous; the frames themselves may be strided
+        :type out: np.ndarray
+        :param pages: Indices of TIFF pages to be read. By default all pages are read
+        :type pages: Optional[Union[int, range, List[int]]]
+        :returns: The ``out`` array
+        :rtype: np.ndarray
+        :raises IOError: If file was already closed
+        :raises TypeError: If out is not a uint16 numpy array
+        :raises ValueError: If out has the wrong shape, is not writable or its
+            frames are not contiguous
+        """
+        if self._jrtif is None:
+            raise IOError("File was already closed.")
+
+        pages_list, num_pages = self._compute_list_to_read(pages)
+        jrtif = self._jrtif
+        frame_shape = (jrtif.height, jrtif.width)
+
+        if not isinstance(out, np.ndarray):
+            raise TypeError(f"out must be a numpy array, not {type(out).__name__}.")
+        if out.dtype != np.uint16:
+            raise TypeError(f"out has dtype {out.dtype}, expected uint16.")
+        if out.shape == (num_pages,) + frame_shape:
+            frame_stride = out.strides[0]
+        elif num_pages == 1 and out.shape == frame_shape:
+            frame_stride = 0
+        else:
+            raise ValueError(
+                f"out has shape {out.shape}, expected "
+                f"{(num_pages,) + frame_shape} for {num_pages} page(s)."
+            )
+        if not out.flags["WRITEABLE"]:
+            raise ValueError("out must be writable.")
+        row_stride, column_stride = out.strides[-2:]
+        if (frame_shape[1] > 1 and column_stride != out.itemsize) or (
+            frame_shape[0] > 1 and row_stride != frame_shape[1] * out.itemsize
+        ):
+            raise ValueError("Each frame of out must be C-contiguous.")
+
+        jrtif._read_pages(out.ctypes.data, frame_stride, pages_list)
+        return out
+
+    def iter_pages(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+        step: int = 1,
+        prefetch: int = 2,
+    ) -> Iterator[np.ndarray]:
+        """Iterate over pages, decoding ahead on a background thread.
+
+        Pages ``range(start, stop, step)`` (with slice semantics, so negative
+        indices count from the end) are decoded by a background thread into a
+        ring of ``prefetch + 1`` reusable buffers, so computation on one frame
+        overlaps with the decoding of the next ones.
+
+        The yielded arrays are the ring buffers themselves: a frame is only
+        valid until the next one is requested, copy it to keep it. The reader
+        must not be used otherwise while the iterator is active.
+
+        :param start: First page index. Defaults to 0
+        :type start: int
+        :param stop: Page index to stop before. By default iterate to the last page
+        :type stop: Optional[int]
+        :param step: Step between page indices. Defaults to 1
+        :type step: int
+        :param prefetch: Number of pages decoded ahead. 0 decodes synchronously
+        :type prefetch: int
+        :returns: Iterator over (height, width) uint16 frames
+        :rtype: Iterator[np.ndarray]
+        :raises IOError: If file was already closed
+        :raises ValueError: If prefetch is negative or step is zero
+        """
+        if self._jrtif is None:
+            raise IOError("File was already closed.")
+        if prefetch < 0:
+            raise ValueError(f"prefetch must be >= 0, got {prefetch}.")
+        if step == 0:
+            raise ValueError("step must not be zero.")
+
+        jrtif = self._jrtif
+        pages_list = range(*slice(start, stop, step).indices(jrtif.pages))
+        frame_shape = (jrtif.height, jrtif.width)
+        if prefetch == 0:
+            return self._iter_pages_sync(jrtif, pages_list, frame_shape)
+        return self._iter_pages_prefetch(jrtif, pages_list, frame_shape, prefetch)
+
+    @staticmethod
+    def _iter_pages_sync(
+        jrtif: JetrawTiff, pages_list: range, frame_shape: Tuple[int, int]
+    ) -> Iterator[np.ndarray]:
+        """Decode pages one by one into a single reused buffer."""
+        frame = np.empty(frame_shape, dtype=np.uint16)
+        address = frame.ctypes.data
+        for page_idx in pages_list:
+            jrtif._read_page_buffer(address, page_idx)
+            yield frame
+
+    @staticmethod
+    def _iter_pages_prefetch(
+        jrtif: JetrawTiff,
+        pages_list: range,
+        frame_shape: Tuple[int, int],
+        prefetch: int,
+    ) -> Iterator[np.ndarray]:
+        """Decode pages on a background thread into a ring of buffers.
+
+        Buffers circulate between a free queue (to be filled by the decoder)
+        and a ready queue (to be consumed). The buffer last handed out is
+        returned to the free queue when the next frame is requested.
+        """
+        free: queue.Queue = queue.Queue()
+        ready: queue.Queue = queue.Queue()
+        for _ in range(prefetch + 1):
+            free.put(np.empty(frame_shape, dtype=np.uint16))
+        stopped = threading.Event()
+        done = object()
+
+        def decode() -> None:
+            try:
+                for page_idx in pages_list:
+                    frame = free.get()
+                    if stopped.is_set():
+                        return
+                    jrtif._read_page_buffer(frame.ctypes.data, page_idx)
+                    ready.put(frame)
+                ready.put(done)
+            except BaseException as e:
+                ready.put(e)
+
+        decoder = threading.Thread(target=decode, name="jetraw-prefetch", daemon=True)
+        decoder.start()
+        held = None
+        try:
+            while True:
+                if held is not None:
+                    free.put(held)
+                    held = None
+                item = ready.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                held = item
+                yield held
+        finally:
+            # Wake the decoder if it waits for a free buffer and wait for it,
+            # so the handle is not used after the iterator is closed
+            stopped.set()
+            free.put(np.empty(0, dtype=np.uint16))
+            decoder.join()
+
     def _compute_list_to_read(
         self, pages: Optional[Union[int, range, List[int]]]
     ) -> Tuple[List[int], int]:
@@ -157,22 +330,32 @@ class TiffReader:
 
 
 def imread(
-    input_tiff_filename: str, pages: Optional[Union[int, range, List[int]]] = None
+    input_tiff_filename: str,
+    pages: Optional[Union[int, range, List[int]]] = None,
+    out: Optional[np.ndarray] = None,
+    arena: Optional[BufferArena] = None,
 ) -> np.ndarray:
     """Read JetRaw compressed TIFF file from disk and store in numpy array.
 
-    Refer to the TiffReader class and its read function for more information.
+    Refer to the TiffReader class and its read and read_into functions for
+    more information.
 
     :param input_tiff_filename: File name of input TIFF file to be read from disk
     :type input_tiff_filename: str
     :param pages: Indices of TIFF pages to be read. By default all pages are read
     :type pages: Optional[Union[int, range, List[int]]]
-    :returns: Image data as numpy array
+    :param out: Array to decode the pages into instead of allocating a new one
+    :type out: Optional[np.ndarray]
+    :param arena: Arena to borrow the output buffer from when ``out`` is None
+    :type arena: Optional[BufferArena]
+    :returns: Image data as numpy array, ``out`` if it was given
     :rtype: np.ndarray
     """
     # read TIFF image pages and return numpy array
     with TiffReader(input_tiff_filename) as jetraw_reader:
-        image = jetraw_reader.read(pages)
+        if out is not None:
+            return jetraw_reader.read_into(out, pages)
+        image = jetraw_reader.read(pages, arena=arena)
         return image
 
 
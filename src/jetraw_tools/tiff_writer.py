@@ -1,4 +1,5 @@
 import json
+import os
 from typing import Union, Optional, Any, Tuple
 
 import numpy as np
@@ -7,7 +8,8 @@ import ome_types
 
 from .jetraw_tiff import JetrawTiff
 from .logger import logger
-from .utils import convert_to_ascii, flatten_dict, serialise
+from .throttle import get_throttle, throttle_write
+from .utils import metadata_to_json
 
 
 class TiffWriter_5D:
@@ -48,6 +50,8 @@ class TiffWriter_5D:
         self.fpath = filepath
         self.image_shape = None
         self._jrtif = None
+        # Bytes of the file already reported to the throttle
+        self._written = 0
 
     def __del__(self) -> None:
         """Destructor that ensures the file is closed.
@@ -84,8 +88,20 @@ class TiffWriter_5D:
             # Handle error when the upper with block is closed
             except RuntimeError as e:
                 logger.debug(f"RuntimeError during file close (may be expected): {e}")
+            self._throttle_written()
         self._jrtif = None
 
+    def _throttle_written(self) -> None:
+        """Report the bytes the file grew by to the throttle of the run."""
+        if get_throttle() is None:
+            return
+        try:
+            size = os.path.getsize(self.fpath)
+        except OSError:
+            return
+        throttle_write(size - self._written)
+        self._written = size
+
     def write(self, image_buffer: np.ndarray) -> None:
         """Write image buffer to .p.tiff file.
 
@@ -128,6 +144,7 @@ class TiffWriter_5D:
                     self._jrtif.append_page(
                         image_stack[frame, slice, channel]
                     )  # Adjust indexing
+                    self._throttle_written()
 
     def _check_and_adapt_input_image_5D(self, image: np.ndarray) -> np.ndarray:
         """Ensures consistent dimensions for iteration, adding dummy dimensions if needed.
@@ -232,39 +249,40 @@ def metadata_writer(
             ".ome.p.tiff" if isinstance(metadata, ome_types.OME) else ".p.tiff", ".json"
         )
 
-        try:
-            metadata_dump = (
-                json.loads(metadata.json())
-                if isinstance(metadata, ome_types.OME)
-                else metadata
-            )
-        except Exception:
-            metadata_dump = convert_to_ascii(
-                metadata.dict() if isinstance(metadata, ome_types.OME) else metadata
-            )
+        strip_non_ascii = False
+        if isinstance(metadata, ome_types.OME):
+            try:
+                metadata_dump = json.loads(metadata.json())
+            except Exception:
+                metadata_dump = metadata.dict()
+                strip_non_ascii = True
+        else:
+            metadata_dump = metadata
 
+        metadata_str = metadata_to_json(
+            metadata_dump,
+            strip_non_ascii=strip_non_ascii,
+            ensure_ascii=False,
+            indent=3,
+        )
         with open(json_filename, "w", encoding="utf-8") as f:
-            json.dump(metadata_dump, f, indent=3, ensure_ascii=False, default=serialise)
+            f.write(metadata_str)
+        throttle_write(len(metadata_str))
 
     if ome_bool:
         if isinstance(metadata, ome_types.OME):
-            tifffile.tiffcomment(
-                output_tiff_filename, metadata.to_xml().encode("ascii", "ignore")
-            )
+            comment = metadata.to_xml().encode("ascii", "ignore")
         else:
-            metadata = convert_to_ascii(metadata)
-            metadata_str = json.dumps(serialise(metadata))
-
-            tifffile.tiffcomment(output_tiff_filename, metadata_str)
+            comment = metadata_to_json(metadata)
+        tifffile.tiffcomment(output_tiff_filename, comment)
+        throttle_write(len(comment))
 
     if imagej:
         if isinstance(metadata, ome_types.OME):
-            metadata = convert_to_ascii(metadata.dict())
-        else:
-            metadata = convert_to_ascii(metadata)
+            metadata = metadata.dict()
 
-        metadata = flatten_dict(metadata)
-        metadata_str = json.dumps(serialise(metadata))
+        metadata_str = metadata_to_json(metadata, flatten=True)
         tifffile.tiffcomment(output_tiff_filename, metadata_str)
+        throttle_write(len(metadata_str))
 
     return True
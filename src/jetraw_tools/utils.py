@@ -1,24 +1,36 @@
 import os
+import json
+from typing import Optional, Union
 import numpy as np
 import tifffile
 import locale
-import multiprocessing
 from ome_types.model import MapAnnotation, Map
 from ome_types.model.map import M
 from .dpcore import prepare_image
+from .resources import detect_resources
 
 
-def cores_validation(ncores: int) -> tuple[str, int, str]:
+def cores_validation(
+    ncores: int, resources: Optional[dict] = None
+) -> tuple[str, int, str]:
     """
     Validates the number of cores requested.
 
+    The available cores honour the CPU affinity mask and the cgroup CPU quota,
+    so containers and batch jobs are not oversubscribed with the host count.
+
     :param ncores: The number of cores requested by the user.
     :type ncores: int
+    :param resources: Detected resources, as returned by
+        :func:`jetraw_tools.resources.detect_resources`. Detected if None.
+    :type resources: dict, optional
     :return: A tuple containing a status ('OK', 'WARN', 'ERROR'),
              the number of cores to use, and a message.
     :rtype: tuple[str, int, str]
     """
-    logical_cores = multiprocessing.cpu_count()
+    if resources is None:
+        resources = detect_resources()
+    logical_cores = resources["cpus"]
     # Set a threshold for a fatal error (e.g., more than double the logical cores)
     error_threshold = logical_cores * 2
 
@@ -159,6 +171,238 @@ def serialise(data: dict) -> str:
         return str(data)
 
 
+_encode_json_str_ascii = json.encoder.encode_basestring_ascii
+_encode_json_str = json.encoder.encode_basestring
+_JSON_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+
+def _json_float(value: float) -> str:
+    """Format a float the way :func:`json.dumps` does."""
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "Infinity"
+    if value == -float("inf"):
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _json_default(value) -> Union[list, str]:
+    """Fallback for objects the JSON encoder does not support natively."""
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def _json_scalar(value, encode_str) -> str:
+    """Encode a scalar (or empty container) metadata value as JSON text."""
+    if isinstance(value, str):
+        return encode_str(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _json_float(value)
+    if isinstance(value, dict):
+        return "{}"
+    if isinstance(value, _JSON_CONTAINERS):
+        return "[]"
+    return encode_str(str(value))
+
+
+def _json_key(key, encode_str) -> str:
+    """Encode a mapping key following the :func:`json.dumps` key rules."""
+    if isinstance(key, str):
+        return encode_str(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, int):
+        return '"' + int.__repr__(key) + '"'
+    if isinstance(key, float):
+        return '"' + _json_float(key) + '"'
+    return encode_str(str(key))
+
+
+def _flatten_dicts(data: dict) -> dict:
+    """Merge nested dictionaries into the top level, as :func:`flatten_dict`.
+
+    Iterative, and only the dictionary chain is walked: other values are
+    referenced, not copied.
+    """
+    result = {}
+    stack = [iter(data.items())]
+    path = [id(data)]
+    while stack:
+        for key, value in stack[-1]:
+            if isinstance(value, dict):
+                if id(value) in path:
+                    raise ValueError("Circular reference detected")
+                path.append(id(value))
+                stack.append(iter(value.items()))
+                break
+            result[key] = value
+        else:
+            stack.pop()
+            path.pop()
+    return result
+
+
+def _emit_json(
+    data, strip_non_ascii: bool, ensure_ascii: bool, indent: Optional[int]
+) -> str:
+    """Sanitise and serialise data to JSON text in one iterative walk.
+
+    When ``strip_non_ascii`` is set, strings held by the chain of
+    dictionaries from the root lose their non-ASCII characters as they are
+    written, as with :func:`convert_to_ascii`, which stops at lists. The text
+    is the one :func:`json.dumps` would produce for the sanitised data.
+
+    Subtrees with nothing to sanitise, e.g. below a list, are handed whole to
+    the C json encoder, unless they are nested too deeply for it.
+    """
+    encode_str = _encode_json_str_ascii if ensure_ascii else _encode_json_str
+    if not isinstance(data, _JSON_CONTAINERS) or not data:
+        if strip_non_ascii and isinstance(data, str):
+            data = data.encode("ascii", "ignore").decode()
+        return _json_scalar(data, encode_str)
+    encoder = json.JSONEncoder(
+        ensure_ascii=ensure_ascii, indent=indent, default=_json_default
+    )
+    if not (strip_non_ascii and isinstance(data, dict)):
+        try:
+            return encoder.encode(data)
+        except RecursionError:
+            encoder = None
+
+    if indent is None:
+        item_sep = ", "
+        indent_str = None
+    else:
+        item_sep = ","
+        indent_str = " " * indent if isinstance(indent, int) else indent
+
+    parts = []
+    append = parts.append
+    # Each frame is (items iterator, is_mapping, depth, container id, strip)
+    stack = []
+    markers = set()
+    pending = data
+    strip = strip_non_ascii
+    while True:
+        if pending is not None:
+            if id(pending) in markers:
+                raise ValueError("Circular reference detected")
+            markers.add(id(pending))
+            is_mapping = isinstance(pending, dict)
+            # Only dictionaries nested in dictionaries are stripped
+            strip = strip and is_mapping
+            append("{" if is_mapping else "[")
+            items = iter(pending.items()) if is_mapping else iter(pending)
+            frame = (items, is_mapping, len(stack) + 1, id(pending), strip)
+            stack.append(frame)
+            pending = None
+            first = True
+        else:
+            frame = stack[-1]
+            items, is_mapping, strip = frame[0], frame[1], frame[4]
+            first = False
+
+        if indent_str is None:
+            first_prefix = ""
+        else:
+            first_prefix = "\n" + indent_str * frame[2]
+        prefix = item_sep + first_prefix
+
+        for item in items:
+            append(first_prefix if first else prefix)
+            first = False
+            if is_mapping:
+                key, value = item
+                append(_json_key(key, encode_str) + ": ")
+            else:
+                value = item
+            if isinstance(value, str):
+                if strip:
+                    value = value.encode("ascii", "ignore").decode()
+                append(encode_str(value))
+            elif isinstance(value, _JSON_CONTAINERS) and value:
+                if encoder is not None and not (strip and isinstance(value, dict)):
+                    try:
+                        text = encoder.encode(value)
+                    except RecursionError:
+                        # Walked here instead, as are the subtrees that follow
+                        encoder = None
+                    else:
+                        if indent_str is not None:
+                            text = text.replace("\n", first_prefix)
+                        append(text)
+                        continue
+                pending = value
+                break
+            else:
+                append(_json_scalar(value, encode_str))
+        else:
+            # Container exhausted: close it and resume its parent
+            stack.pop()
+            markers.discard(frame[3])
+            if indent_str is not None:
+                append("\n" + indent_str * (frame[2] - 1))
+            append("}" if is_mapping else "]")
+            if not stack:
+                break
+
+    return "".join(parts)
+
+
+def metadata_to_json(
+    data,
+    flatten: bool = False,
+    strip_non_ascii: bool = True,
+    ensure_ascii: bool = True,
+    indent: Optional[int] = None,
+) -> str:
+    """Sanitise, optionally flatten and serialise metadata to JSON.
+
+    Produces the same text as the chain
+    ``json.dumps(serialise(flatten_dict(convert_to_ascii(data))))``, in a
+    single iterative walk that sanitises the values as it writes them, so
+    deep trees cannot hit the recursion limit and nothing is copied. With
+    ``flatten``, the dictionary chain is merged first: a key met again deeper
+    in the tree keeps its first position but takes its last value, which is
+    only known once the whole chain was seen.
+
+    As with ``convert_to_ascii``, non-ASCII characters are only dropped from
+    strings held directly by dictionaries; strings inside lists or tuples are
+    kept and escaped according to ``ensure_ascii``. Sets and frozensets are
+    written as JSON arrays and any other unsupported object as its string
+    representation.
+
+    :param data: The metadata to serialise, usually a (nested) dictionary.
+    :param flatten: Merge nested dictionaries into the top level, as
+        :func:`flatten_dict` does. Defaults to False.
+    :param strip_non_ascii: Drop non-ASCII characters from string values held
+        by dictionaries. Defaults to True.
+    :param ensure_ascii: Escape non-ASCII characters, as in :func:`json.dumps`.
+        Defaults to True.
+    :param indent: Indentation level, as in :func:`json.dumps`. Defaults to None
+        (compact single-line output).
+    :return: The JSON text.
+    :raises ValueError: If the metadata contains a circular reference.
+    """
+    if flatten and isinstance(data, dict):
+        data = _flatten_dicts(data)
+    return _emit_json(data, strip_non_ascii, ensure_ascii, indent)
+
+
 def dict2ome(metadata: dict) -> MapAnnotation:
     """Converts metadata dictionary to OME MapAnnotation"""
 
@@ -213,6 +457,33 @@ def inspect_metadata(image_path: str, verbose: bool = False) -> dict:
     return metadata
 
 
+def as_compressible(image: np.ndarray, arena=None) -> np.ndarray:
+    """Return the image as a C-contiguous uint16 array, copying only if needed.
+
+    A C-contiguous uint16 image is returned as is. Other unsigned images of at
+    most 16 bits are converted and made contiguous in a single copy.
+
+    :param image: Image to compress
+    :type image: np.ndarray
+    :param arena: Arena to borrow the converted copy from, see
+        :class:`~jetraw_tools.arena.BufferArena`. The caller gives it back
+    :type arena: BufferArena, optional
+    :return: The image, or its uint16 copy
+    :rtype: np.ndarray
+    :raises TypeError: If the image is not of an unsigned type of 8 or 16 bits
+    """
+    if not np.issubdtype(image.dtype, np.unsignedinteger) or image.dtype.itemsize > 2:
+        raise TypeError(
+            f"Input data {image.dtype} is not supported. JetRaw compresses "
+            f"unsigned integer data of at most 16 bits (uint8, uint16)."
+        )
+    if arena is None or (image.dtype == np.uint16 and image.flags["C_CONTIGUOUS"]):
+        return np.ascontiguousarray(image, dtype=np.uint16)
+    converted = arena.borrow(image.shape, np.uint16)
+    np.copyto(converted, image, casting="unsafe")
+    return converted
+
+
 def prepare_images(
     image_stack, depth=0, identifier=False, First_call=True, verbose=False
 ):
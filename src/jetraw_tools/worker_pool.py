@@ -0,0 +1,522 @@
+"""Process pool whose workers can be retired and replaced during a run.
+
+Unlike ``multiprocessing.Pool``, every worker has its own pipe and is handed
+one chunk of tasks at a time, so the parent always knows which tasks each
+worker holds. That allows:
+
+* recycling: a worker reports its resident memory after every task and
+  retires between two files once its :class:`RecyclePolicy` says so, e.g.
+  after many tasks or when caches and fragmentation made it grow too large;
+* crash recovery: a worker that dies is replaced and only the task it was
+  running is reported as lost, instead of the whole batch hanging;
+* timeouts: a worker stuck on a task for longer than its
+  :class:`TimeoutPolicy` allows, e.g. on a corrupt file or a stalled network
+  share, is killed and replaced, and the task is retried or reported as lost;
+* adaptive concurrency: with a :class:`~jetraw_tools.autotune.ConcurrencyTuner`
+  the number of busy workers follows the count that maximises throughput.
+
+Tasks a worker did not get to run are queued again for the other workers.
+"""
+
+import collections
+import statistics
+import time
+from multiprocessing.connection import wait
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .autotune import ConcurrencyTuner
+from .logger import logger
+from .resources import current_rss, peak_rss
+
+# Seconds between checks of the workers when none of them reports
+POLL_INTERVAL = 1.0
+
+# Seconds a worker is given to exit after the end of the run
+SHUTDOWN_TIMEOUT = 10.0
+
+# Tasks whose duration is kept to estimate the median processing rate
+RATE_WINDOW = 256
+
+# Tasks that must complete before stragglers are detected
+STRAGGLER_MIN_SAMPLES = 5
+
+# Lower bound of the straggler limit, so small files are not killed over jitter
+STRAGGLER_MIN_SECONDS = 60.0
+
+
+class RecyclePolicy(NamedTuple):
+    """Limits after which a worker is replaced by a fresh process.
+
+    A limit of 0 is disabled. The limits are checked between two tasks.
+
+    :param max_tasks: Number of tasks after which a worker is replaced
+    :param max_bytes: Input bytes after which a worker is replaced
+    :param max_rss: Resident memory in bytes above which a worker is replaced
+    """
+
+    max_tasks: int = 0
+    max_bytes: int = 0
+    max_rss: int = 0
+
+    def retire_reason(self, tasks: int, n_bytes: int, rss: Optional[int]) -> str:
+        """Return why a worker must retire, or "" if it can go on.
+
+        :param tasks: Tasks completed by the worker
+        :type tasks: int
+        :param n_bytes: Input bytes processed by the worker
+        :type n_bytes: int
+        :param rss: Current resident memory of the worker in bytes, if known
+        :type rss: Optional[int]
+        :returns: The reason, or an empty string
+        :rtype: str
+        """
+        if self.max_tasks and tasks >= self.max_tasks:
+            return f"{tasks} tasks done"
+        if self.max_bytes and n_bytes >= self.max_bytes:
+            return f"{n_bytes / 1024**3:.1f} GB processed"
+        if self.max_rss and rss is not None and rss >= self.max_rss:
+            return f"RSS {rss / 1024**3:.2f} GB"
+        return ""
+
+
+class TimeoutPolicy(NamedTuple):
+    """Time a task may run before its worker is killed and replaced.
+
+    A fixed limit of ``seconds`` plus ``seconds_per_gb`` per GB of input
+    applies when either is set. With ``straggler_factor``, a task is also
+    stopped once it runs that many times longer than the median seconds per
+    byte of the completed tasks would predict, but never before
+    STRAGGLER_MIN_SECONDS. The smallest applicable limit wins. A stopped task
+    is queued again ``retries`` times before it is reported as lost.
+
+    :param seconds: Fixed part of the limit, 0 disables it
+    :param seconds_per_gb: Part of the limit proportional to the input size
+    :param straggler_factor: Multiple of the median duration after which a
+        task is a straggler, 0 disables straggler detection
+    :param retries: Times a stopped task is queued again
+    """
+
+    seconds: float = 0.0
+    seconds_per_gb: float = 0.0
+    straggler_factor: float = 0.0
+    retries: int = 1
+
+    def limit(self, size: int, seconds_per_byte: Optional[float]) -> Optional[float]:
+        """Return how long a task may run, or None if it is not limited.
+
+        :param size: Input size of the task in bytes
+        :type size: int
+        :param seconds_per_byte: Median processing time of the completed
+            tasks, None while too few tasks completed
+        :type seconds_per_byte: Optional[float]
+        :returns: The limit in seconds, or None
+        :rtype: Optional[float]
+        """
+        limits = []
+        if self.seconds or self.seconds_per_gb:
+            limits.append(self.seconds + self.seconds_per_gb * size / 1024**3)
+        if self.straggler_factor and seconds_per_byte is not None:
+            expected = self.straggler_factor * seconds_per_byte * size
+            limits.append(max(STRAGGLER_MIN_SECONDS, expected))
+        return min(limits) if limits else None
+
+
+def _worker_loop(
+    conn,
+    func: Callable,
+    initializer: Optional[Callable],
+    initargs: tuple,
+    policy: RecyclePolicy,
+) -> None:
+    """Run chunks of tasks received on a pipe until told to stop or retire.
+
+    Sends None once initialised, then after every task (task id, result,
+    current RSS if the policy limits it, peak RSS, retire reason).
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    tasks = n_bytes = 0
+    try:
+        conn.send(None)
+        while True:
+            chunk = conn.recv()
+            if chunk is None:
+                return
+            for task_id, task, size in chunk:
+                result = func(task)
+                tasks += 1
+                n_bytes += size
+                # Reading the current RSS costs a /proc read, the peak does not
+                rss = current_rss() if policy.max_rss else None
+                reason = policy.retire_reason(tasks, n_bytes, rss)
+                conn.send((task_id, result, rss, peak_rss(), reason))
+                if reason:
+                    return
+    except (EOFError, KeyboardInterrupt):
+        # The parent went away or the run was interrupted
+        pass
+    finally:
+        conn.close()
+
+
+class _Worker:
+    """Parent-side record of one worker process."""
+
+    def __init__(self, process, conn) -> None:
+        self.process = process
+        self.conn = conn
+        # Tasks handed to the worker and not reported yet, in order
+        self.tasks: Deque[Tuple[int, Any, int]] = collections.deque()
+        # Whether the initializer ran, timeouts only apply afterwards
+        self.ready = False
+        # Whether the worker was asked to exit to lower the concurrency
+        self.stopping = False
+        # When the worker started the first task of self.tasks
+        self.started = 0.0
+        self.done = 0
+        self.n_bytes = 0
+        self.peak_rss: Optional[int] = None
+
+    def report(self, status: str) -> dict:
+        return {
+            "pid": self.process.pid,
+            "tasks": self.done,
+            "bytes": self.n_bytes,
+            "peak_rss": self.peak_rss,
+            "exit": status,
+        }
+
+
+class WorkerPool:
+    """Pool of worker processes with recycling and crash recovery.
+
+    :param context: Multiprocessing context used to start the workers
+    :param n_workers: Number of worker processes
+    :type n_workers: int
+    :param func: Function applied to every task, run in the workers
+    :type func: Callable
+    :param initializer: Function run once in every worker before its tasks
+    :type initializer: Optional[Callable]
+    :param initargs: Arguments of the initializer
+    :type initargs: tuple
+    :param policy: When workers are replaced by fresh processes
+    :type policy: RecyclePolicy
+    :param timeout: When a worker stuck on a task is killed
+    :type timeout: TimeoutPolicy
+    :param tuner: Adjusts the number of busy workers, at most n_workers,
+        from the observed throughput. None keeps n_workers busy.
+    :type tuner: Optional[ConcurrencyTuner]
+    :param lost_result: Result reported for a task whose worker died or
+        that timed out too often
+    :param chunksize: Number of tasks handed to a worker at a time
+    :type chunksize: int
+    """
+
+    def __init__(
+        self,
+        context,
+        n_workers: int,
+        func: Callable,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+        policy: RecyclePolicy = RecyclePolicy(),
+        timeout: TimeoutPolicy = TimeoutPolicy(),
+        tuner: Optional[ConcurrencyTuner] = None,
+        lost_result: Any = None,
+        chunksize: int = 1,
+    ) -> None:
+        self.context = context
+        self.n_workers = max(1, n_workers)
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.policy = policy
+        self.timeout = timeout
+        self.tuner = tuner
+        # Number of workers that may hold tasks
+        self.active = self.n_workers
+        if tuner is not None:
+            self.active = min(tuner.workers, self.n_workers)
+        self.lost_result = lost_result
+        self.chunksize = max(1, chunksize)
+        # One report per worker that exited, see _Worker.report
+        self.reports: List[dict] = []
+        # (task, reason) of every task reported with lost_result
+        self.lost: List[Tuple[Any, str]] = []
+        # Times each task id was stopped by a timeout
+        self._attempts: Dict[int, int] = {}
+        # Seconds per input byte of the last completed tasks
+        self._rates: Deque[float] = collections.deque(maxlen=RATE_WINDOW)
+        self._workers: List[_Worker] = []
+        self._pending: Deque[Tuple[int, Any, int]] = collections.deque()
+
+    def _start_worker(self) -> None:
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_loop,
+            args=(child_conn, self.func, self.initializer, self.initargs, self.policy),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._workers.append(_Worker(process, parent_conn))
+
+    def start(self, n_tasks: Optional[int] = None) -> None:
+        """Start the workers now rather than with the first task.
+
+        :param n_tasks: Number of tasks of the run, to not start more workers
+            than tasks
+        :type n_tasks: Optional[int]
+        """
+        n_workers = self.active if n_tasks is None else min(self.active, n_tasks)
+        while len(self._workers) < n_workers:
+            self._start_worker()
+
+    def _dispatch(self) -> None:
+        """Hand a chunk of pending tasks to idle workers, up to the active count."""
+        busy = sum(1 for worker in self._workers if worker.tasks)
+        for worker in self._workers:
+            if busy >= self.active:
+                return
+            if worker.tasks or worker.stopping or not self._pending:
+                continue
+            chunk = [
+                self._pending.popleft()
+                for _ in range(min(self.chunksize, len(self._pending)))
+            ]
+            try:
+                worker.conn.send(chunk)
+            except (OSError, ValueError):
+                # The worker died, it is reaped with its sentinel
+                self._pending.extendleft(reversed(chunk))
+                continue
+            worker.tasks.extend(chunk)
+            worker.started = time.monotonic()
+            busy += 1
+
+    def _remove(self, worker: _Worker, status: str) -> None:
+        """Forget a worker that exited and queue its unfinished tasks again."""
+        self._workers.remove(worker)
+        self._pending.extendleft(reversed(worker.tasks))
+        worker.tasks.clear()
+        worker.conn.close()
+        self.reports.append(worker.report(status))
+
+    def _replace(self) -> None:
+        """Start workers until the pool is full or has enough for the tasks left."""
+        busy = sum(1 for worker in self._workers if worker.tasks)
+        running = sum(1 for worker in self._workers if not worker.stopping)
+        while running < min(self.active, len(self._pending) + busy):
+            self._start_worker()
+            running += 1
+
+    def _shrink(self) -> None:
+        """Ask idle workers beyond the active count to exit."""
+        extra = sum(1 for worker in self._workers if not worker.stopping)
+        extra -= self.active
+        for worker in self._workers:
+            if extra <= 0:
+                return
+            if worker.tasks or worker.stopping:
+                continue
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.stopping = True
+            extra -= 1
+
+    def _tune(self) -> None:
+        """Let the tuner change the number of busy workers."""
+        if self.tuner is None:
+            return
+        workers = self.tuner.update(time.monotonic())
+        if workers is not None:
+            self.active = max(1, min(workers, self.n_workers))
+
+    def _receive(self, worker: _Worker) -> Iterator[Any]:
+        """Yield the results a worker sent, retiring it if it asked to."""
+        while worker in self._workers and worker.conn.poll():
+            try:
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                return
+            now = time.monotonic()
+            if message is None:
+                worker.ready = True
+                worker.started = now
+                continue
+            task_id, result, rss, peak, reason = message
+            _, _, size = worker.tasks.popleft()
+            if size:
+                self._rates.append((now - worker.started) / size)
+            if self.tuner is not None:
+                self.tuner.observe(size)
+            worker.started = now
+            worker.done += 1
+            worker.n_bytes += size
+            known = [n for n in (worker.peak_rss, rss, peak) if n is not None]
+            if known:
+                worker.peak_rss = max(known)
+            if reason:
+                logger.debug(f"Recycling worker {worker.process.pid}: {reason}")
+                worker.process.join()
+                self._remove(worker, f"recycled ({reason})")
+            yield result
+
+    def _reap(self, worker: _Worker) -> Iterator[Any]:
+        """Handle a worker process that exited on its own."""
+        yield from self._receive(worker)
+        if worker not in self._workers:
+            return
+        worker.process.join()
+        if worker.tasks:
+            _, task, _ = worker.tasks.popleft()
+            status = f"died (exit code {worker.process.exitcode})"
+            logger.error(
+                f"Worker {worker.process.pid} {status} while processing {task!r}"
+            )
+            self._remove(worker, status)
+            self.lost.append((task, f"worker {status}"))
+            yield self.lost_result
+        elif worker.stopping:
+            self._remove(worker, "stopped (fewer workers)")
+        else:
+            self._remove(worker, f"exited (exit code {worker.process.exitcode})")
+
+    def _seconds_per_byte(self) -> Optional[float]:
+        """Return the median processing time of the recent tasks, if known."""
+        if len(self._rates) < STRAGGLER_MIN_SAMPLES:
+            return None
+        return statistics.median(self._rates)
+
+    def _expire(self) -> Iterator[Any]:
+        """Kill the workers stuck on a task beyond its time limit."""
+        now = time.monotonic()
+        seconds_per_byte = self._seconds_per_byte()
+        for worker in list(self._workers):
+            # A result that already arrived is handled by _receive
+            if not worker.ready or not worker.tasks or worker.conn.poll():
+                continue
+            task_id, task, size = worker.tasks[0]
+            limit = self.timeout.limit(size, seconds_per_byte)
+            elapsed = now - worker.started
+            if limit is None or elapsed <= limit:
+                continue
+            worker.process.kill()
+            worker.process.join()
+            worker.tasks.popleft()
+            self._remove(worker, f"killed (task ran over {limit:.0f} s)")
+            attempts = self._attempts.get(task_id, 0) + 1
+            self._attempts[task_id] = attempts
+            if attempts <= self.timeout.retries:
+                logger.warning(
+                    f"Stopped {task!r} after {elapsed:.0f} s "
+                    f"(limit {limit:.0f} s), queuing it again"
+                )
+                self._pending.append((task_id, task, size))
+            else:
+                logger.error(
+                    f"Stopped {task!r} after {elapsed:.0f} s "
+                    f"(limit {limit:.0f} s), giving up after {attempts} attempts"
+                )
+                reason = "timed out" if attempts == 1 else f"timed out {attempts} times"
+                self.lost.append((task, reason))
+                yield self.lost_result
+
+    def imap_unordered(self, tasks: List[Any], sizes: Optional[List[int]] = None):
+        """Run the tasks, yielding their results as they complete.
+
+        :param tasks: The tasks, passed one by one to ``func``
+        :type tasks: List[Any]
+        :param sizes: Input size in bytes of each task, used by the policy
+        :type sizes: Optional[List[int]]
+        :returns: An iterator over the results, in completion order
+        """
+        if sizes is None:
+            sizes = [0] * len(tasks)
+        self._pending.extend(zip(range(len(tasks)), tasks, sizes))
+        remaining = len(tasks)
+        self._tune()
+        try:
+            while remaining:
+                self._replace()
+                self._shrink()
+                self._dispatch()
+                by_handle = {}
+                for worker in self._workers:
+                    by_handle[worker.conn] = worker
+                    by_handle[worker.process.sentinel] = worker
+                for handle in wait(list(by_handle), timeout=POLL_INTERVAL):
+                    worker = by_handle[handle]
+                    if worker not in self._workers:
+                        continue
+                    if handle is worker.conn:
+                        results = self._receive(worker)
+                    else:
+                        results = self._reap(worker)
+                    for result in results:
+                        remaining -= 1
+                        yield result
+                for result in self._expire():
+                    remaining -= 1
+                    yield result
+                self._tune()
+        except BaseException:
+            self.terminate()
+            raise
+        self.close()
+
+    def close(self) -> None:
+        """Ask the idle workers to exit and wait for them."""
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for worker in list(self._workers):
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            self._remove(worker, "finished")
+
+    def terminate(self) -> None:
+        """Stop all workers immediately."""
+        for worker in list(self._workers):
+            worker.process.terminate()
+        for worker in list(self._workers):
+            worker.process.join()
+            self._remove(worker, "terminated")
+        self._pending.clear()
+
+
+def describe_reports(reports: List[dict]) -> List[str]:
+    """Format the worker reports of a pool for the run summary.
+
+    :param reports: Reports as collected in :attr:`WorkerPool.reports`
+    :type reports: List[dict]
+    :returns: One line per worker
+    :rtype: List[str]
+    """
+    lines = []
+    for report in reports:
+        peak = report["peak_rss"]
+        peak_text = f"{peak / 1024**2:.0f} MB" if peak else "unknown"
+        lines.append(
+            f"Worker {report['pid']}: {report['tasks']} files, "
+            f"{report['bytes'] / 1024**3:.2f} GB, peak RSS {peak_text}, "
+            f"{report['exit']}"
+        )
+    return lines
@@ -0,0 +1,334 @@
+import math
+import os
+import statistics
+from typing import Callable, List, Optional, Tuple
+
+from .arena import get_arena
+from .dpcore import ensure_parameters
+from .libs import JetrawLibraryError, get_dpcore_libs, get_jetraw_libs, set_license
+from .logger import logger
+from .scratch import run_staged
+from .sharding import index_key
+from .throttle import install_throttle
+
+# Per-process worker state, populated once by init_worker
+_worker_state: dict = {}
+
+VALID_BACKENDS = ("processes", "threads", "auto")
+
+# Median input size below which the 'auto' backend prefers threads
+AUTO_THREADS_MAX_FILE_SIZE = 16 * 1024**2
+
+# Environment variables used to pass the run state to the forkserver preload.
+# The license key is not one of them: the environment of a process can be read
+# by its children and through /proc, so workers get it from init_worker.
+PRELOAD_ENV = {
+    "calibration": "JETRAW_TOOLS_PRELOAD_CALIBRATION",
+    "mode": "JETRAW_TOOLS_PRELOAD_MODE",
+}
+
+
+def bootstrap_worker(
+    calibration_file: Optional[str], licence_key: Optional[str], mode: str
+) -> None:
+    """Load the JetRaw libraries and per-process library state.
+
+    Loads and initialises dpcore and jetraw_tiff, sets the license and loads
+    the calibration file, so the first file handled by a worker does not pay
+    the library load latency. This state is not inherited under the 'spawn'
+    start method, hence it is set up in every worker. Steps whose state is
+    already in place (e.g. inherited from a preloaded forkserver) are skipped.
+
+    Failures are logged rather than raised: an exception in a pool
+    initializer makes the pool respawn workers forever, while the same error
+    raised inside a task is reported for that file.
+
+    :param calibration_file: Path to the JetRaw calibration file
+    :type calibration_file: Optional[str]
+    :param licence_key: JetRaw license key, or None to skip setting it
+    :type licence_key: Optional[str]
+    :param mode: The mode, either "compress" or "decompress"
+    :type mode: str
+    """
+    try:
+        get_jetraw_libs()
+        if licence_key:
+            set_license(licence_key)
+        if mode == "compress":
+            get_dpcore_libs()
+            if calibration_file is not None:
+                ensure_parameters(calibration_file)
+    except (JetrawLibraryError, RuntimeError) as e:
+        logger.warning(f"Worker bootstrap failed, files may fail to process: {e}")
+
+
+def init_worker(tool_config: dict, job: dict) -> None:
+    """Initialise a pool worker with the immutable configuration of a run.
+
+    Called once per worker process by the pool, so the compression settings
+    and the per-run job options are transferred once instead of being pickled
+    alongside every task. The JetRaw libraries, license and calibration are
+    loaded here as well, see :func:`bootstrap_worker`.
+
+    :param tool_config: Keyword arguments used to rebuild the CompressionTool
+    :type tool_config: dict
+    :param job: Options shared by every task of the run (folders, mode, metadata flags)
+    :type job: dict
+    """
+    # Imported here to avoid a circular import with compression_tool
+    from .compression_tool import CompressionTool
+
+    _worker_state["job"] = job
+    # Shared with the other workers, see jetraw_tools.throttle
+    install_throttle(job.get("throttle"))
+    try:
+        _worker_state["tool"] = CompressionTool(**tool_config)
+    except (OSError, ValueError) as e:
+        # Raising here would make the pool respawn workers forever
+        logger.error(f"Worker initialisation failed: {e}")
+        return
+    bootstrap_worker(
+        tool_config["calibration_file"], tool_config["licence_key"], job["mode"]
+    )
+
+
+def run_task(task: Tuple) -> Tuple[int, dict, list]:
+    """Process a single file inside an initialised worker.
+
+    :param task: Compact task record of (file index, file name relative to the
+        input folder), optionally followed by the ND2 position to extract
+    :type task: Tuple
+    :returns: Number of files that failed to process (0 or 1), the
+        statistics of the buffer arena of this worker, and the outputs left
+        for the main process to commit, see :func:`run_job_task`
+    :rtype: Tuple[int, dict, list]
+    """
+    index, image_file, *position = task
+    tool = _worker_state.get("tool")
+    if tool is None:
+        logger.error(f"Error processing {image_file}: worker was not initialised")
+        return 1, get_arena().stats(), []
+    job = _worker_state["job"]
+    pending = []
+    failed_files = run_job_task(
+        tool, job, index, image_file, *position, pending=pending
+    )
+    return failed_files, get_arena().stats(), pending
+
+
+def run_job_task(
+    tool,
+    job: dict,
+    index: int,
+    image_file: str,
+    position: Optional[int] = None,
+    pending: Optional[list] = None,
+    **kwargs,
+) -> int:
+    """Process one task of a run, through the local caches of the run if any.
+
+    With a prefetch cache, the local copy of the source is read when it is
+    complete, and removed afterwards, see :mod:`jetraw_tools.prefetch`. With a
+    scratch area, the outputs are written to a staging directory on local
+    disk and the source is removed by the mover once they reached the output
+    folder, see :mod:`jetraw_tools.scratch`. With a sharded layout, the
+    outputs go to the shard of the task, see :mod:`jetraw_tools.sharding`.
+
+    :param tool: The CompressionTool of this process
+    :type tool: CompressionTool
+    :param job: Options shared by every task of the run
+    :type job: dict
+    :param index: Index of the task
+    :type index: int
+    :param image_file: File name relative to the input folder
+    :type image_file: str
+    :param position: ND2 stage position to extract, None for the whole file
+    :type position: Optional[int]
+    :param pending: List the outputs are appended to when the main process
+        commits them in batches (``sync_every`` other than 1), see
+        :mod:`jetraw_tools.commit`
+    :type pending: Optional[list]
+    :param kwargs: Further keyword arguments of ``process_image``
+    :returns: Number of files that failed to process (0 or 1)
+    :rtype: int
+    """
+    if pending is not None and tool.sync_every != 1:
+        kwargs["pending"] = pending
+    else:
+        pending = None
+
+    def process(output_folder: str, remove_source: bool, staged: bool) -> int:
+        return tool.process_image(
+            job["folder_path"],
+            output_folder,
+            image_file,
+            job["mode"],
+            job["image_extension"],
+            job["process_metadata"],
+            job["ome_bool"],
+            job["metadata_json"],
+            remove_source,
+            (index + 1, job["total_files"]),
+            position=position,
+            staged=staged,
+            **kwargs,
+        )
+
+    cache = job.get("prefetch")
+    if cache is None:
+        return _run_staged_task(
+            tool, job, index, image_file, position, process, pending
+        )
+    source = os.path.join(job["folder_path"], image_file)
+    kwargs["read_from"] = cache.take(index, source)
+    try:
+        return _run_staged_task(
+            tool, job, index, image_file, position, process, pending
+        )
+    finally:
+        cache.evict(index, source)
+
+
+def task_output_folder(job: dict, index: int, image_file: str) -> str:
+    """Return the folder the outputs of a task are written to.
+
+    :param job: Options shared by every task of the run
+    :type job: dict
+    :param index: Index of the task
+    :type index: int
+    :param image_file: File name relative to the input folder
+    :type image_file: str
+    :returns: The output folder, or its shard with a sharded layout, see
+        :mod:`jetraw_tools.sharding`
+    :rtype: str
+    """
+    layout = job.get("layout")
+    if layout is None:
+        return job["output_folder"]
+    return os.path.join(job["output_folder"], layout.shard(index, image_file))
+
+
+def _run_staged_task(
+    tool,
+    job: dict,
+    index: int,
+    image_file: str,
+    position: Optional[int],
+    process: Callable[[str, bool, bool], int],
+    pending: Optional[list],
+) -> int:
+    """Run a task through the scratch area of the run, if any.
+
+    Outputs are recorded in the index of a sharded output folder once
+    committed: here, or by the main process when it commits them.
+    """
+    output_folder = task_output_folder(job, index, image_file)
+    if output_folder != job["output_folder"]:
+        os.makedirs(output_folder, exist_ok=True)
+    output = tool._output_filename(
+        output_folder,
+        image_file,
+        job["mode"],
+        job["image_extension"],
+        job["ome_bool"],
+        position,
+    )
+    output_index = job.get("index")
+    key = None if output_index is None else index_key(image_file, position)
+    area = job.get("scratch")
+    if area is None:
+        n_pending = 0 if pending is None else len(pending)
+        failed = process(output_folder, job["remove_source"], False)
+        if key is None or failed:
+            return failed
+        if pending is not None and len(pending) > n_pending:
+            pending[n_pending:] = [
+                pending_output._replace(key=key)
+                for pending_output in pending[n_pending:]
+            ]
+        else:
+            output_index.append(key, output)
+        return failed
+    source = None
+    # The source still holds the other positions
+    if job["remove_source"] and position is None:
+        source = os.path.join(job["folder_path"], image_file)
+    return run_staged(
+        area,
+        index,
+        output_folder,
+        lambda staging: process(staging, False, True),
+        source=source,
+        output=os.path.basename(output),
+        key=key,
+    )
+
+
+def compute_chunksize(
+    n_tasks: int,
+    n_workers: int,
+    avg_file_size: Optional[float] = None,
+    max_chunk_bytes: int = 256 * 1024**2,
+    max_chunksize: int = 1024,
+) -> int:
+    """Compute how many tasks to hand to a worker per dispatch.
+
+    Aims for about four chunks per worker so the load stays balanced at the
+    end of the batch. When the average file size is known, a chunk is also
+    limited to about ``max_chunk_bytes`` of input, so batches of large files
+    are dispatched one file at a time while batches of small files amortise
+    the IPC cost over many files.
+
+    :param n_tasks: Number of tasks in the batch
+    :type n_tasks: int
+    :param n_workers: Number of worker processes
+    :type n_workers: int
+    :param avg_file_size: Average input file size in bytes, if known
+    :type avg_file_size: Optional[float]
+    :param max_chunk_bytes: Upper bound for the input bytes in one chunk
+    :type max_chunk_bytes: int
+    :param max_chunksize: Upper bound for the chunk size
+    :type max_chunksize: int
+    :returns: Chunk size, at least 1
+    :rtype: int
+    """
+    if n_tasks <= 0 or n_workers <= 0:
+        return 1
+    chunksize = min(math.ceil(n_tasks / (n_workers * 4)), max_chunksize)
+    if avg_file_size:
+        chunksize = min(chunksize, int(max_chunk_bytes // avg_file_size))
+    chunksize = max(1, chunksize)
+    logger.debug(
+        f"Dispatching {n_tasks} tasks to {n_workers} workers in chunks of {chunksize}"
+    )
+    return chunksize
+
+
+def resolve_backend(
+    backend: str,
+    file_sizes: List[int],
+    max_thread_file_size: int = AUTO_THREADS_MAX_FILE_SIZE,
+) -> str:
+    """Pick the execution backend for a batch.
+
+    For batches of small files, process startup, pickling and result IPC
+    dominate the runtime, so 'auto' runs them on threads. Larger files run on
+    processes, which do not share the GIL for the Python-side work.
+
+    :param backend: Requested backend: 'processes', 'threads' or 'auto'
+    :type backend: str
+    :param file_sizes: Size in bytes of each input file
+    :type file_sizes: List[int]
+    :param max_thread_file_size: Median file size below which 'auto' picks threads
+    :type max_thread_file_size: int
+    :returns: 'processes' or 'threads'
+    :rtype: str
+    :raises ValueError: If the backend is not one of VALID_BACKENDS
+    """
+    if backend not in VALID_BACKENDS:
+        raise ValueError(f"backend must be one of {VALID_BACKENDS}, got {backend!r}.")
+    if backend != "auto":
+        return backend
+    if file_sizes and statistics.median(file_sizes) < max_thread_file_size:
+        return "threads"
+    return "processes"
@@ -0,0 +1,138 @@
+import ctypes
+
+import pytest
+
+from jetraw_tools import jetraw_tiff
+
+
+def _nd2_like_metadata(n_planes: int = 4, n_events: int = 200) -> dict:
+    """Build metadata shaped like ``ND2File.unstructured_metadata()`` output.
+
+    Mirrors the nesting, key names and value types produced by Nikon
+    Elements (deep dict chains, lists of dicts, unit strings with 'µ',
+    floats, booleans and tuples) so tests do not need a binary ND2 file.
+    """
+    planes = {
+        f"a{i}": {
+            "uiCompCount": 1,
+            "uiSampleCount": 1,
+            "dObjCalibration1to1": 0.1083,
+            "sDescription": f"Channel {i} — 488 nm",
+            "pFilterPath": {
+                "m_pFilter": {
+                    "a0": {"m_sName": "Quad µ-filter", "m_ExcitationSpectrum": {}}
+                }
+            },
+            "pCameraSetting": {
+                "CameraUserName": "Prime BSI",
+                "FormatQuality": {"Desc": "16-bit (µs exposure)", "Binning": (1, 1)},
+                "Exposure": 100.0,
+                "bUseSubArea": False,
+            },
+            "wavelengths": [488.0, 561.5],
+            "units": ["µm", "ms"],
+        }
+        for i in range(n_planes)
+    }
+    events = [
+        {
+            "Time": float(t) * 0.5,
+            "Meaning": "Stimulation °C",
+            "Stage": [{"X": 12.5 * t, "Y": -3.25, "Z": None, "unit": "µm"}],
+        }
+        for t in range(n_events)
+    ]
+    return {
+        "ImageTextInfoLV": {
+            "SLxImageTextInfo": {
+                "TextInfoItem_5": "Metadata:\r\nDimensions: T(200) x λ(4)",
+                "TextInfoItem_9": "20/05/2024  14:03:11",
+            }
+        },
+        "ImageMetadataSeqLV|0": {
+            "SLxPictureMetadata": {
+                "dCalibration": 0.1083,
+                "bCalibrated": True,
+                "wsObjectiveName": "Plan Apo λ 60x Oil",
+                "sPicturePlanes": {"uiCount": n_planes, "sPlaneNew": planes},
+                "dTimeMSec": 1.5e3,
+                "dTemperature": float("nan"),
+            }
+        },
+        "ImageEventsLV": {"RLxExperimentRecord": {"pEvents": events}},
+        "CustomDataVar|AppInfo_V1_0": {"SWNameString": "NIS-Elements AR 5.42"},
+    }
+
+
+@pytest.fixture
+def nd2_metadata() -> dict:
+    """Representative ND2-derived metadata tree."""
+    return _nd2_like_metadata()
+
+
+@pytest.fixture
+def large_nd2_metadata() -> dict:
+    """A larger ND2-derived metadata tree used for timing comparisons."""
+    return _nd2_like_metadata(n_planes=64, n_events=5000)
+
+
+class _FakeJetraw:
+    def dp_status_description(self, status: int) -> bytes:
+        return b"page out of range"
+
+
+class _FakeJetrawTiff:
+    """In-memory stand-in for the jetraw_tiff library.
+
+    Each page is filled with its page index and every call is counted.
+    """
+
+    def __init__(self, width: int = 8, height: int = 4, pages: int = 5):
+        self.width, self.height, self.n_pages = width, height, pages
+        self.calls = {}
+        self.appended = []
+        self.bad_pages = set()
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def jetraw_tiff_open(self, cpath, width, height, cdescr, href, cmode) -> int:
+        self._count("open")
+        return 0
+
+    def jetraw_tiff_close(self, href) -> int:
+        self._count("close")
+        return 0
+
+    def jetraw_tiff_get_width(self, handle) -> int:
+        self._count("get_width")
+        return self.width
+
+    def jetraw_tiff_get_height(self, handle) -> int:
+        self._count("get_height")
+        return self.height
+
+    def jetraw_tiff_get_pages(self, handle) -> int:
+        self._count("get_pages")
+        return self.n_pages + len(self.appended)
+
+    def jetraw_tiff_append(self, handle, address) -> int:
+        frame = (ctypes.c_uint16 * (self.width * self.height)).from_address(address)
+        self.appended.append(list(frame))
+        return 0
+
+    def jetraw_tiff_read_page(self, handle, address, pageidx) -> int:
+        self._count("read_page")
+        if not 0 <= pageidx < self.n_pages or pageidx in self.bad_pages:
+            return 7
+        frame = (ctypes.c_uint16 * (self.width * self.height)).from_address(address)
+        for i in range(len(frame)):
+            frame[i] = pageidx
+        return 0
+
+
+@pytest.fixture
+def fake_tiff(monkeypatch):
+    fake = _FakeJetrawTiff()
+    monkeypatch.setattr(jetraw_tiff, "_get_libs", lambda: (_FakeJetraw(), fake))
+    return fake
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import arena, compression_tool, utils
+from jetraw_tools.arena import BufferArena, describe_stats, get_arena, merge_stats
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.tiff_reader import TiffReader
+from jetraw_tools.utils import as_compressible
+
+
+def test_buffers_are_reused_by_shape_and_dtype():
+    pool = BufferArena()
+    first = pool.borrow((4, 8))
+    pool.give_back(first)
+
+    assert pool.borrow((4, 8)) is first
+    assert pool.borrow((4, 8)) is not first
+    assert pool.borrow((4, 8), np.uint8).dtype == np.uint8
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+    assert stats["reused_bytes"] == first.nbytes
+
+
+def test_views_give_back_their_buffer():
+    pool = BufferArena()
+    buffer = pool.borrow((1, 4, 8))
+    pool.give_back(np.squeeze(buffer)[1:])
+    assert pool.borrow((1, 4, 8)) is buffer
+
+
+def test_buffers_that_are_not_given_back_are_freed():
+    pool = BufferArena()
+    tracemalloc.start()
+    try:
+        for _ in range(200):
+            buffer = pool.borrow((1024, 1024))
+            buffer[:] = 1
+            del buffer
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # 400 MB borrowed in all, one buffer alive at a time
+    assert current < 8 * 1024**2
+    assert pool._borrowed == {} and pool.stats()["misses"] == 200
+
+    # A buffer dropped while one of its views is alive is still given back
+    view = pool.borrow((4, 8))[1:]
+    pool.give_back(view)
+    assert pool.stats()["free_bytes"] == 64
+
+
+def test_foreign_arrays_are_ignored():
+    pool = BufferArena()
+    pool.give_back(np.empty((4, 8), np.uint16))
+    pool.give_back(None)
+    assert pool.stats()["free_bytes"] == 0
+
+
+def test_least_recently_returned_buffers_are_evicted():
+    pool = BufferArena(max_bytes=2 * 64)
+    small = [pool.borrow((32,)) for _ in range(2)]
+    other = pool.borrow((4, 8))
+    for buffer in small + [other]:
+        pool.give_back(buffer)
+
+    stats = pool.stats()
+    assert stats["evictions"] == 1 and stats["free_bytes"] == 128
+    assert pool.borrow((4, 8)) is other
+    assert pool.borrow((32,)) is small[1]
+
+
+def test_buffers_larger_than_the_cap_are_not_kept():
+    pool = BufferArena(max_bytes=16)
+    pool.give_back(pool.borrow((4, 8)))
+    assert pool.stats()["free_bytes"] == 0
+
+
+def _child_stats(queue):
+    queue.put(get_arena().stats())
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork"
+)
+def test_forked_workers_get_their_own_arena():
+    get_arena().give_back(get_arena().borrow((4, 8)))
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=_child_stats, args=(queue,))
+    child.start()
+    stats = queue.get(timeout=10)
+    child.join()
+    assert stats["pid"] != os.getpid() and stats["misses"] == 0
+
+
+def test_merge_and_describe_stats():
+    pools = [BufferArena(), BufferArena()]
+    for pool in pools:
+        pool.give_back(pool.borrow((4, 8)))
+        pool.borrow((4, 8))
+    merged = merge_stats([pool.stats() for pool in pools])
+    assert merged["hits"] == 2 and merged["processes"] == 2
+    assert "4 buffers served in 2 processes, 50% reused" in describe_stats(merged)
+
+
+def test_tiff_reader_borrows_its_output(fake_tiff):
+    pool = BufferArena()
+    with TiffReader("in.p.tiff") as reader:
+        image = reader.read(arena=pool)
+        pool.give_back(image)
+        assert reader.read(arena=pool) is image
+    assert pool.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("byteorder", ["<", ">"])
+def test_image_reader_borrows_tiff_buffers(tmp_path, byteorder):
+    data = np.arange(5 * 4 * 8, dtype=np.uint16).reshape(5, 4, 8)
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, data, compression="zlib", byteorder=byteorder)
+    pool = BufferArena()
+
+    reader = ImageReader(str(path), ".tif", read_metadata=False, arena=pool)
+    first, _ = reader.read_image()
+    np.testing.assert_array_equal(first, data)
+    pool.give_back(first)
+    second, _ = reader.read_image()
+    np.testing.assert_array_equal(second, data)
+    assert pool.stats()["hits"] == 1
+
+
+def test_conversion_borrows_from_arena():
+    pool = BufferArena()
+    converted = as_compressible(np.full((4, 8), 7, np.uint8), arena=pool)
+    assert converted.dtype == np.uint16 and np.all(converted == 7)
+    pool.give_back(converted)
+    assert as_compressible(np.ones((4, 8), np.uint8), arena=pool) is converted
+
+
+def test_process_folder_reuses_buffers_across_files(monkeypatch, fake_tiff, tmp_path):
+    monkeypatch.setitem(arena._arena, "pid", None)
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    folder = tmp_path / "input"
+    folder.mkdir()
+    for i in range(4):
+        tifffile.imwrite(
+            folder / f"{i}.tif", np.ones((5, 4, 8), np.uint8), compression="zlib"
+        )
+
+    tool = CompressionTool(identifier="cam", ncores=1, backend="threads")
+    tool.process_folder(
+        str(folder), "compress", ".tif", False, target_folder=str(tmp_path / "out")
+    )
+    stats = get_arena().stats()
+    # A read buffer and a conversion buffer per file, allocated for the first
+    assert (stats["misses"], stats["hits"]) == (2, 6)
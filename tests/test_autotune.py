@@ -0,0 +1,103 @@
+import multiprocessing
+
+import pytest
+
+from jetraw_tools import worker_pool
+from jetraw_tools.autotune import ConcurrencyTuner
+from jetraw_tools.resources import cpu_times
+from jetraw_tools.worker_pool import WorkerPool
+
+MB = 1024**2
+
+
+def _drive(tuner: ConcurrencyTuner, throughput, windows: int = 30) -> list:
+    """Run windows of one second at the MB/s throughput(workers) returns."""
+    now = 0.0
+    tuner.update(now)
+    counts = []
+    for _ in range(windows):
+        rate = throughput(tuner.workers)
+        for _ in range(tuner.workers):
+            tuner.observe(int(rate * MB / tuner.workers))
+        now += 1.0
+        tuner.update(now)
+        counts.append(tuner.workers)
+    return counts
+
+
+def test_cpu_bound_batch_climbs_to_all_workers(tmp_path):
+    tuner = ConcurrencyTuner(8, interval=1.0, step=1, stat=str(tmp_path / "none"))
+    counts = _drive(tuner, lambda workers: 100.0 * workers)
+    assert counts[-1] >= 7
+    assert max(window["mb_per_s"] for window in tuner.history) == pytest.approx(800)
+
+
+def test_saturated_storage_settles_on_few_workers(tmp_path):
+    tuner = ConcurrencyTuner(16, interval=1.0, step=1, stat=str(tmp_path / "none"))
+    # Throughput peaks at 3 workers, more of them thrash the storage
+    counts = _drive(tuner, lambda workers: 300.0 - 40.0 * abs(workers - 3))
+    assert all(2 <= count <= 4 for count in counts[-10:])
+    assert "best 300.0 MB/s with 3 workers" in tuner.summary()
+
+
+def test_windows_wait_for_a_file_per_worker(tmp_path):
+    tuner = ConcurrencyTuner(4, initial=4, interval=1.0, stat=str(tmp_path / "none"))
+    tuner.update(0.0)
+    tuner.observe(MB)
+    assert tuner.update(5.0) is None and tuner.history == []
+
+
+def _write_stat(path, total, iowait):
+    # user nice system idle iowait irq softirq steal
+    path.write_text(f"cpu  {total - iowait} 0 0 0 {iowait} 0 0 0 0 0\ncpu0 1 0 0 0\n")
+
+
+def test_cpu_times_and_io_bound_start(tmp_path):
+    stat = tmp_path / "stat"
+    _write_stat(stat, 1000, 100)
+    assert cpu_times(str(stat)) == (1000, 100)
+    assert cpu_times(str(tmp_path / "missing")) is None
+
+    tuner = ConcurrencyTuner(8, interval=1.0, step=1, stat=str(stat))
+    tuner.update(0.0)
+    _write_stat(stat, 2000, 700)
+    for _ in range(4):
+        tuner.observe(MB)
+    assert tuner.update(1.0) == 3
+    assert tuner.history[0]["iowait"] == pytest.approx(0.6)
+
+
+def test_summary_of_a_short_batch(tmp_path):
+    tuner = ConcurrencyTuner(4, stat=str(tmp_path / "none"))
+    assert "too short" in tuner.summary()
+
+
+class _FixedTuner:
+    """Tuner stand-in lowering the concurrency to one worker at once."""
+
+    workers = 3
+
+    def observe(self, n_bytes):
+        pass
+
+    def update(self, now):
+        if self.workers == 3:
+            self.workers = 1
+            return 1
+        return None
+
+
+def _work(task):
+    return task
+
+
+def test_pool_stops_workers_when_concurrency_drops(monkeypatch):
+    monkeypatch.setattr(worker_pool, "POLL_INTERVAL", 0.05)
+    context = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    pool = WorkerPool(context, 3, _work, tuner=_FixedTuner(), chunksize=1)
+    pool.start(12)
+    assert len(pool._workers) == 3
+    assert sorted(pool.imap_unordered(list(range(12)))) == list(range(12))
+    assert sorted(report["tasks"] for report in pool.reports) == [0, 0, 12]
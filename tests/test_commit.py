@@ -0,0 +1,168 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import commit, compression_tool, utils
+from jetraw_tools.commit import (
+    OutputCommitter,
+    PendingOutput,
+    commit_files,
+    partial_path,
+    written_files,
+)
+from jetraw_tools.compression_tool import CompressionTool
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    """Record the files and directories flushed to disk."""
+    calls = []
+
+    def sync(fd):
+        calls.append(os.readlink(f"/proc/self/fd/{fd}"))
+
+    monkeypatch.setattr(os, "fdatasync", sync, raising=False)
+    monkeypatch.setattr(os, "fsync", sync)
+    return calls
+
+
+def _pending(folder, name: str, source=None) -> PendingOutput:
+    final = os.path.join(folder, name)
+    with open(partial_path(final), "wb") as f:
+        f.write(b"\0" * 64)
+    return PendingOutput(written_files(final), source)
+
+
+def test_metadata_json_is_committed_with_its_image(tmp_path):
+    image = str(tmp_path / "a.ome.p.tiff")
+    for path in (image, str(tmp_path / "a.ome.json")):
+        open(partial_path(path), "w").close()
+    assert written_files(image) == [
+        (str(tmp_path / ".partial-a.ome.p.tiff"), image),
+        (str(tmp_path / ".partial-a.ome.json"), str(tmp_path / "a.ome.json")),
+    ]
+    assert written_files(str(tmp_path / "b.ome.p.tiff")) == []
+
+
+def test_files_are_flushed_before_their_rename(synced, tmp_path):
+    output = _pending(tmp_path, "a.p.tiff")
+    commit_files(output.files, sync=False)
+    assert synced == [] and os.listdir(tmp_path) == ["a.p.tiff"]
+
+    output = _pending(tmp_path, "b.p.tiff")
+    commit_files(output.files)
+    assert synced == [str(tmp_path / ".partial-b.p.tiff"), str(tmp_path)]
+    assert sorted(os.listdir(tmp_path)) == ["a.p.tiff", "b.p.tiff"]
+
+
+def test_outputs_are_committed_in_batches(synced, tmp_path):
+    removed = []
+    committer = OutputCommitter(
+        2, lambda output, source: removed.append(source), cache_hints=False
+    )
+    assert committer.add([_pending(tmp_path, "a.p.tiff", "a.tif")]) == 0
+    assert committer.add([]) == 0
+    assert removed == [] and synced == []
+    assert committer.add([_pending(tmp_path, "b.p.tiff", "b.tif")]) == 0
+    assert removed == ["a.tif", "b.tif"] and len(synced) == 3
+
+    committer.add([_pending(tmp_path, "c.p.tiff")])
+    assert ".partial-c.p.tiff" in os.listdir(tmp_path)
+    committer.flush()
+    assert sorted(os.listdir(tmp_path)) == ["a.p.tiff", "b.p.tiff", "c.p.tiff"]
+    assert (committer.committed, committer.batches) == (3, 2)
+
+
+def test_failed_commits_keep_the_sources(monkeypatch, tmp_path):
+    committer = OutputCommitter(0, lambda *args: pytest.fail("source removed"))
+    committer.add([_pending(tmp_path, "a.p.tiff", "a.tif")])
+    os.remove(tmp_path / ".partial-a.p.tiff")
+    assert committer.flush() == 1
+
+
+def test_one_failed_commit_leaves_the_batch_committed(monkeypatch, tmp_path):
+    removed, indexed = [], []
+    committer = OutputCommitter(
+        0,
+        lambda output, source: removed.append(source),
+        cache_hints=False,
+        on_commit=lambda key, output: indexed.append(key),
+    )
+    for name in "abc":
+        output = _pending(tmp_path, f"{name}.p.tiff", f"{name}.tif")
+        committer.add([output._replace(key=f"{name}.tif")])
+    replace = os.replace
+
+    def fail_b(partial, final):
+        if final.endswith("b.p.tiff"):
+            raise OSError("stale file handle")
+        replace(partial, final)
+
+    monkeypatch.setattr(commit.os, "replace", fail_b)
+    assert committer.flush() == 1
+    assert removed == indexed == ["a.tif", "c.tif"]
+    assert committer.committed == 2
+    assert sorted(os.listdir(tmp_path)) == [".partial-b.p.tiff", "a.p.tiff", "c.p.tiff"]
+
+
+def test_failed_outputs_are_discarded(monkeypatch, tmp_path):
+    tifffile.imwrite(tmp_path / "a.tif", np.ones((5, 4, 8), np.uint16))
+
+    def fail(self, img_map, target_file, *args, **kwargs):
+        open(target_file, "wb").close()
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(CompressionTool, "compress_image", fail)
+    args = (str(tmp_path), str(tmp_path), "a.tif", "compress", ".tif")
+    args += (False, True, False, True, (1, 1))
+    assert CompressionTool(identifier="cam").process_image(*args) == 1
+    assert os.listdir(tmp_path) == ["a.tif"]
+
+
+@pytest.mark.parametrize("sync_every", [1, 2, 0])
+def test_process_folder_commits_outputs(
+    sync_every, monkeypatch, fake_tiff, synced, tmp_path
+):
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    jetraw_open = fake_tiff.jetraw_tiff_open
+    renamed = []
+    monkeypatch.setattr(
+        commit.os,
+        "replace",
+        lambda src, dst: renamed.append(dst) or os.rename(src, dst),
+    )
+
+    def write_on_open(cpath, *args):
+        # The fake library writes no file, and no output may exist yet
+        if args[-1] == b"w":
+            assert renamed == [] or sync_every != 0
+            open(cpath, "wb").write(b"\0" * 64)
+        return jetraw_open(cpath, *args)
+
+    monkeypatch.setattr(fake_tiff, "jetraw_tiff_open", write_on_open)
+    folder = tmp_path / "input"
+    folder.mkdir()
+    for i in range(3):
+        tifffile.imwrite(folder / f"{i}.tif", np.ones((5, 4, 8), np.uint16))
+
+    tool = CompressionTool(
+        identifier="cam", ncores=1, backend="threads", sync_every=sync_every
+    )
+    tool.process_folder(
+        str(folder),
+        "compress",
+        ".tif",
+        False,
+        remove_source=True,
+        target_folder=str(tmp_path / "out"),
+    )
+    outputs = ["0.ome.p.tiff", "1.ome.p.tiff", "2.ome.p.tiff"]
+    assert sorted(os.listdir(tmp_path / "out")) == outputs
+    assert os.listdir(folder) == []
+    # Each output and its directory, by batch
+    flushes = {1: 3, 2: 2, 0: 1}[sync_every]
+    assert len(synced) == 3 + flushes
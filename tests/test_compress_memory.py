@@ -0,0 +1,137 @@
+import os
+import tracemalloc
+
+import nd2
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, utils
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.utils import as_compressible
+
+SHAPE = (16, 512, 1024)
+
+# Size of a uint16 stack of SHAPE
+DATA_BYTES = 2 * 16 * 512 * 1024
+
+
+@pytest.fixture
+def fake_compress(monkeypatch, fake_tiff):
+    """Compress through TiffWriter_5D into a library that discards the pages."""
+    fake_tiff.width, fake_tiff.height = SHAPE[2], SHAPE[1]
+    monkeypatch.setattr(fake_tiff, "jetraw_tiff_append", lambda handle, address: 0)
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    return fake_tiff
+
+
+def _peak_compress_memory(folder, extension: str, data_bytes: int) -> float:
+    """Peak traced memory of compressing one file, as a multiple of its data."""
+    image_file = os.listdir(folder)[0]
+    tool = CompressionTool(identifier="cam")
+    tracemalloc.start()
+    try:
+        failed = tool.process_image(
+            str(folder),
+            str(folder),
+            image_file,
+            "compress",
+            extension,
+            False,
+            True,
+            False,
+            False,
+            (1, 1),
+        )
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert failed == 0
+    return peak / data_bytes
+
+
+def test_uint16_tiff_is_not_copied_after_reading(fake_compress, tmp_path):
+    # Compressed, so the stack is read into memory rather than mapped
+    tifffile.imwrite(
+        tmp_path / "stack.tif", np.ones(SHAPE, np.uint16), compression="zlib"
+    )
+    # The array read from disk is the only allocation of the data size
+    assert _peak_compress_memory(tmp_path, ".tif", DATA_BYTES) < 1.2
+
+
+def test_plain_uint16_tiff_is_memory_mapped(fake_compress, tmp_path):
+    tifffile.imwrite(tmp_path / "stack.tif", np.ones(SHAPE, np.uint16))
+    assert _peak_compress_memory(tmp_path, ".tif", DATA_BYTES) < 0.05
+
+
+def test_uint8_tiff_is_converted_once(fake_compress, tmp_path):
+    tifffile.imwrite(tmp_path / "stack.tif", np.ones(SHAPE, np.uint8))
+    # The uint8 array read from disk plus its uint16 conversion
+    assert _peak_compress_memory(tmp_path, ".tif", DATA_BYTES // 2) < 3.2
+
+
+def test_as_compressible_only_copies_when_needed():
+    image = np.ones((4, 8), np.uint16)
+    assert as_compressible(image) is image
+
+    converted = as_compressible(np.ones((8, 4), np.uint8).T)
+    assert converted.dtype == np.uint16 and converted.flags["C_CONTIGUOUS"]
+
+    with pytest.raises(TypeError):
+        as_compressible(np.ones((4, 8), np.float32))
+
+
+def test_nd2_reader_keeps_uint16_frames(monkeypatch, tmp_path):
+    data = np.ones((2, 4, 8), np.uint16)
+
+    class _ND2File:
+        sizes = {"T": 2, "Y": 4, "X": 8}
+
+        def __init__(self, path):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def asarray(self):
+            return data
+
+    monkeypatch.setattr(nd2, "ND2File", _ND2File)
+    (tmp_path / "a.nd2").write_bytes(b"")
+    reader = ImageReader(str(tmp_path / "a.nd2"), ".nd2", read_metadata=False)
+    image, _ = reader.read_image()
+    assert image is data
+
+
+def test_memory_mapped_tiff_is_copy_on_write(tmp_path):
+    data = np.arange(5 * 4 * 8, dtype=np.uint16).reshape(5, 4, 8)
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, data)
+
+    image, _ = ImageReader(str(path), ".tif", read_metadata=False).read_image()
+    assert isinstance(image, np.memmap) and image.mode == "c"
+    np.testing.assert_array_equal(image, data)
+    image += 1
+    del image
+    np.testing.assert_array_equal(tifffile.imread(path), data)
+
+
+@pytest.mark.parametrize(
+    "write_kwargs, read_kwargs",
+    [({"compression": "zlib"}, {}), ({}, {"memory_map": False})],
+)
+def test_tiff_read_into_memory(tmp_path, write_kwargs, read_kwargs):
+    data = np.arange(5 * 4 * 8, dtype=np.uint16).reshape(5, 4, 8)
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, data, **write_kwargs)
+
+    reader = ImageReader(str(path), ".tif", read_metadata=False, **read_kwargs)
+    image, _ = reader.read_image()
+    assert not isinstance(image, np.memmap)
+    np.testing.assert_array_equal(image, data)
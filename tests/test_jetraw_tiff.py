@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from jetraw_tools import jetraw_tiff
+from jetraw_tools.tiff_reader import TiffReader
+
+
+def test_read_queries_dimensions_once_per_handle(fake_tiff):
+    with TiffReader("image.p.tiff") as reader:
+        for page in range(fake_tiff.n_pages):
+            reader.read(page)
+        reader.read()
+    assert fake_tiff.calls["get_width"] == 1
+    assert fake_tiff.calls["get_height"] == 1
+    assert fake_tiff.calls["get_pages"] == 1
+
+
+def test_read_writes_each_page_into_its_frame(fake_tiff):
+    with TiffReader("image.p.tiff") as reader:
+        image = reader.read([3, 0, 4])
+    assert image.shape == (3, 4, 8)
+    assert image.dtype == np.uint16
+    assert [int(frame[0, 0]) for frame in image] == [3, 0, 4]
+    assert np.all(image == image[:, :1, :1])
+
+
+def test_read_page_error_raises_status_description(fake_tiff):
+    with TiffReader("image.p.tiff") as reader:
+        with pytest.raises(RuntimeError, match="page out of range"):
+            reader.read(fake_tiff.n_pages)
+
+
+def test_reopening_handle_refreshes_dimensions(fake_tiff):
+    jrtif = jetraw_tiff.JetrawTiff()
+    jrtif.open("a.p.tiff", "r")
+    assert jrtif.width == 8
+    jrtif.close()
+    fake_tiff.width = 16
+    jrtif.open("b.p.tiff", "r")
+    assert jrtif.width == 16
+
+
+def test_pages_not_cached_while_writing(fake_tiff):
+    fake_tiff.n_pages = 0
+    jrtif = jetraw_tiff.JetrawTiff()
+    jrtif.open("out.p.tiff", "w", 8, 4)
+    frame = np.arange(32, dtype=np.uint16).reshape(4, 8)
+    jrtif.append_page(frame)
+    assert jrtif.pages == 1
+    jrtif.append_page(frame)
+    assert jrtif.pages == 2
+    assert fake_tiff.appended[0] == list(range(32))
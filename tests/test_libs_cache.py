@@ -0,0 +1,79 @@
+import ctypes
+import ctypes.util
+import json
+
+import pytest
+
+from jetraw_tools import libs
+
+
+@pytest.fixture
+def lib_cache(tmp_path, monkeypatch):
+    """Point the library path cache and config at a temporary directory."""
+    lib_dir = tmp_path / "lib"
+    lib_dir.mkdir()
+    (lib_dir / "libjetraw.so").write_bytes(b"jetraw")
+    monkeypatch.setattr(libs, "LIB_CACHE_FILE", str(tmp_path / "lib_cache.json"))
+    monkeypatch.setattr(libs, "_CONFIG_FILE", str(tmp_path / "jetraw_tools.cfg"))
+    monkeypatch.setattr(libs, "_lib_path_cache", None)
+    monkeypatch.setenv("LD_LIBRARY_PATH", str(lib_dir))
+
+    calls = []
+
+    def find_library(name):
+        calls.append(name)
+        return f"lib{name}.so" if (lib_dir / f"lib{name}.so").exists() else None
+
+    monkeypatch.setattr(ctypes.util, "find_library", find_library)
+    return lib_dir, calls
+
+
+def test_resolved_path_is_absolute_and_persisted(lib_cache):
+    lib_dir, calls = lib_cache
+    path = libs._resolve_library("jetraw")
+    assert path == str(lib_dir / "libjetraw.so")
+
+    with open(libs.LIB_CACHE_FILE) as f:
+        cache = json.load(f)
+    assert cache["libs"]["jetraw"]["path"] == path
+
+
+def test_cache_file_skips_find_library_in_new_process(lib_cache, monkeypatch):
+    lib_dir, calls = lib_cache
+    libs._resolve_library("jetraw")
+    # A fresh process only has the cache file
+    monkeypatch.setattr(libs, "_lib_path_cache", None)
+    assert libs._resolve_library("jetraw") == str(lib_dir / "libjetraw.so")
+    assert calls == ["jetraw"]
+
+
+def test_changed_library_is_resolved_again(lib_cache, monkeypatch):
+    lib_dir, calls = lib_cache
+    libs._resolve_library("jetraw")
+    (lib_dir / "libjetraw.so").write_bytes(b"jetraw, upgraded")
+    libs._resolve_library("jetraw")
+    assert calls == ["jetraw", "jetraw"]
+
+
+def test_changed_config_invalidates_cache(lib_cache, monkeypatch, tmp_path):
+    lib_dir, calls = lib_cache
+    libs._resolve_library("jetraw")
+    (tmp_path / "jetraw_tools.cfg").write_text("[jetraw_paths]\n")
+    monkeypatch.setattr(libs, "_lib_path_cache", None)
+    libs._resolve_library("jetraw")
+    assert calls == ["jetraw", "jetraw"]
+
+
+def test_missing_library_raises(lib_cache):
+    with pytest.raises(OSError):
+        libs._resolve_library("dpcore")
+
+
+def test_failed_load_drops_cache_entry(lib_cache, monkeypatch):
+    def load_library(path):
+        raise OSError("invalid ELF header")
+
+    monkeypatch.setattr(ctypes.cdll, "LoadLibrary", load_library)
+    with pytest.raises(OSError):
+        libs._load_library("jetraw")
+    assert "jetraw" not in libs._read_lib_cache()["libs"]
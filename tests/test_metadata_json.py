@@ -0,0 +1,125 @@
+import json
+import sys
+import timeit
+
+import pytest
+
+from jetraw_tools.utils import (
+    convert_to_ascii,
+    flatten_dict,
+    metadata_to_json,
+    serialise,
+)
+
+
+def _old_comment(metadata: dict) -> str:
+    """Former OME comment chain of metadata_writer."""
+    return json.dumps(serialise(convert_to_ascii(metadata)))
+
+
+def _old_imagej_comment(metadata: dict) -> str:
+    """Former ImageJ comment chain of metadata_writer."""
+    return json.dumps(serialise(flatten_dict(convert_to_ascii(metadata))))
+
+
+def _old_sidecar(metadata: dict, strip: bool) -> str:
+    """Former JSON sidecar chain of metadata_writer."""
+    if strip:
+        metadata = convert_to_ascii(metadata)
+    return json.dumps(metadata, indent=3, ensure_ascii=False, default=serialise)
+
+
+def test_comment_matches_old_chain(nd2_metadata):
+    assert metadata_to_json(nd2_metadata) == _old_comment(nd2_metadata)
+
+
+def test_imagej_comment_matches_old_chain(nd2_metadata):
+    assert metadata_to_json(nd2_metadata, flatten=True) == _old_imagej_comment(
+        nd2_metadata
+    )
+
+
+@pytest.mark.parametrize("strip", [False, True])
+def test_sidecar_matches_old_chain(nd2_metadata, strip):
+    new = metadata_to_json(
+        nd2_metadata, strip_non_ascii=strip, ensure_ascii=False, indent=3
+    )
+    assert new == _old_sidecar(nd2_metadata, strip)
+
+
+def test_strings_in_lists_are_escaped_not_stripped():
+    metadata = {"a": "µm", "b": ["µm", {"c": "é"}]}
+    assert metadata_to_json(metadata) == (
+        '{"a": "m", "b": ["\\u00b5m", {"c": "\\u00e9"}]}'
+    )
+    assert metadata_to_json(metadata) == _old_comment(metadata)
+
+
+def test_non_ascii_keys_are_kept_in_sidecar():
+    metadata = {"λ": {"µ": "é"}}
+    new = metadata_to_json(metadata, strip_non_ascii=True, ensure_ascii=False, indent=3)
+    assert new == _old_sidecar(metadata, strip=True)
+    assert '"λ"' in new and '"µ": ""' in new
+
+
+def test_deep_metadata_does_not_hit_recursion_limit():
+    metadata = node = {}
+    for _ in range(sys.getrecursionlimit() * 5):
+        node["k"] = [{}]
+        node = node["k"][0]
+    node["leaf"] = 1
+    text = metadata_to_json(metadata)
+    assert text.endswith('{"leaf": 1}' + "]}" * (sys.getrecursionlimit() * 5))
+
+
+def _default(value):
+    return list(value) if isinstance(value, (set, frozenset)) else str(value)
+
+
+@pytest.mark.parametrize("indent", [None, 3])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_encoder_matches_json_dumps(nd2_metadata, indent, ensure_ascii):
+    nd2_metadata["tags"] = {"µ"}
+    nd2_metadata["inf"] = [float("inf"), float("nan"), -0.0, {1: None, 2.5: True}]
+    expected = json.dumps(
+        nd2_metadata, ensure_ascii=ensure_ascii, indent=indent, default=_default
+    )
+    new = metadata_to_json(
+        nd2_metadata, strip_non_ascii=False, ensure_ascii=ensure_ascii, indent=indent
+    )
+    assert new == expected
+
+
+def test_circular_reference_raises():
+    metadata = {}
+    metadata["self"] = metadata
+    with pytest.raises(ValueError):
+        metadata_to_json(metadata)
+
+
+def test_single_pass_is_not_slower_than_old_chain(large_nd2_metadata):
+    """Micro-benchmark of the single pass against the former chains.
+
+    Run with ``pytest -s`` to see the timings.
+    """
+    cases = [
+        (
+            "comment",
+            lambda: _old_comment(large_nd2_metadata),
+            lambda: metadata_to_json(large_nd2_metadata),
+        ),
+        (
+            "imagej",
+            lambda: _old_imagej_comment(large_nd2_metadata),
+            lambda: metadata_to_json(large_nd2_metadata, flatten=True),
+        ),
+    ]
+    for name, old, new in cases:
+        old_time = min(timeit.repeat(old, number=3, repeat=5)) / 3
+        new_time = min(timeit.repeat(new, number=3, repeat=5)) / 3
+        print(
+            f"{name}: old chain {old_time * 1e3:.2f} ms, "
+            f"single pass {new_time * 1e3:.2f} ms ({old_time / new_time:.2f}x)"
+        )
+        # Generous bound so the check stays stable on loaded CI machines
+        assert new_time < old_time * 1.5
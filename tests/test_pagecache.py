@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, pagecache, utils
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.pagecache import advise_mapping, drop_file
+
+
+@pytest.fixture
+def fadvise(monkeypatch):
+    """Record the posix_fadvise calls by advice name."""
+    if not hasattr(os, "posix_fadvise"):
+        pytest.skip("posix_fadvise is not available")
+    names = {
+        getattr(os, name): name
+        for name in (
+            "POSIX_FADV_SEQUENTIAL",
+            "POSIX_FADV_WILLNEED",
+            "POSIX_FADV_DONTNEED",
+        )
+    }
+    calls = []
+    monkeypatch.setattr(
+        os,
+        "posix_fadvise",
+        lambda fd, offset, length, advice: calls.append(names[advice]),
+    )
+    return calls
+
+
+def test_tiff_reads_are_announced_sequential(fadvise, tmp_path):
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, np.zeros((5, 4, 8), np.uint16))
+
+    ImageReader(str(path), ".tif", read_metadata=False).read_image()
+    assert fadvise == []
+    ImageReader(str(path), ".tif", read_metadata=False, cache_hints=True).read_image()
+    assert fadvise == ["POSIX_FADV_SEQUENTIAL", "POSIX_FADV_WILLNEED"]
+
+
+def test_drop_file_flushes_outputs_first(fadvise, monkeypatch, tmp_path):
+    synced = []
+    monkeypatch.setattr(os, "fdatasync", synced.append, raising=False)
+    path = tmp_path / "out.p.tiff"
+    path.write_bytes(b"\0" * 64)
+
+    drop_file(str(path))
+    assert fadvise == ["POSIX_FADV_DONTNEED"] and synced == []
+    drop_file(str(path), flush=True)
+    assert len(synced) == 1
+    drop_file(str(tmp_path / "removed.tif"))
+    assert len(fadvise) == 2
+
+
+def test_hints_are_skipped_without_fadvise(monkeypatch, tmp_path):
+    monkeypatch.delattr(os, "posix_fadvise", raising=False)
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"\0" * 64)
+    drop_file(str(path), flush=True)
+    pagecache.advise_path(str(path))
+
+
+def test_memory_mapped_inputs_are_advised(tmp_path):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"\0" * 4096)
+    advise_mapping(np.memmap(path, mode="c"))
+    advise_mapping(np.zeros(4))
+    advise_mapping(None)
+
+
+def test_process_image_drops_input_and_output(monkeypatch, fake_tiff, tmp_path):
+    dropped = []
+    monkeypatch.setattr(
+        compression_tool, "drop_file", lambda path, flush=False: dropped.append(flush)
+    )
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    tifffile.imwrite(tmp_path / "a.tif", np.ones((5, 4, 8), np.uint16))
+
+    args = (str(tmp_path), str(tmp_path), "a.tif", "compress", ".tif")
+    args += (False, True, False, False, (1, 1))
+    CompressionTool(identifier="cam", cache_hints=False).process_image(*args)
+    assert dropped == []
+    CompressionTool(identifier="cam").process_image(*args)
+    # The output is flushed when it is committed, see test_commit
+    assert dropped == [False, False]
@@ -0,0 +1,126 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, plane_split
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.plane_split import PlaneSource, can_split, plan_chunks
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="the fake libraries reach the workers by forking",
+)
+
+
+def _fake_prepare_image(plane: np.ndarray, identifier: str) -> None:
+    plane += 1
+
+
+def _failing_prepare_image(plane: np.ndarray, identifier: str) -> None:
+    raise RuntimeError("calibration mismatch")
+
+
+@pytest.fixture
+def stack(tmp_path):
+    """A 23-page TIFF whose pages hold their index in every pixel."""
+    data = np.broadcast_to(
+        np.arange(23, dtype=np.uint16)[:, None, None], (23, 4, 8)
+    ).copy()
+    path = tmp_path / "input" / "stack.tiff"
+    path.parent.mkdir()
+    tifffile.imwrite(path, data)
+    return path, data
+
+
+@pytest.fixture
+def fake_split(monkeypatch, fake_tiff):
+    monkeypatch.setattr(plane_split, "prepare_image", _fake_prepare_image)
+    monkeypatch.setattr(plane_split, "bootstrap_worker", lambda *args: None)
+    monkeypatch.setattr(compression_tool, "bootstrap_worker", lambda *args: None)
+    return fake_tiff
+
+
+def _written_pages(fake_tiff) -> list:
+    return [page[0] for page in fake_tiff.appended]
+
+
+def test_plan_chunks_covers_units_in_order():
+    chunks = plan_chunks(100, 4, unit_bytes=1024)
+    assert [i for chunk in chunks for i in chunk] == list(range(100))
+    assert max(len(chunk) for chunk in chunks) <= plane_split.MAX_CHUNK_UNITS
+    assert len(chunks) >= 4 * 4 - 1
+
+
+def test_plan_chunks_respects_buffer_budget():
+    unit_bytes = plane_split.SPLIT_BUFFER_BYTES // 8
+    chunks = plan_chunks(64, 4, unit_bytes=unit_bytes)
+    assert all(len(chunk) == 1 for chunk in chunks)
+
+
+def test_plane_source_reads_tiff_pages(stack):
+    path, data = stack
+    with PlaneSource(str(path), ".tiff") as source:
+        assert source.n_units == 23
+        assert source.unit_shape == (1, 4, 8)
+        np.testing.assert_array_equal(source.read(7), data[7:8])
+
+
+def test_multi_series_tiff_cannot_be_split(tmp_path):
+    path = tmp_path / "series.tiff"
+    with tifffile.TiffWriter(path) as tif:
+        tif.write(np.zeros((4, 8), dtype=np.uint16))
+        tif.write(np.zeros((2, 2), dtype=np.uint16))
+    assert not can_split(str(path), ".tiff")
+    assert not can_split(str(path), ".p.tiff")
+
+
+@pytest.mark.parametrize("num_workers", [1, 3, 8])
+def test_compress_image_split_writes_pages_in_order(
+    stack, fake_split, tmp_path, num_workers
+):
+    path, data = stack
+    tool = CompressionTool(identifier="cam", start_method="fork")
+    tool.compress_image_split(
+        str(path), str(tmp_path / "out.p.tiff"), ".tiff", {}, num_workers
+    )
+    assert _written_pages(fake_split) == [index + 1 for index in range(23)]
+
+
+def test_compress_image_split_reports_worker_failure(
+    stack, fake_split, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(plane_split, "prepare_image", _failing_prepare_image)
+    path, _ = stack
+    tool = CompressionTool(identifier="cam", start_method="fork")
+    with pytest.raises(RuntimeError, match="Split worker failed"):
+        tool.compress_image_split(
+            str(path), str(tmp_path / "out.p.tiff"), ".tiff", {}, 2
+        )
+
+
+def test_process_folder_splits_single_large_file(
+    stack, fake_split, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(compression_tool, "SPLIT_MIN_FILE_SIZE", 0)
+    path, _ = stack
+    tool = CompressionTool(identifier="cam", ncores=3, start_method="fork")
+    tool.process_folder(
+        str(path.parent),
+        "compress",
+        ".tiff",
+        process_metadata=False,
+        target_folder=str(tmp_path / "output"),
+    )
+    assert _written_pages(fake_split) == [index + 1 for index in range(23)]
+
+
+def test_split_not_used_when_files_outnumber_workers(stack):
+    path, _ = stack
+    tool = CompressionTool(identifier="cam", ncores=2)
+    tasks = [(0, "a.tiff"), (1, "b.tiff")]
+    assert (
+        tool._split_tasks(str(path.parent), tasks, [2**40] * 2, "compress", ".tiff", 2)
+        == []
+    )
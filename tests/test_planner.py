@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import planner
+from jetraw_tools.planner import describe_plan, plan_files
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """Fake codec: prepare_image is a no-op and encoding quarters the size."""
+    calls = []
+
+    def encode_raw(plane):
+        calls.append(plane.shape)
+        return np.zeros(plane.nbytes // 4, dtype=np.uint8)
+
+    monkeypatch.setattr(planner, "prepare_image", lambda plane, identifier: None)
+    monkeypatch.setattr(planner, "encode_raw", encode_raw)
+    return calls
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """Five 10-page 4x8 stacks and two 6-page 16x16 stacks."""
+    for i in range(5):
+        tifffile.imwrite(tmp_path / f"small_{i}.tif", np.ones((10, 4, 8), np.uint16))
+    for i in range(2):
+        tifffile.imwrite(tmp_path / f"large_{i}.tif", np.ones((6, 16, 16), np.uint16))
+    return tmp_path
+
+
+def _plan(folder, **kwargs):
+    files = sorted(f for f in os.listdir(folder) if f.endswith(".tif"))
+    return plan_files(str(folder), files, ".tif", "cam", 2, **kwargs)
+
+
+def test_plan_groups_files_and_extrapolates_ratio(folder, encoded):
+    plan = _plan(folder)
+
+    assert plan["files"] == 7 and plan["skipped"] == []
+    groups = {group["type"][1]: group for group in plan["types"]}
+    assert groups[(1, 4, 8)]["files"] == 5
+    assert groups[(1, 4, 8)]["sampled_files"] == 3
+    assert groups[(1, 16, 16)]["sampled_files"] == 2
+    for group in plan["types"]:
+        assert group["ratio"] == pytest.approx(0.25)
+
+    raw_bytes = 5 * 10 * 4 * 8 * 2 + 2 * 6 * 16 * 16 * 2
+    assert plan["raw_bytes"] == raw_bytes
+    assert plan["output_bytes"] == pytest.approx(raw_bytes / 4)
+    assert plan["wall_seconds"] == pytest.approx(plan["cpu_seconds"] / 2)
+
+
+def test_plan_samples_only_a_few_planes(folder, encoded):
+    _plan(folder, samples_per_file=2, files_per_type=1)
+    # One file per type, two planes per file
+    assert len(encoded) == 4
+
+
+def test_plan_writes_nothing(folder, encoded):
+    before = sorted(os.listdir(folder))
+    _plan(folder)
+    assert sorted(os.listdir(folder)) == before
+
+
+def test_plan_skips_unsupported_files(folder, encoded):
+    with tifffile.TiffWriter(folder / "series.tif") as tif:
+        tif.write(np.zeros((4, 8), dtype=np.uint16))
+        tif.write(np.zeros((2, 2), dtype=np.uint16))
+    plan = _plan(folder)
+    assert plan["skipped"] == ["series.tif"]
+    assert "Not sampled" in describe_plan(plan)
+
+
+def test_describe_plan_reports_totals(folder, encoded):
+    report = describe_plan(_plan(folder))
+    assert ".tif 1x4x8 uint16: 5 files (3 sampled), ratio 0.250" in report
+    assert "Total: 7 files" in report
+    assert "Estimated duration on 2 cores" in report
+
+
+def test_evenly_spaced():
+    assert planner._evenly_spaced(10, 4) == [0, 3, 6, 9]
+    assert planner._evenly_spaced(3, 5) == [0, 1, 2]
+    assert planner._evenly_spaced(0, 5) == []
@@ -0,0 +1,154 @@
+import os
+import time
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, prefetch, utils
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.prefetch import PrefetchCache, Prefetcher
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(prefetch, "POLL_INTERVAL", 0.01)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    folder = tmp_path / "share"
+    folder.mkdir()
+    paths = []
+    for i in range(5):
+        paths.append(str(folder / f"{i}.nd2"))
+        with open(paths[-1], "wb") as f:
+            f.write(bytes([i]) * 1000)
+    return paths
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_copies_stay_within_depth(sources, tmp_path):
+    cache = PrefetchCache(str(tmp_path / "nvme"), len(sources), depth=2)
+    prefetcher = Prefetcher(cache, list(enumerate(sources)), cache_hints=False)
+    prefetcher.start()
+    _wait_for(lambda: prefetcher.copied == 2)
+    time.sleep(0.05)
+    assert sorted(os.listdir(cache.path)) == ["0-0.nd2", "1-1.nd2"]
+
+    local = cache.take(0, sources[0])
+    assert open(local, "rb").read() == open(sources[0], "rb").read()
+    cache.evict(0, sources[0])
+    _wait_for(lambda: prefetcher.copied == 3)
+    assert cache.cached == 2
+    prefetcher.close()
+    assert not os.path.exists(cache.path) and prefetcher.copied == 3
+
+
+def test_started_tasks_are_not_copied(sources, tmp_path):
+    cache = PrefetchCache(str(tmp_path / "nvme"), len(sources), depth=2)
+    assert cache.take(0, sources[0]) is None
+    cache.evict(0, sources[0])
+    prefetcher = Prefetcher(cache, list(enumerate(sources)), cache_hints=False)
+    prefetcher.start()
+    _wait_for(lambda: prefetcher.copied == 2)
+    assert sorted(os.listdir(cache.path)) == ["1-1.nd2", "2-2.nd2"]
+    prefetcher.close()
+
+
+def test_late_copies_are_dropped(sources, tmp_path):
+    cache = PrefetchCache(str(tmp_path / "nvme"), len(sources), depth=2)
+    assert cache.reserve(0)
+    # The worker starts on the source while the copy runs
+    assert cache.take(0, sources[0]) is None
+    partial = cache.local_path(0, sources[0]) + ".partial"
+    open(partial, "wb").close()
+    cache.complete(0, partial, sources[0])
+    assert os.listdir(cache.path) == [] and cache.cached == 0
+    assert not cache.reserve(0)
+
+
+def test_failed_copies_fall_back_to_the_source(sources, tmp_path):
+    cache = PrefetchCache(str(tmp_path / "nvme"), len(sources), depth=2)
+    os.remove(sources[0])
+    prefetcher = Prefetcher(cache, list(enumerate(sources[:2])), cache_hints=False)
+    prefetcher.start()
+    _wait_for(lambda: prefetcher.copied == 1)
+    prefetcher.close()
+    assert cache.take(0, sources[0]) is None and cache.cached == 1
+
+
+class _Recorder:
+    """Throttle stand-in recording the reads charged to it."""
+
+    def __init__(self):
+        self.charged = []
+
+    def read_chunk(self):
+        return 256
+
+    def read(self, n_bytes):
+        self.charged.append(n_bytes)
+
+
+def test_copies_are_charged_to_the_read_limit(sources, tmp_path):
+    cache = PrefetchCache(str(tmp_path / "nvme"), 1)
+    throttle = _Recorder()
+    prefetcher = Prefetcher(
+        cache, [(0, sources[0])], threads=1, cache_hints=False, throttle=throttle
+    )
+    prefetcher.start()
+    _wait_for(lambda: prefetcher.copied == 1)
+    prefetcher.close()
+    # In chunks of the limit, the last one no larger than the rest of the file
+    assert throttle.charged == [256, 256, 256, 232, 0]
+
+
+def test_process_folder_reads_local_copies(monkeypatch, fake_tiff, tmp_path):
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    folder = tmp_path / "share"
+    folder.mkdir()
+    for i in range(3):
+        tifffile.imwrite(folder / f"{i}.tif", np.ones((5, 4, 8), np.uint16))
+    # Let the prefetcher copy every file before the first one is read
+    start = Prefetcher.start
+
+    def start_and_wait(self):
+        start(self)
+        _wait_for(lambda: self.copied == 3)
+
+    monkeypatch.setattr(Prefetcher, "start", start_and_wait)
+    read = []
+    image_reader = compression_tool.ImageReader
+
+    def record(path, *args, **kwargs):
+        read.append(path)
+        return image_reader(path, *args, **kwargs)
+
+    monkeypatch.setattr(compression_tool, "ImageReader", record)
+    # The copies were paced by the prefetcher
+    paced = []
+    monkeypatch.setattr("jetraw_tools.image_reader.throttle_read_file", paced.append)
+
+    tool = CompressionTool(
+        identifier="cam",
+        ncores=1,
+        backend="threads",
+        prefetch_dir=str(tmp_path / "nvme"),
+    )
+    tool.process_folder(
+        str(folder), "compress", ".tif", False, target_folder=str(tmp_path / "out")
+    )
+    assert len(read) == 3
+    assert all(path.startswith(str(tmp_path / "nvme")) for path in read)
+    assert paced == []
+    assert sorted(os.listdir(folder)) == ["0.tif", "1.tif", "2.tif"]
+    assert os.listdir(tmp_path / "nvme") == []
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from jetraw_tools import resources
+from jetraw_tools.resources import (
+    cgroup_cpu_limit,
+    cgroup_memory_limit,
+    detect_resources,
+    memory_bound_workers,
+)
+from jetraw_tools.utils import cores_validation
+
+GB = 1024**3
+
+
+@pytest.fixture
+def cgroup_v2(tmp_path):
+    root = tmp_path / "cgroup"
+    (root / "kubepods" / "pod1").mkdir(parents=True)
+    proc = tmp_path / "proc_cgroup"
+    proc.write_text("0::/kubepods/pod1\n")
+    return root, proc
+
+
+@pytest.fixture
+def cgroup_v1(tmp_path):
+    root = tmp_path / "cgroup"
+    (root / "cpu,cpuacct" / "slurm" / "job1").mkdir(parents=True)
+    (root / "memory" / "slurm" / "job1").mkdir(parents=True)
+    proc = tmp_path / "proc_cgroup"
+    proc.write_text("4:memory:/slurm/job1\n3:cpu,cpuacct:/slurm/job1\n")
+    return root, proc
+
+
+def test_cgroup_v2_limits(cgroup_v2):
+    root, proc = cgroup_v2
+    (root / "kubepods" / "pod1" / "cpu.max").write_text("800000 100000\n")
+    (root / "kubepods" / "pod1" / "memory.max").write_text(str(32 * GB))
+    assert cgroup_cpu_limit(str(root), str(proc)) == 8
+    assert cgroup_memory_limit(str(root), str(proc)) == 32 * GB
+
+
+def test_cgroup_v2_unlimited(cgroup_v2):
+    root, proc = cgroup_v2
+    (root / "kubepods" / "pod1" / "cpu.max").write_text("max 100000\n")
+    (root / "kubepods" / "pod1" / "memory.max").write_text("max\n")
+    assert cgroup_cpu_limit(str(root), str(proc)) is None
+    assert cgroup_memory_limit(str(root), str(proc)) is None
+
+
+def test_cgroup_v1_limits(cgroup_v1):
+    root, proc = cgroup_v1
+    job = root / "cpu,cpuacct" / "slurm" / "job1"
+    (job / "cpu.cfs_quota_us").write_text("250000")
+    (job / "cpu.cfs_period_us").write_text("100000")
+    (root / "memory" / "slurm" / "job1" / "memory.limit_in_bytes").write_text(
+        str(8 * GB)
+    )
+    assert cgroup_cpu_limit(str(root), str(proc)) == 2.5
+    assert cgroup_memory_limit(str(root), str(proc)) == 8 * GB
+
+
+def test_cgroup_v1_unlimited(cgroup_v1):
+    root, proc = cgroup_v1
+    job = root / "cpu,cpuacct" / "slurm" / "job1"
+    (job / "cpu.cfs_quota_us").write_text("-1")
+    (job / "cpu.cfs_period_us").write_text("100000")
+    (root / "memory" / "slurm" / "job1" / "memory.limit_in_bytes").write_text(
+        "9223372036854771712"
+    )
+    assert cgroup_cpu_limit(str(root), str(proc)) is None
+    assert cgroup_memory_limit(str(root), str(proc)) is None
+
+
+def test_detect_resources_applies_quota(cgroup_v2, monkeypatch):
+    root, proc = cgroup_v2
+    (root / "kubepods" / "pod1" / "cpu.max").write_text("150000 100000\n")
+    (root / "kubepods" / "pod1" / "memory.max").write_text(str(1 * GB))
+    monkeypatch.setattr("os.cpu_count", lambda: 128)
+    monkeypatch.setattr(
+        "os.sched_getaffinity", lambda pid: set(range(64)), raising=False
+    )
+    resources = detect_resources(str(root), str(proc))
+    assert resources["host_cpus"] == 128
+    assert resources["cpus"] == 2
+    assert resources["memory_limit"] <= 1 * GB
+    assert resources["memory_budget"] < resources["memory_limit"]
+
+
+def test_missing_cgroup_files(tmp_path):
+    assert cgroup_cpu_limit(str(tmp_path), str(tmp_path / "none")) is None
+    assert cgroup_memory_limit(str(tmp_path), str(tmp_path / "none")) is None
+
+
+def test_memory_bound_workers():
+    assert memory_bound_workers(8, 2 * GB, 32 * GB) == 8
+    assert memory_bound_workers(8, 4 * GB, 16 * GB) == 2
+    assert memory_bound_workers(8, 64 * GB, 16 * GB) == 1
+    assert memory_bound_workers(8, 4 * GB, None) == 8
+
+
+def test_cores_validation_uses_detected_cpus():
+    resources = {"cpus": 8}
+    assert cores_validation(0, resources)[:2] == ("OK", 7)
+    assert cores_validation(12, resources)[0] == "WARN"
+    assert cores_validation(17, resources)[0] == "ERROR"
+
+
+def test_current_rss_reads_statm(tmp_path):
+    statm = tmp_path / "statm"
+    statm.write_text("1000 250 30 4 0 80 0\n")
+    assert resources.current_rss(str(statm)) == 250 * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_current_rss_falls_back_to_peak(tmp_path):
+    assert resources.current_rss(str(tmp_path / "missing")) == resources.peak_rss()
+
+
+def test_cgroup_v2_parent_limits(cgroup_v2):
+    root, proc = cgroup_v2
+    # Only the parent slice is limited, the pod itself is not
+    (root / "kubepods" / "cpu.max").write_text("400000 100000\n")
+    (root / "kubepods" / "memory.max").write_text(str(16 * GB))
+    (root / "kubepods" / "pod1" / "cpu.max").write_text("max 100000\n")
+    (root / "kubepods" / "pod1" / "memory.max").write_text("max\n")
+    assert cgroup_cpu_limit(str(root), str(proc)) == 4
+    assert cgroup_memory_limit(str(root), str(proc)) == 16 * GB
+
+    # The tightest limit applies
+    (root / "kubepods" / "pod1" / "cpu.max").write_text("200000 100000\n")
+    (root / "memory.max").write_text(str(64 * GB))
+    assert cgroup_cpu_limit(str(root), str(proc)) == 2
+    assert cgroup_memory_limit(str(root), str(proc)) == 16 * GB
+
+
+def test_cgroup_v1_parent_limits(cgroup_v1):
+    root, proc = cgroup_v1
+    # A job-level limit on the SLURM cgroup above the job step
+    slurm = root / "cpu,cpuacct" / "slurm"
+    (slurm / "cpu.cfs_quota_us").write_text("300000")
+    (slurm / "cpu.cfs_period_us").write_text("100000")
+    (root / "memory" / "slurm" / "memory.limit_in_bytes").write_text(str(4 * GB))
+    assert cgroup_cpu_limit(str(root), str(proc)) == 3
+    assert cgroup_memory_limit(str(root), str(proc)) == 4 * GB
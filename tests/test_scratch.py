@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, scratch, utils
+from jetraw_tools.commit import OutputCommitter
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.scratch import ScratchArea, ScratchMover, run_staged
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(scratch, "POLL_INTERVAL", 0.01)
+
+
+def _write(folder: str, name: str, size: int) -> int:
+    with open(os.path.join(folder, name), "wb") as f:
+        f.write(b"\1" * size)
+    return 0
+
+
+def test_committed_outputs_are_counted_until_moved(tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"), quota=0)
+    target = tmp_path / "out"
+    target.mkdir()
+
+    run_staged(area, 0, str(target), lambda staging: _write(staging, "a.p.tiff", 100))
+    run_staged(area, 1, str(target), lambda staging: _write(staging, "b.p.tiff", 50))
+    assert area.used == 150
+    assert sorted(os.listdir(area.path)) == [
+        f"ready-{os.getpid()}-0",
+        f"ready-{os.getpid()}-1",
+    ]
+
+    mover = ScratchMover(area, cache_hints=False)
+    mover.start()
+    assert mover.finish() == 0
+    assert sorted(os.listdir(target)) == ["a.p.tiff", "b.p.tiff"]
+    assert area.used == 0 and (mover.moved, mover.moved_bytes) == (2, 150)
+    assert not os.path.exists(area.path)
+
+
+def test_failed_tasks_leave_nothing_behind(tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"))
+
+    def fail(staging):
+        _write(staging, "a.p.tiff", 10)
+        return 1
+
+    assert run_staged(area, 0, str(tmp_path), fail) == 1
+    with pytest.raises(ZeroDivisionError):
+        run_staged(area, 1, str(tmp_path), lambda staging: 1 / 0)
+    # A task whose worker was killed before it finished
+    area.stage(2)
+    assert os.listdir(area.path) == [f"partial-{os.getpid()}-2"]
+    assert ScratchMover(area).finish() == 0
+    assert area.used == 0 and not os.path.exists(area.path)
+
+
+def test_workers_wait_for_the_quota(tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"), quota=100)
+    run_staged(area, 0, str(tmp_path), lambda staging: _write(staging, "a", 100))
+    started = threading.Event()
+    thread = threading.Thread(target=lambda: started.set() or area.stage(1))
+    thread.start()
+    started.wait()
+    time.sleep(0.1)
+    assert thread.is_alive()
+    area.release(100)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_copies_appear_complete_on_other_filesystems(monkeypatch, tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"), quota=0)
+    target = tmp_path / "out"
+    target.mkdir()
+    renames = []
+    rename = os.rename
+
+    def cross_device(src, dst):
+        if str(dst).startswith(str(target)):
+            raise OSError(18, "Invalid cross-device link")
+        rename(src, dst)
+
+    monkeypatch.setattr(scratch.os, "rename", cross_device)
+    monkeypatch.setattr(scratch.os, "replace", lambda *args: renames.append(args))
+    run_staged(area, 0, str(target), lambda staging: _write(staging, "a.p.tiff", 64))
+
+    mover = ScratchMover(area, cache_hints=False)
+    assert mover.finish() == 0
+    assert [os.path.basename(dst) for _, dst in renames] == ["a.p.tiff"]
+    assert os.path.getsize(renames[0][0]) == 64
+
+
+def test_sources_are_removed_only_after_the_move(tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"), quota=0)
+    source = tmp_path / "a.tif"
+    source.write_bytes(b"\0" * 10)
+    removed = []
+    run_staged(
+        area,
+        0,
+        str(tmp_path / "missing"),
+        lambda staging: _write(staging, "a.p.tiff", 10),
+        source=str(source),
+        output="a.p.tiff",
+    )
+
+    mover = ScratchMover(
+        area, cache_hints=False, remove_source=lambda *args: removed.append(args)
+    )
+    assert mover.finish() == 1
+    # The outputs that could not be moved stay in the scratch directory,
+    # without holding on to the quota
+    assert removed == [] and source.exists() and area.used == 0
+    assert os.listdir(area.path) == [f"ready-{os.getpid()}-0"]
+    assert sorted(os.listdir(area.path + f"/ready-{os.getpid()}-0")) == [
+        ".move.json",
+        "a.p.tiff",
+    ]
+
+
+def test_failed_moves_do_not_block_the_workers(monkeypatch, tmp_path):
+    area = ScratchArea(str(tmp_path / "scratch"), quota=100)
+
+    def fail(self, path, partial):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(ScratchMover, "_move_file", fail)
+    mover = ScratchMover(area, cache_hints=False)
+    mover.start()
+    failed = 0
+    for i in range(3):
+        write = lambda staging: _write(staging, f"{i}.p.tiff", 100)
+        failed += run_staged(area, i, str(tmp_path), write)
+    # Each task fails, either staging or moving its outputs, and none hangs
+    assert failed + mover.finish() == 3 and area.used == 0
+
+    # Workers give up instead of waiting for outputs that are never moved
+    area = ScratchArea(str(tmp_path / "scratch"), quota=100)
+    run_staged(area, 0, str(tmp_path), lambda staging: _write(staging, "a", 100))
+    area.release(0, failed=True)
+    with pytest.raises(OSError):
+        area.stage(1)
+    assert run_staged(area, 1, str(tmp_path), lambda staging: 0) == 1
+
+
+@pytest.mark.parametrize("sync_every", [1, 2])
+def test_moved_outputs_follow_sync_every(sync_every, monkeypatch, tmp_path):
+    synced = []
+    monkeypatch.setattr(os, "fdatasync", synced.append, raising=False)
+    monkeypatch.setattr(os, "fsync", synced.append)
+    area = ScratchArea(str(tmp_path / "scratch"), quota=0)
+    target = tmp_path / "out"
+    target.mkdir()
+    indexed = []
+    committer = None
+    if sync_every != 1:
+        committer = OutputCommitter(
+            sync_every,
+            lambda *args: None,
+            cache_hints=False,
+            on_commit=lambda *args: indexed.append(args),
+        )
+    for i in range(3):
+        write = lambda staging: _write(staging, f"{i}.p.tiff", 10)
+        run_staged(area, i, str(target), write, output=f"{i}.p.tiff", key=str(i))
+    mover = ScratchMover(
+        area,
+        cache_hints=False,
+        on_moved=lambda *args: indexed.append(args),
+        committer=committer,
+    )
+    assert mover.finish() == 0
+    if committer is not None:
+        # The last output waits for the end of the run
+        assert len([n for n in os.listdir(target) if n.startswith(".partial-")]) == 1
+        assert committer.flush() == 0 and committer.batches == 2
+    assert sorted(os.listdir(target)) == ["0.p.tiff", "1.p.tiff", "2.p.tiff"]
+    assert sorted(key for key, _ in indexed) == ["0", "1", "2"]
+    # Each output, and its directory by batch
+    assert len(synced) == 3 + {1: 3, 2: 2}[sync_every]
+
+
+def test_process_folder_stages_outputs(monkeypatch, fake_tiff, tmp_path):
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    # The fake library writes no file
+    jetraw_open = fake_tiff.jetraw_tiff_open
+
+    def write_on_open(cpath, *args):
+        if args[-1] == b"w":
+            open(cpath, "wb").write(b"\0" * 64)
+        return jetraw_open(cpath, *args)
+
+    monkeypatch.setattr(fake_tiff, "jetraw_tiff_open", write_on_open)
+    folder = tmp_path / "input"
+    folder.mkdir()
+    for i in range(3):
+        tifffile.imwrite(folder / f"{i}.tif", np.ones((5, 4, 8), np.uint16))
+    staged = []
+    process_image = CompressionTool.process_image
+
+    def record(self, folder_path, output_folder, *args, **kwargs):
+        staged.append(output_folder)
+        return process_image(self, folder_path, output_folder, *args, **kwargs)
+
+    monkeypatch.setattr(CompressionTool, "process_image", record)
+
+    tool = CompressionTool(
+        identifier="cam",
+        ncores=2,
+        backend="threads",
+        scratch_dir=str(tmp_path / "nvme"),
+    )
+    tool.process_folder(
+        str(folder),
+        "compress",
+        ".tif",
+        False,
+        remove_source=True,
+        target_folder=str(tmp_path / "out"),
+    )
+    assert all(path.startswith(str(tmp_path / "nvme")) for path in staged)
+    assert sorted(os.listdir(tmp_path / "out")) == [
+        "0.ome.p.tiff",
+        "1.ome.p.tiff",
+        "2.ome.p.tiff",
+    ]
+    assert os.listdir(folder) == [] and os.listdir(tmp_path / "nvme") == []
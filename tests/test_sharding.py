@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import compression_tool, sharding, utils
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.sharding import (
+    OutputIndex,
+    ShardLayout,
+    index_key,
+    next_slot,
+    parse_layout,
+)
+
+
+@pytest.fixture(autouse=True)
+def closed_part():
+    """Start every test without an open index part."""
+    yield
+    if "file" in sharding._part:
+        sharding._part["file"].close()
+    sharding._part.clear()
+
+
+@pytest.mark.parametrize(
+    "spec, layout",
+    [
+        (None, None),
+        ("hash", ShardLayout("hash", 2)),
+        ("hash:3", ShardLayout("hash", 3)),
+        ("files", ShardLayout("files", 1000)),
+        ("files:10", ShardLayout("files", 10)),
+    ],
+)
+def test_parse_layout(spec, layout):
+    assert parse_layout(spec) == layout
+
+
+@pytest.mark.parametrize("spec", ["flat", "hash:0", "hash:41", "files:x", "files:-1"])
+def test_parse_layout_rejects_malformed(spec):
+    with pytest.raises(ValueError):
+        parse_layout(spec)
+
+
+def test_shards():
+    layout = ShardLayout("hash", 2)
+    assert layout.shard(0, "a.nd2") == layout.shard(7, "a.nd2")
+    assert len(layout.shard(0, "a.nd2")) == 2
+    layout = ShardLayout("files", 2, base=3)
+    assert [layout.shard(i, "a.nd2") for i in range(4)] == [
+        "000001",
+        "000002",
+        "000002",
+        "000003",
+    ]
+    assert index_key("a.nd2") == "a.nd2"
+    assert index_key("a.nd2", 4) == "a.nd2#P004"
+
+
+def test_numbering_continues_after_the_highest_shard():
+    assert next_slot({}, 2) == 0
+    assert next_slot({"a.tif": "000000/a.p.tiff"}, 2) == 1
+    # Cut short after committing outputs 0, 1 and 5 of 6
+    entries = {
+        "0.tif": os.path.join("000000", "0.p.tiff"),
+        "1.tif": os.path.join("000000", "1.p.tiff"),
+        "5.tif": os.path.join("000002", "5.p.tiff"),
+    }
+    assert next_slot(entries, 2) == 5
+    entries["4.tif"] = os.path.join("000002", "4.p.tiff")
+    assert next_slot(entries, 2) == 6
+    assert next_slot({"a.tif": os.path.join("ab", "a.p.tiff")}, 2) == 0
+
+
+def test_index_parts_are_merged(tmp_path):
+    index = OutputIndex(str(tmp_path))
+    assert index.load() == {}
+    index.append("a.tif", str(tmp_path / "ab" / "a.p.tiff"))
+    # Another process, cut short while writing
+    with open(tmp_path / "index.d" / "1.tsv", "w") as f:
+        f.write("b.tif\tcd/b.p.tiff\nc.tif")
+    assert index.load() == {"a.tif": "ab/a.p.tiff", "b.tif": "cd/b.p.tiff"}
+
+    assert index.merge() == (2, 2)
+    assert os.listdir(tmp_path) == ["index.tsv"]
+    index.append("d.tif", str(tmp_path / "ef" / "d.p.tiff"))
+    assert index.merge() == (3, 1)
+    assert index.load()["d.tif"] == "ef/d.p.tiff"
+    assert index.merge() == (3, 0)
+
+
+def _make_folder(monkeypatch, fake_tiff, tmp_path, n_files: int = 4):
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    jetraw_open = fake_tiff.jetraw_tiff_open
+
+    def write_on_open(cpath, *args):
+        # The fake library writes no file
+        if args[-1] == b"w":
+            open(cpath, "wb").write(b"\0" * 64)
+        return jetraw_open(cpath, *args)
+
+    monkeypatch.setattr(fake_tiff, "jetraw_tiff_open", write_on_open)
+    folder = tmp_path / "input"
+    folder.mkdir(exist_ok=True)
+    for i in range(n_files):
+        tifffile.imwrite(folder / f"{i}.tif", np.ones((5, 4, 8), np.uint16))
+    return folder
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"sync_every": 0}, {"scratch_dir": "scratch"}],
+    ids=["immediate", "deferred", "staged"],
+)
+def test_process_folder_shards_outputs(options, monkeypatch, fake_tiff, tmp_path):
+    folder = _make_folder(monkeypatch, fake_tiff, tmp_path)
+    if "scratch_dir" in options:
+        os.makedirs(tmp_path / "scratch")
+        options = {"scratch_dir": str(tmp_path / "scratch")}
+    out = tmp_path / "out"
+
+    tool = CompressionTool(
+        identifier="cam", ncores=1, backend="threads", shard_layout="hash", **options
+    )
+    tool.process_folder(str(folder), "compress", ".tif", False, target_folder=str(out))
+    entries = OutputIndex(str(out)).load()
+    assert sorted(entries) == ["0.tif", "1.tif", "2.tif", "3.tif"]
+    layout = ShardLayout("hash", 2)
+    for image_file, output in entries.items():
+        name = image_file.replace(".tif", ".ome.p.tiff")
+        assert output == os.path.join(layout.shard(0, image_file), name)
+        assert os.path.isfile(out / output)
+    assert "index.d" not in os.listdir(out)
+
+
+def test_processed_inputs_are_skipped_from_the_index(monkeypatch, fake_tiff, tmp_path):
+    folder = _make_folder(monkeypatch, fake_tiff, tmp_path, n_files=3)
+    out = tmp_path / "out"
+    tool = CompressionTool(
+        identifier="cam", ncores=1, backend="threads", shard_layout="files:2"
+    )
+    tool.process_folder(str(folder), "compress", ".tif", False, target_folder=str(out))
+    assert sorted(os.listdir(out)) == ["000000", "000001", "index.tsv"]
+
+    # New inputs are numbered after the indexed outputs
+    tifffile.imwrite(folder / "3.tif", np.ones((5, 4, 8), np.uint16))
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(
+        compression_tool.os,
+        "listdir",
+        lambda path: listed.append(path) or listdir(path),
+    )
+    tool.process_folder(str(folder), "compress", ".tif", False, target_folder=str(out))
+    assert str(out) not in listed
+    entries = OutputIndex(str(out)).load()
+    assert len(entries) == 4
+    assert entries["3.tif"] == os.path.join("000001", "3.ome.p.tiff")
+    assert len(listdir(out / "000001")) == 2
+
+
+def test_interrupted_runs_do_not_overfill_shards(monkeypatch, fake_tiff, tmp_path):
+    folder = _make_folder(monkeypatch, fake_tiff, tmp_path, n_files=6)
+    out = tmp_path / "out"
+    # A run cut short after committing outputs 0 and 5 of 6
+    index = OutputIndex(str(out))
+    for task in (0, 5):
+        shard = out / f"{task // 2:06d}"
+        shard.mkdir(parents=True)
+        open(shard / f"{task}.ome.p.tiff", "wb").close()
+        index.append(f"{task}.tif", str(shard / f"{task}.ome.p.tiff"))
+    index.merge()
+
+    tool = CompressionTool(
+        identifier="cam", ncores=1, backend="threads", shard_layout="files:2"
+    )
+    tool.process_folder(str(folder), "compress", ".tif", False, target_folder=str(out))
+    entries = OutputIndex(str(out)).load()
+    assert len(entries) == 6
+    shards = [output.split(os.sep)[0] for output in entries.values()]
+    assert max(shards.count(shard) for shard in shards) == 2
+    # The new outputs continue after output 5
+    assert len(os.listdir(out / "000002")) == 2
+    assert "000001" not in os.listdir(out)
@@ -0,0 +1,78 @@
+import multiprocessing
+import queue
+
+import numpy as np
+import pytest
+
+from jetraw_tools.shm_transport import FrameRing
+
+
+def _produce(ring: FrameRing, n_frames: int) -> None:
+    for index in range(n_frames):
+        slot = ring.acquire()
+        ring.frame(slot)[:] = index
+        ring.publish(slot, meta=index)
+    ring.finish()
+    ring.close()
+
+
+def _consume(ring: FrameRing, results) -> None:
+    while True:
+        frame = ring.get()
+        if frame is None:
+            break
+        results.put((frame.meta, int(frame.array.sum())))
+        ring.release(frame.slot)
+    ring.close()
+
+
+def test_put_get_roundtrip():
+    with FrameRing(2, (4, 8)) as ring:
+        image = np.arange(32, dtype=np.uint16).reshape(4, 8)
+        ring.put(image, meta={"page": 3})
+        frame = ring.get(timeout=5)
+        assert frame.meta == {"page": 3}
+        np.testing.assert_array_equal(frame.array, image)
+        ring.release(frame.slot)
+
+
+def test_smaller_frames_fit_in_a_slot():
+    with FrameRing(1, (4, 8)) as ring:
+        ring.put(np.full((2, 3), 7, dtype=np.uint16))
+        frame = ring.get(timeout=5)
+        assert frame.array.shape == (2, 3)
+        assert np.all(frame.array == 7)
+        ring.release(frame.slot)
+        with pytest.raises(ValueError):
+            ring.put(np.zeros((5, 8), dtype=np.uint16))
+
+
+def test_full_ring_blocks_until_release():
+    with FrameRing(2, (2, 2)) as ring:
+        ring.put(np.zeros((2, 2), dtype=np.uint16))
+        ring.put(np.ones((2, 2), dtype=np.uint16))
+        with pytest.raises(queue.Empty):
+            ring.acquire(timeout=0.05)
+        frame = ring.get(timeout=5)
+        ring.release(frame.slot)
+        assert ring.acquire(timeout=5) == frame.slot
+
+
+@pytest.mark.parametrize(
+    "start_method",
+    [m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()],
+)
+def test_frames_cross_processes_without_pickling_arrays(start_method):
+    ctx = multiprocessing.get_context(start_method)
+    n_frames = 20
+    with FrameRing(3, (64, 64), ctx=ctx) as ring:
+        results = ctx.Queue()
+        producer = ctx.Process(target=_produce, args=(ring, n_frames))
+        consumer = ctx.Process(target=_consume, args=(ring, results))
+        producer.start()
+        consumer.start()
+        received = sorted(results.get(timeout=30) for _ in range(n_frames))
+        producer.join(30)
+        consumer.join(30)
+    assert received == [(index, index * 64 * 64) for index in range(n_frames)]
+    assert producer.exitcode == 0 and consumer.exitcode == 0
@@ -0,0 +1,134 @@
+import nd2
+import numpy as np
+import pytest
+from ome_types import model
+
+from jetraw_tools.commit import partial_path
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.image_reader import ImageReader, count_positions
+
+N_POSITIONS = 3
+
+
+class _FakeND2File:
+    """ND2 file with T=2, P=3, Y=4, X=8 whose pixels hold their position."""
+
+    sizes = {"T": 2, "P": N_POSITIONS, "Y": 4, "X": 8}
+    read_positions: list = []
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+    def asarray(self, position=None):
+        data = np.broadcast_to(
+            np.arange(N_POSITIONS, dtype=np.uint16)[None, :, None, None],
+            (2, N_POSITIONS, 4, 8),
+        )
+        _FakeND2File.read_positions.append(position)
+        if position is None:
+            return data.copy()
+        return data[:, position : position + 1].copy()
+
+    def ome_metadata(self):
+        pixels = dict(
+            dimension_order="XYCZT",
+            size_c=1,
+            size_t=2,
+            size_x=8,
+            size_y=4,
+            size_z=1,
+            type="uint16",
+            metadata_only=True,
+        )
+        return model.OME(
+            images=[
+                model.Image(id=f"Image:{p}", name=f"Well {p}", pixels=pixels)
+                for p in range(N_POSITIONS)
+            ]
+        )
+
+    # Time is the outer loop
+    loop_indices = tuple({"T": t, "P": p} for t in range(2) for p in range(N_POSITIONS))
+
+    def unstructured_metadata(self):
+        metadata = {"ImageTextInfoLV": {"Description": "96-well plate"}}
+        for frame, indices in enumerate(self.loop_indices):
+            metadata[f"ImageMetadataSeqLV|{frame}"] = {f"Frame{frame}": indices["P"]}
+        return metadata
+
+
+@pytest.fixture
+def fake_nd2(monkeypatch, tmp_path):
+    monkeypatch.setattr(nd2, "ND2File", _FakeND2File)
+    monkeypatch.setattr(_FakeND2File, "read_positions", [])
+    folder = tmp_path / "plate"
+    folder.mkdir()
+    (folder / "plate.nd2").write_bytes(b"")
+    return folder
+
+
+def test_count_positions(fake_nd2):
+    assert count_positions(str(fake_nd2 / "plate.nd2")) == N_POSITIONS
+
+
+def test_reader_extracts_one_position_and_its_metadata(fake_nd2):
+    reader = ImageReader(str(fake_nd2 / "plate.nd2"), ".nd2", position=1)
+    image, metadata = reader.read_image()
+    assert image.shape == (2, 4, 8)
+    assert np.all(image == 1)
+    assert [image.name for image in metadata.images] == ["Well 1"]
+    assert _FakeND2File.read_positions == [1]
+    # Only the frames of this position are annotated
+    annotation = list(metadata.structured_annotations)[-1].value.ms
+    assert {m.k: m.value for m in annotation} == {
+        "Description": "96-well plate",
+        "Frame1": "1",
+        "Frame4": "1",
+    }
+
+
+def test_position_tasks_expand_multi_position_files(fake_nd2):
+    tool = CompressionTool(identifier="cam", split_axis="P")
+    tasks, sizes = tool._position_tasks(str(fake_nd2), ["plate.nd2"], [300])
+    assert tasks == [(0, "plate.nd2", 0), (1, "plate.nd2", 1), (2, "plate.nd2", 2)]
+    assert sizes == [100, 100, 100]
+
+
+def test_process_folder_writes_one_file_per_position(fake_nd2, monkeypatch, tmp_path):
+    written = {}
+
+    def compress_image(self, img_map, target_file, metadata, **kwargs):
+        written[target_file] = (img_map, metadata)
+        return True
+
+    monkeypatch.setattr(CompressionTool, "compress_image", compress_image)
+    tool = CompressionTool(
+        identifier="cam", ncores=2, backend="threads", split_axis="P"
+    )
+    output = tmp_path / "out"
+    tool.process_folder(str(fake_nd2), "compress", ".nd2", target_folder=str(output))
+
+    # Written under a temporary name, then renamed
+    expected = {
+        partial_path(str(output / f"plate_P{p:03d}.ome.p.tiff")): p
+        for p in range(N_POSITIONS)
+    }
+    assert set(written) == set(expected)
+    for target_file, position in expected.items():
+        image, metadata = written[target_file]
+        assert image.shape == (2, 4, 8) and np.all(image == position)
+        assert [image.name for image in metadata.images] == [f"Well {position}"]
+
+
+def test_invalid_split_axis():
+    with pytest.raises(ValueError):
+        CompressionTool(split_axis="T")
@@ -0,0 +1,151 @@
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+import tifffile
+
+from jetraw_tools import throttle
+from jetraw_tools.image_reader import ImageReader
+from jetraw_tools.throttle import (
+    IOThrottle,
+    TokenBucket,
+    in_windows,
+    install_throttle,
+    parse_hours,
+    throttle_read_file,
+)
+from jetraw_tools.tiff_writer import TiffWriter_5D, metadata_writer
+
+MB = 1024**2
+
+
+class _Recorder:
+    """Throttle stand-in recording the bytes reported to it."""
+
+    def __init__(self):
+        self.read_bytes = []
+        self.written_bytes = []
+
+    def read(self, n_bytes):
+        self.read_bytes.append(n_bytes)
+
+    def read_chunk(self):
+        return 4096
+
+    def write(self, n_bytes):
+        self.written_bytes.append(n_bytes)
+
+
+@pytest.fixture
+def recorder():
+    recorder = _Recorder()
+    install_throttle(recorder)
+    yield recorder
+    install_throttle(None)
+
+
+def test_parse_hours():
+    assert parse_hours(None) == []
+    assert parse_hours("08:00-12:30, 22:00-06:00") == [(480, 750), (1320, 360)]
+    for text in ("8-12", "08:00", "25:00-26:00", "08:61-09:00"):
+        with pytest.raises(ValueError):
+            parse_hours(text)
+
+
+def test_windows_may_wrap_past_midnight():
+    windows = parse_hours("22:00-06:00")
+    assert in_windows(windows, 23 * 60) and in_windows(windows, 60)
+    assert not in_windows(windows, 12 * 60)
+    assert not in_windows(windows, 6 * 60)
+
+
+def test_limits_only_apply_in_their_windows():
+    noon = time.mktime((2026, 10, 19, 12, 0, 0, 0, 0, -1))
+    assert IOThrottle(read_rate=MB).active(noon)
+    assert IOThrottle(read_rate=MB, hours="08:00-20:00").active(noon)
+    assert not IOThrottle(read_rate=MB, hours="20:00-08:00").active(noon)
+
+
+def test_bucket_allows_a_burst_then_holds_the_rate():
+    bucket = TokenBucket(10 * MB)
+    assert bucket.consume(10 * MB) == 0.0
+    start = time.monotonic()
+    bucket.consume(2 * MB)
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+
+def _consume(bucket, n_chunks, chunk):
+    for _ in range(n_chunks):
+        bucket.consume(chunk)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork"
+)
+def test_bucket_is_shared_by_processes():
+    context = multiprocessing.get_context("fork")
+    bucket = TokenBucket(4 * MB, context=context)
+    bucket.consume(4 * MB)
+    start = time.monotonic()
+    children = [
+        context.Process(target=_consume, args=(bucket, 4, MB // 2)) for _ in range(2)
+    ]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+    # 4 MB in total at 4 MB/s, whatever the number of processes
+    assert time.monotonic() - start == pytest.approx(1.0, abs=0.3)
+
+
+def test_image_reader_reports_bytes_read(recorder, tmp_path):
+    data = np.random.default_rng(0).integers(0, 16, (5, 64, 64), np.uint16)
+    path = tmp_path / "stack.tif"
+    tifffile.imwrite(path, data, compression="zlib")
+    ImageReader(str(path), ".tif", read_metadata=False).read_image()
+    # The compressed file is smaller than the pixels it decodes to, and read
+    # in chunks no larger than the bucket allows
+    assert sum(recorder.read_bytes) == path.stat().st_size
+    assert path.stat().st_size < data.nbytes
+    assert max(recorder.read_bytes) == 4096
+
+
+def test_whole_file_reads_are_paced(tmp_path):
+    path = tmp_path / "large.tif"
+    path.write_bytes(b"\0" * 8 * MB)
+    limited = IOThrottle(read_rate=4 * MB)
+    assert limited.read_chunk() == 4 * MB
+    assert IOThrottle(write_rate=MB).read_chunk() == 0
+    install_throttle(limited)
+    try:
+        start = time.monotonic()
+        assert throttle_read_file(str(path)) == 8 * MB
+        elapsed = time.monotonic() - start
+    finally:
+        install_throttle(None)
+    # The first 4 MB fill the bucket, the next 4 MB wait for it
+    assert elapsed == pytest.approx(1.0, abs=0.3)
+    assert throttle_read_file(str(path)) == 0
+
+
+def test_writers_report_bytes_written(recorder, tmp_path):
+    path = tmp_path / "out.ome.p.tiff"
+    tifffile.imwrite(path, np.zeros((4, 8), np.uint16))
+    writer = TiffWriter_5D(str(path))
+    writer._throttle_written()
+    with open(path, "ab") as f:
+        f.write(b"\0" * 100)
+    writer._throttle_written()
+    assert recorder.written_bytes == [path.stat().st_size - 100, 100]
+
+    recorder.written_bytes.clear()
+    metadata_writer(str(path), {"a": 1}, ome_bool=True, as_json=True)
+    assert len(recorder.written_bytes) == 2 and all(recorder.written_bytes)
+
+
+def test_writer_skips_accounting_without_throttle(tmp_path, monkeypatch):
+    monkeypatch.setattr(throttle, "_throttle", {})
+    writer = TiffWriter_5D(str(tmp_path / "missing.p.tiff"))
+    writer._throttle_written()
+    assert writer._written == 0
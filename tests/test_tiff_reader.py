@@ -0,0 +1,124 @@
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from jetraw_tools.tiff_reader import TiffReader, imread
+
+
+def test_read_into_reuses_buffer(fake_tiff):
+    out = np.zeros((2, 4, 8), dtype=np.uint16)
+    with TiffReader("image.p.tiff") as reader:
+        assert reader.read_into(out, [1, 2]) is out
+        assert out[:, 0, 0].tolist() == [1, 2]
+        reader.read_into(out, [4, 3])
+    assert out[:, 0, 0].tolist() == [4, 3]
+    assert np.all(out == out[:, :1, :1])
+
+
+def test_read_into_single_page_2d(fake_tiff):
+    out = np.zeros((4, 8), dtype=np.uint16)
+    with TiffReader("image.p.tiff") as reader:
+        reader.read_into(out, 3)
+    assert np.all(out == 3)
+
+
+def test_read_into_strided_frames(fake_tiff):
+    buffer = np.zeros((6, 4, 8), dtype=np.uint16)
+    with TiffReader("image.p.tiff") as reader:
+        reader.read_into(buffer[::2], [1, 2, 3])
+    assert buffer[:, 0, 0].tolist() == [1, 0, 2, 0, 3, 0]
+
+
+def test_read_into_memmap(fake_tiff, tmp_path):
+    out = np.lib.format.open_memmap(
+        tmp_path / "frames.npy", mode="w+", dtype=np.uint16, shape=(5, 4, 8)
+    )
+    imread("image.p.tiff", out=out)
+    out.flush()
+    assert np.load(tmp_path / "frames.npy")[:, 0, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_read_into_shared_memory(fake_tiff):
+    shm = shared_memory.SharedMemory(create=True, size=2 * 4 * 8 * 2)
+    try:
+        out = np.ndarray((2, 4, 8), dtype=np.uint16, buffer=shm.buf)
+        imread("image.p.tiff", pages=range(2, 4), out=out)
+        view = np.ndarray((2, 4, 8), dtype=np.uint16, buffer=shm.buf)
+        assert view[:, 0, 0].tolist() == [2, 3]
+        del out, view
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@pytest.mark.parametrize(
+    "out, error",
+    [
+        (np.zeros((2, 4, 8), dtype=np.uint8), TypeError),
+        (np.zeros((2, 4, 8), dtype=np.int16).tolist(), TypeError),
+        (np.zeros((3, 4, 8), dtype=np.uint16), ValueError),
+        (np.zeros((4, 8), dtype=np.uint16), ValueError),
+        (np.zeros((2, 8, 4), dtype=np.uint16).transpose(0, 2, 1), ValueError),
+        (np.zeros((2, 4, 16), dtype=np.uint16)[:, :, ::2], ValueError),
+    ],
+)
+def test_read_into_validates_out(fake_tiff, out, error):
+    with TiffReader("image.p.tiff") as reader:
+        with pytest.raises(error):
+            reader.read_into(out, [0, 1])
+    assert "read_page" not in fake_tiff.calls
+
+
+def test_read_into_rejects_read_only(fake_tiff):
+    out = np.zeros((2, 4, 8), dtype=np.uint16)
+    out.flags.writeable = False
+    with TiffReader("image.p.tiff") as reader:
+        with pytest.raises(ValueError, match="writable"):
+            reader.read_into(out, [0, 1])
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_iter_pages_yields_pages_in_order(fake_tiff, prefetch):
+    with TiffReader("image.p.tiff") as reader:
+        pages = [int(f[0, 0]) for f in reader.iter_pages(prefetch=prefetch)]
+        assert pages == [0, 1, 2, 3, 4]
+        pages = [int(f[0, 0]) for f in reader.iter_pages(-1, 0, -2, prefetch)]
+        assert pages == [4, 2]
+
+
+def test_iter_pages_reuses_ring_buffers(fake_tiff):
+    fake_tiff.n_pages = 50
+    with TiffReader("image.p.tiff") as reader:
+        frames = {id(frame) for frame in reader.iter_pages(prefetch=2)}
+    assert len(frames) <= 3
+
+
+def test_iter_pages_stops_decoder_on_early_exit(fake_tiff):
+    fake_tiff.n_pages = 50
+    before = threading.active_count()
+    with TiffReader("image.p.tiff") as reader:
+        pages = reader.iter_pages(prefetch=4)
+        assert int(next(pages)[0, 0]) == 0
+        pages.close()
+        assert threading.active_count() == before
+    assert fake_tiff.calls["read_page"] <= 6
+
+
+def test_iter_pages_propagates_decode_errors(fake_tiff):
+    fake_tiff.bad_pages = {3}
+    seen = []
+    with TiffReader("image.p.tiff") as reader:
+        with pytest.raises(RuntimeError, match="page out of range"):
+            for frame in reader.iter_pages(prefetch=2):
+                seen.append(int(frame[0, 0]))
+    assert seen == [0, 1, 2]
+
+
+def test_iter_pages_validates_arguments(fake_tiff):
+    with TiffReader("image.p.tiff") as reader:
+        with pytest.raises(ValueError):
+            reader.iter_pages(prefetch=-1)
+        with pytest.raises(ValueError):
+            reader.iter_pages(step=0)
@@ -0,0 +1,244 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+import tifffile
+import numpy as np
+
+from jetraw_tools import compression_tool, utils, worker_pool
+from jetraw_tools.compression_tool import CompressionTool
+from jetraw_tools.worker_pool import (
+    RecyclePolicy,
+    TimeoutPolicy,
+    WorkerPool,
+    describe_reports,
+)
+
+START_METHODS = [
+    m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()
+]
+
+_state: dict = {}
+
+
+def _init(offset: int) -> None:
+    _state["offset"] = offset
+
+
+def _work(task):
+    if task == "crash":
+        os._exit(3)
+    if task == "hang":
+        time.sleep(60)
+    if isinstance(task, str) and task.startswith("hang-once:"):
+        # Hangs on the first attempt only, the marker survives the kill
+        marker = task.split(":", 1)[1]
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            time.sleep(60)
+        return 0, os.getpid()
+    return task + _state["offset"], os.getpid()
+
+
+def _run(pool: WorkerPool, tasks, sizes=None) -> list:
+    pool.start(len(tasks))
+    return list(pool.imap_unordered(tasks, sizes))
+
+
+@pytest.mark.parametrize("start_method", START_METHODS)
+def test_pool_runs_every_task_once(start_method):
+    pool = WorkerPool(
+        multiprocessing.get_context(start_method),
+        2,
+        _work,
+        initializer=_init,
+        initargs=(100,),
+        chunksize=3,
+    )
+    results = _run(pool, list(range(10)))
+    assert sorted(value for value, _ in results) == list(range(100, 110))
+    assert len(pool.reports) == 2
+    assert sum(report["tasks"] for report in pool.reports) == 10
+    assert all(report["exit"] == "finished" for report in pool.reports)
+
+
+@pytest.mark.parametrize(
+    "policy, tasks_per_worker",
+    [
+        (RecyclePolicy(max_tasks=2), 2),
+        (RecyclePolicy(max_bytes=300), 3),
+        (RecyclePolicy(max_rss=1), 1),
+    ],
+)
+def test_workers_are_recycled(policy, tasks_per_worker):
+    pool = WorkerPool(
+        multiprocessing.get_context(START_METHODS[0]),
+        2,
+        _work,
+        initializer=_init,
+        initargs=(0,),
+        policy=policy,
+        chunksize=4,
+    )
+    results = _run(pool, list(range(12)), [100] * 12)
+
+    assert sorted(value for value, _ in results) == list(range(12))
+    recycled = [r for r in pool.reports if r["exit"].startswith("recycled")]
+    # The last tasks may be shared by workers that do not reach the limit
+    assert len(recycled) >= 12 // tasks_per_worker - 1
+    assert all(report["tasks"] == tasks_per_worker for report in recycled)
+    assert all(report["tasks"] <= tasks_per_worker for report in pool.reports)
+    assert {pid for _, pid in results} == {r["pid"] for r in pool.reports}
+
+
+def test_crashed_worker_is_replaced():
+    pool = WorkerPool(
+        multiprocessing.get_context(START_METHODS[0]),
+        2,
+        _work,
+        initializer=_init,
+        initargs=(0,),
+        lost_result="lost",
+        chunksize=2,
+    )
+    results = _run(pool, [1, "crash", 2, 3, 4])
+
+    assert results.count("lost") == 1
+    assert sorted(value for value, _ in (r for r in results if r != "lost")) == [
+        1,
+        2,
+        3,
+        4,
+    ]
+    assert any(report["exit"].startswith("died") for report in pool.reports)
+
+
+def test_timeout_limits():
+    assert TimeoutPolicy().limit(1024**3, 1e-9) is None
+    fixed = TimeoutPolicy(seconds=10, seconds_per_gb=5)
+    assert fixed.limit(2 * 1024**3, None) == 20
+    straggler = TimeoutPolicy(straggler_factor=10)
+    assert straggler.limit(1024**3, None) is None
+    assert straggler.limit(1024**3, 1e-7) == pytest.approx(10 * 1e-7 * 1024**3)
+    # Never below the floor, and the smallest applicable limit wins
+    assert straggler.limit(100, 1e-7) == worker_pool.STRAGGLER_MIN_SECONDS
+    assert TimeoutPolicy(seconds=30, straggler_factor=10).limit(100, 1e-7) == 30
+
+
+def _timeout_pool(timeout: TimeoutPolicy) -> WorkerPool:
+    return WorkerPool(
+        multiprocessing.get_context(START_METHODS[0]),
+        2,
+        _work,
+        initializer=_init,
+        initargs=(0,),
+        timeout=timeout,
+        lost_result="lost",
+        chunksize=2,
+    )
+
+
+def test_hung_task_is_retried_then_lost(monkeypatch):
+    monkeypatch.setattr(worker_pool, "POLL_INTERVAL", 0.05)
+    pool = _timeout_pool(TimeoutPolicy(seconds=0.5, retries=1))
+    start = time.monotonic()
+    results = _run(pool, [1, "hang", 2, 3])
+
+    assert time.monotonic() - start < 10
+    assert results.count("lost") == 1
+    assert sorted(r[0] for r in results if r != "lost") == [1, 2, 3]
+    assert pool.lost == [("hang", "timed out 2 times")]
+    killed = [r for r in pool.reports if r["exit"].startswith("killed")]
+    assert len(killed) == 2
+
+
+def test_hung_task_succeeds_on_retry(monkeypatch, tmp_path):
+    monkeypatch.setattr(worker_pool, "POLL_INTERVAL", 0.05)
+    pool = _timeout_pool(TimeoutPolicy(seconds=0.5))
+    results = _run(pool, [1, f"hang-once:{tmp_path / 'marker'}", 2])
+
+    assert "lost" not in results and len(results) == 3
+    assert pool.lost == []
+
+
+def test_stragglers_are_stopped(monkeypatch):
+    monkeypatch.setattr(worker_pool, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(worker_pool, "STRAGGLER_MIN_SECONDS", 0.5)
+    monkeypatch.setattr(worker_pool, "STRAGGLER_MIN_SAMPLES", 3)
+    pool = _timeout_pool(TimeoutPolicy(straggler_factor=5, retries=0))
+    tasks = list(range(6)) + ["hang"]
+    start = time.monotonic()
+    results = _run(pool, tasks, [1000] * len(tasks))
+
+    assert time.monotonic() - start < 10
+    assert results.count("lost") == 1
+    assert pool.lost == [("hang", "timed out")]
+
+
+def test_describe_reports():
+    lines = describe_reports(
+        [
+            {
+                "pid": 12,
+                "tasks": 3,
+                "bytes": 2 * 1024**3,
+                "peak_rss": 300 * 1024**2,
+                "exit": "recycled (3 tasks done)",
+            }
+        ]
+    )
+    assert lines == [
+        "Worker 12: 3 files, 2.00 GB, peak RSS 300 MB, recycled (3 tasks done)"
+    ]
+
+
+@pytest.mark.skipif("fork" not in START_METHODS, reason="fakes reach workers by fork")
+def test_process_backend_reports_workers(monkeypatch, fake_tiff, tmp_path):
+    monkeypatch.setattr(compression_tool, "ensure_parameters", lambda path: None)
+    monkeypatch.setattr(utils, "prepare_image", lambda image, identifier: None)
+    monkeypatch.setattr(CompressionTool, "_write_metadata", lambda *args: None)
+    monkeypatch.setattr(compression_tool, "bootstrap_worker", lambda *args: None)
+    monkeypatch.setattr("jetraw_tools.workers.bootstrap_worker", lambda *args: None)
+    folder = tmp_path / "input"
+    folder.mkdir()
+    for i in range(5):
+        tifffile.imwrite(folder / f"{i}.tif", np.ones((5, 4, 8), np.uint16))
+
+    tool = CompressionTool(
+        identifier="cam", start_method="fork", max_tasks_per_worker=2
+    )
+    job = {
+        "folder_path": str(folder),
+        "output_folder": str(tmp_path),
+        "mode": "compress",
+        "image_extension": ".tif",
+        "process_metadata": False,
+        "ome_bool": True,
+        "metadata_json": False,
+        "remove_source": False,
+        "total_files": 5,
+    }
+    tasks = list(enumerate(sorted(os.listdir(folder))))
+    reports, lost = [], []
+    results = list(tool._run_processes(job, tasks, [1] * 5, 2, 1, reports, lost))
+
+    assert [failed for failed, _, _ in results] == [0] * 5
+    assert lost == []
+    assert sum(report["tasks"] for report in reports) == 5
+    assert all(report["tasks"] <= 2 for report in reports)
+
+
+def test_partial_output_of_lost_task_is_removed(tmp_path):
+    tool = CompressionTool(identifier="cam")
+    job = {
+        "output_folder": str(tmp_path),
+        "mode": "compress",
+        "image_extension": ".nd2",
+        "ome_bool": True,
+    }
+    partial = tmp_path / ".partial-a_P001.ome.p.tiff"
+    partial.write_bytes(b"II*")
+    tool._discard_output(job, (0, "a.nd2", 1))
+    assert not partial.exists()
+    tool._discard_output(job, (1, "b.nd2"))
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from jetraw_tools import dpcore, libs
+
+
+class _FakeDPCore:
+    """Records dpcore_load_parameters calls and returns a fixed status."""
+
+    def __init__(self, status: int = 0):
+        self.status = status
+        self.loaded = []
+
+    def dpcore_load_parameters(self, cpath) -> int:
+        self.loaded.append(cpath)
+        return self.status
+
+
+class _FakeJetraw:
+    def dp_status_description(self, status: int) -> bytes:
+        return b"load failed"
+
+
+@pytest.fixture
+def fake_dpcore(monkeypatch):
+    fake = _FakeDPCore()
+    monkeypatch.setattr(dpcore, "_get_libs", lambda: (_FakeJetraw(), fake))
+    monkeypatch.setattr(dpcore, "_current_parameters", None)
+    return fake
+
+
+def test_ensure_parameters_reloads_after_switching_calibration(fake_dpcore):
+    dpcore.ensure_parameters("a.dat")
+    dpcore.ensure_parameters("a.dat")
+    dpcore.ensure_parameters("b.dat")
+    dpcore.ensure_parameters("a.dat")
+    assert fake_dpcore.loaded == [b"a.dat", b"b.dat", b"a.dat"]
+
+
+def test_ensure_parameters_sees_direct_load_parameters(fake_dpcore):
+    dpcore.ensure_parameters("a.dat")
+    dpcore.load_parameters("b.dat")
+    dpcore.ensure_parameters("a.dat")
+    assert fake_dpcore.loaded == [b"a.dat", b"b.dat", b"a.dat"]
+
+
+def test_failed_load_is_not_remembered(fake_dpcore):
+    fake_dpcore.status = 1
+    with pytest.raises(RuntimeError):
+        dpcore.ensure_parameters("a.dat")
+    fake_dpcore.status = 0
+    dpcore.ensure_parameters("a.dat")
+    assert fake_dpcore.loaded == [b"a.dat", b"a.dat"]
+
+
+def test_set_license_skips_registered_key(monkeypatch):
+    calls = []
+
+    class _FakeTiff:
+        def jetraw_tiff_set_license(self, key: bytes) -> None:
+            calls.append(key)
+
+    monkeypatch.setattr(libs, "get_jetraw_libs", lambda: (None, _FakeTiff()))
+    monkeypatch.setattr(libs, "_current_license", None)
+    libs.set_license("key-1")
+    libs.set_license("key-1")
+    libs.set_license("key-2")
+    assert calls == [b"key-1", b"key-2"]
+
+
+def test_ensure_parameters_needs_a_calibration(fake_dpcore):
+    with pytest.raises(RuntimeError):
+        dpcore.ensure_parameters(None)
+    assert fake_dpcore.loaded == []
+
+
+def test_licence_is_not_exported_to_workers(monkeypatch):
+    from jetraw_tools import compression_tool
+    from jetraw_tools.compression_tool import CompressionTool
+    from jetraw_tools.worker_pool import WorkerPool
+
+    environments = []
+    monkeypatch.setattr(
+        WorkerPool, "start", lambda self, n_tasks: environments.append(dict(os.environ))
+    )
+    monkeypatch.setattr(WorkerPool, "imap_unordered", lambda self, *args: iter(()))
+    monkeypatch.setattr(
+        compression_tool.multiprocessing,
+        "get_context",
+        lambda method=None: type(
+            "Context", (), {"set_forkserver_preload": lambda self, modules: None}
+        )(),
+    )
+    tool = CompressionTool(
+        identifier="cam", licence_key="secret-key", start_method="forkserver"
+    )
+    job = {"mode": "compress"}
+    list(tool._run_processes(job, [(0, "a.tif")], [1], 1, 1, [], []))
+    assert environments and "secret-key" not in environments[0].values()
+    assert environments[0]["JETRAW_TOOLS_PRELOAD_MODE"] == "compress"
+    assert "JETRAW_TOOLS_PRELOAD_MODE" not in os.environ
@@ -0,0 +1,45 @@
+import pytest
+
+from jetraw_tools.workers import (
+    AUTO_THREADS_MAX_FILE_SIZE,
+    compute_chunksize,
+    resolve_backend,
+)
+
+MB = 1024**2
+
+
+def test_chunksize_targets_four_chunks_per_worker():
+    assert compute_chunksize(160, 4) == 10
+
+
+def test_chunksize_is_capped_for_huge_batches():
+    assert compute_chunksize(10_000_000, 4) == 1024
+
+
+def test_chunksize_is_bounded_by_input_bytes():
+    assert compute_chunksize(10_000, 4, avg_file_size=1 * MB) == 256
+    assert compute_chunksize(10_000, 4, avg_file_size=2048 * MB) == 1
+
+
+@pytest.mark.parametrize("n_tasks, n_workers", [(0, 4), (5, 0)])
+def test_chunksize_degenerate_inputs(n_tasks, n_workers):
+    assert compute_chunksize(n_tasks, n_workers) == 1
+
+
+@pytest.mark.parametrize("backend", ["processes", "threads"])
+def test_explicit_backend_is_kept(backend):
+    assert resolve_backend(backend, [1]) == backend
+
+
+def test_auto_backend_uses_median_file_size():
+    small = AUTO_THREADS_MAX_FILE_SIZE // 2
+    large = AUTO_THREADS_MAX_FILE_SIZE * 2
+    assert resolve_backend("auto", [small, small, large]) == "threads"
+    assert resolve_backend("auto", [small, large, large]) == "processes"
+    assert resolve_backend("auto", []) == "processes"
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        resolve_backend("gpu", [1])